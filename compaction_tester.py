@@ -0,0 +1,134 @@
+import shutil
+import sys
+
+import lstore.config as Config
+from lstore.db import Database
+from lstore.merge_info import MERGE_MANAGER
+from lstore.page_info import Compacted_Tail_Page
+from lstore.query import Query
+
+"""
+Compaction tester: updates every record in rounds under a retention policy
+of VERSION_RETENTION_COUNT versions, then checks that the tail pages were
+compacted and that exactly the retained versions are still readable: the
+newest VERSION_RETENTION_COUNT versions of each record read as they were
+written, older ones read as the base record once their versions are dropped.
+
+Checked after the merges and compactions, after reopening the database,
+and after more rounds of updates compact the tail pages again.
+"""
+
+DB_PATH = "./COMPACTION"
+
+number_of_records = 3000 # two page ranges
+number_of_rounds = 6
+version_retention_count = 2
+checked_versions = 5
+
+
+def update_round(query:Query, history:dict[int,list[list[int]]], round_index:int)->None:
+    for key, versions in history.items():
+        # every round changes column 1, so each update is a version
+        columns = [key, round_index, (key * round_index) % 97, versions[-1][3], round_index % 2]
+        query.update(key, None, *columns[1:])
+        versions.append(columns)
+
+
+def merge_all(grades_table)->None:
+    """
+    Waits for the background merges, then merges and compacts the tail records
+    they left under MERGE_THRESHOLD and COMPACTION_THRESHOLD, so that every
+    version past the retention count is dropped.
+    """
+    MERGE_MANAGER.wait()
+    compaction_threshold, Config.COMPACTION_THRESHOLD = Config.COMPACTION_THRESHOLD, 1
+    for page_range in grades_table.page_ranges.values():
+        page_range.merge()
+    Config.COMPACTION_THRESHOLD = compaction_threshold
+
+
+def check(tag:str, query:Query, history:dict[int,list[list[int]]])->int:
+    num_errors = 0
+    for key, versions in history.items():
+        for relative_version in range(checked_versions):
+            # dropped versions read as the base record
+            is_retained = relative_version < version_retention_count
+            expected_columns = versions[-1 - relative_version] if is_retained else versions[0]
+            records = query.select_version(key, 0, [1, 1, 1, 1, 1], -relative_version)
+            if records == False or len(records) != 1 or list(records[0].columns) != expected_columns:
+                print(f"{tag}: version -{relative_version} of key {key} is {records and list(records[0].columns)}, "
+                      f"expected {expected_columns} ({'retained' if is_retained else 'dropped'})")
+                num_errors += 1
+                if num_errors > 20: return num_errors
+    return num_errors
+
+
+def check_compacted(tag:str, grades_table)->int:
+    num_errors = 0
+    for page_range_index, page_range in grades_table.page_ranges.items():
+        num_compacted_pages = sum(isinstance(_, Compacted_Tail_Page) for _ in page_range.tail_pages.values())
+        if not num_compacted_pages:
+            print(f"{tag}: page range {page_range_index} with TPS {page_range.tps_index} has no compacted tail page")
+            num_errors += 1
+    return num_errors
+
+
+def main()->None:
+    Config.VERSION_RETENTION_COUNT = version_retention_count
+    Config.MERGE_THRESHOLD = 512
+    Config.COMPACTION_THRESHOLD = 512
+    # every tail page holding a dropped version is rewritten
+    Config.COMPACTION_MIN_GARBAGE = 0
+    shutil.rmtree(DB_PATH, ignore_errors=True)
+    db = Database()
+    db.open(DB_PATH)
+    grades_table = db.create_table('Grades', 5, 0)
+    query = Query(grades_table)
+    history:dict[int,list[list[int]]] = dict()
+    for key in range(number_of_records):
+        # inserted values no update writes again
+        history[key] = [[key, -1, -1, key, -1]]
+        query.insert(*history[key][0])
+    for round_index in range(number_of_rounds):
+        update_round(query, history, round_index)
+    merge_all(grades_table)
+
+    stats = MERGE_MANAGER.get_stats()
+    print(f"{stats['compactions']} compactions dropped {stats['dropped_versions']} versions, copied {stats['copied_versions']}, "
+          f"reclaimed {stats['reclaimed_bytes']} bytes at {stats['compaction_throughput']:.0f} versions/s")
+    num_errors = 0
+    # each record has number_of_rounds tail versions, the newest version_retention_count are kept
+    expected_dropped_versions = number_of_records * (number_of_rounds - version_retention_count)
+    if not stats["compactions"] or stats["dropped_versions"] != expected_dropped_versions or stats["reclaimed_bytes"] <= 0:
+        print(f"expected compactions to drop {expected_dropped_versions} versions and reclaim bytes")
+        num_errors += 1
+    num_errors += check_compacted("compacted", grades_table)
+    num_errors += check("compacted", query, history)
+
+    db.close()
+    db = Database()
+    db.open(DB_PATH)
+    grades_table = db.get_table('Grades')
+    query = Query(grades_table)
+    num_errors += check_compacted("reopened", grades_table)
+    num_errors += check("reopened", query, history)
+
+    # later versions are compacted on top of the compacted pages
+    num_dropped_versions = MERGE_MANAGER.get_stats()["dropped_versions"]
+    for round_index in range(number_of_rounds, 2 * number_of_rounds):
+        update_round(query, history, round_index)
+    merge_all(grades_table)
+    num_dropped_versions = MERGE_MANAGER.get_stats()["dropped_versions"] - num_dropped_versions
+    if num_dropped_versions != number_of_records * number_of_rounds:
+        print(f"{num_dropped_versions} versions were dropped after reopening, expected {number_of_records * number_of_rounds}")
+        num_errors += 1
+    num_errors += check("updated after reopening", query, history)
+
+    print(f"compaction: {num_errors} errors")
+    db.close()
+    shutil.rmtree(DB_PATH, ignore_errors=True)
+    sys.exit(1 if num_errors else 0)
+
+
+if __name__ == "__main__":
+    main()
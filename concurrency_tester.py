@@ -0,0 +1,81 @@
+import shutil
+from random import randint, seed
+from time import perf_counter
+
+from lstore.db import Database
+from lstore.query import Query
+from lstore.transaction import Transaction
+from lstore.transaction_worker import TransactionWorker
+
+"""
+Concurrency control benchmark: runs the same read-modify-write transactions
+with locking and with optimistic concurrency control, over fewer and fewer
+keys so that transactions conflict more and more often.
+
+Each transaction increments queries_per_transaction random keys. The
+sum of column 1 must grow by the increments of the committed transactions.
+"""
+
+DB_PATH = "./CONCURRENCY"
+
+num_threads = 8
+transactions_per_thread = 50
+queries_per_transaction = 4
+key_counts = [10000, 1000, 100, 10]
+
+
+def increment(query:Query, key:int, column:int)->bool:
+    records = query.select(key, 0, [1, 1, 1, 1, 1])
+    if records == False or not len(records): return False
+    updated_columns = [None] * 5
+    updated_columns[column] = records[0].columns[column] + 1
+    return query.update(key, *updated_columns)
+
+
+def run(concurrency_mode:str, num_keys:int)->None:
+    seed(3562901)
+    shutil.rmtree(DB_PATH, ignore_errors=True)
+    db = Database()
+    db.open(DB_PATH)
+    grades_table = db.create_table('Grades', 5, 0)
+    query = Query(grades_table)
+    for key in range(num_keys):
+        query.insert(key, 0, 0, 0, 0)
+
+    workers = [TransactionWorker([]) for _ in range(num_threads)]
+    for worker in workers:
+        for _ in range(transactions_per_thread):
+            transaction = Transaction(concurrency_mode)
+            for _ in range(queries_per_transaction):
+                key = randint(0, num_keys - 1)
+                transaction.add_query(increment, grades_table, query, key, 1)
+            worker.add_transaction(transaction)
+
+    start_time = perf_counter()
+    for worker in workers:
+        worker.run()
+    for worker in workers:
+        worker.join()
+    run_time = perf_counter() - start_time
+
+    stats = [worker.get_stats() for worker in workers]
+    num_commits = sum(_["commits"] for _ in stats)
+    num_aborts = sum(_["aborts"] for _ in stats)
+    expected_sum = sum(committed * queries_per_transaction for worker in workers for committed in worker.stats)
+    is_consistent = query.sum(0, num_keys - 1, 1) == expected_sum
+    print(f"{concurrency_mode:>7} {num_keys:>6} keys: {num_commits}/{num_threads * transactions_per_thread} committed, "
+          f"{num_commits / run_time:.0f} txn/s, {num_aborts} aborted runs, "
+          f"p99 latency {max(_['p99_latency'] for _ in stats) * 1000:.1f} ms, "
+          f"{'consistent' if is_consistent else 'INCONSISTENT'}")
+    db.close()
+
+
+def main()->None:
+    for num_keys in key_counts:
+        for concurrency_mode in ("LOCKING", "OCC"):
+            run(concurrency_mode, num_keys)
+    shutil.rmtree(DB_PATH, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+import os
+import shutil
+import sys
+import threading
+from time import sleep
+
+import lstore.config as Config
+from lstore.db import Database
+from lstore.lock_info import WAIT_FOR_GRAPH
+from lstore.query import Query
+from lstore.transaction import Transaction
+
+"""
+Deadlock tester: runs transactions that lock records in opposite orders and
+checks that the deadlock is found and broken by aborting the youngest
+transaction of the cycle (the one created last), whichever transaction
+closes the cycle. The other transactions then commit.
+
+Cycles over two transactions in one table and over three transactions
+across two tables are checked. Reads lock records here, so that a survivor
+of the three transaction cycle waits for a record the other survivor only
+read (waiting for one it wrote would abort it under snapshot isolation).
+"""
+
+DB_PATH = "./DEADLOCK"
+
+number_of_records = 100
+join_timeout = 30 # seconds before a transaction is reported as blocked forever
+
+
+def run_cycle(steps:list[list[tuple]], closing_order:list[int])->tuple[list[bool|None],bool]:
+    """
+    Runs one transaction per list of (table, query, key, is_read) steps. Each
+    transaction selects or updates its first key, waits for the others to do the
+    same, then the rest of its keys, the transactions of closing_order one after
+    another.
+    Returns the result of each transaction and whether they all finished.
+    """
+    transactions = [Transaction() for _ in steps]
+    results:list[bool|None] = [None] * len(steps)
+    barrier = threading.Barrier(len(steps))
+    def pause(index:int)->bool:
+        barrier.wait(timeout=join_timeout)
+        # the transaction at position i of closing_order starts waiting i steps later
+        sleep(0.1 * closing_order.index(index))
+        return True
+    for index, (transaction, transaction_steps) in enumerate(zip(transactions, steps)):
+        for step_index, (table, query, key, is_read) in enumerate(transaction_steps):
+            if is_read: transaction.add_query(query.select, table, key, 0, [1, 1, 1, 1, 1])
+            else: transaction.add_query(query.update, table, key, None, index + 1, None, None, None)
+            if not step_index: transaction.add_query(pause, table, index)
+    def run(index:int)->None:
+        results[index] = transactions[index].run()
+    threads = [threading.Thread(target=run, args=(_,), daemon=True) for _ in range(len(steps))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(timeout=join_timeout)
+    return (results, not any(_.is_alive() for _ in threads))
+
+
+def check_cycle(tag:str, steps:list[list[tuple]], closing_order:list[int])->int:
+    num_deadlocks = WAIT_FOR_GRAPH.num_deadlocks
+    results, is_finished = run_cycle(steps, closing_order)
+    # transactions are created in the order of steps, the last one is the youngest
+    expected_results = [True] * (len(steps) - 1) + [False]
+    print(f"{tag}: results {results}, {WAIT_FOR_GRAPH.num_deadlocks - num_deadlocks} deadlocks found")
+    if not is_finished:
+        print(f"{tag}: the transactions are still blocked after {join_timeout} s")
+        return 1
+    num_errors = 0
+    if results != expected_results:
+        print(f"{tag}: expected {expected_results}, only the youngest transaction aborts")
+        num_errors += 1
+    if WAIT_FOR_GRAPH.num_deadlocks != num_deadlocks + 1:
+        print(f"{tag}: expected 1 deadlock to be found")
+        num_errors += 1
+    # the committed transactions wrote their keys, the victim's writes were rolled back
+    for index, transaction_steps in enumerate(steps):
+        for table, query, key, _ in transaction_steps:
+            value = query.select(key, 0, [1, 1, 1, 1, 1])[0].columns[1]
+            writers = [i + 1 for i, other_steps in enumerate(steps) if results[i] and (table, query, key, False) in other_steps]
+            if not value in (writers or [0]):
+                print(f"{tag}: key {key} of {os.path.basename(table.table_path)} holds {value}, "
+                      f"expected a value written by {writers or 'none'}")
+                num_errors += 1
+    return num_errors
+
+
+def main()->None:
+    Config.SNAPSHOT_READS = False
+    shutil.rmtree(DB_PATH, ignore_errors=True)
+    db = Database()
+    db.open(DB_PATH)
+    grades_table = db.create_table('Grades', 5, 0)
+    courses_table = db.create_table('Courses', 5, 0)
+    grades_query, courses_query = Query(grades_table), Query(courses_table)
+    for key in range(number_of_records):
+        grades_query.insert(key, 0, 0, 0, 0)
+        courses_query.insert(key, 0, 0, 0, 0)
+    num_errors = 0
+
+    # two transactions, the youngest or the oldest closing the cycle
+    grades = lambda key, is_read=False: (grades_table, grades_query, key, is_read)
+    courses = lambda key, is_read=False: (courses_table, courses_query, key, is_read)
+    num_errors += check_cycle("2 transactions, youngest closes", [[grades(1), grades(2)], [grades(2), grades(1)]], [0, 1])
+    num_errors += check_cycle("2 transactions, oldest closes", [[grades(3), grades(4)], [grades(4), grades(3)]], [1, 0])
+    # three transactions over two tables
+    num_errors += check_cycle("3 transactions, 2 tables",
+                              [[grades(5), courses(5)], [courses(5, True), courses(6)], [courses(6), grades(5)]], [0, 1, 2])
+
+    stats = [grades_table.lock_manager.get_stats(), courses_table.lock_manager.get_stats()]
+    print(f"lock managers: {sum(_['deadlocks'] for _ in stats)} deadlocks, {sum(_['wait_time'] for _ in stats):.2f} s waited, "
+          f"{sum(_['locks'] for _ in stats)} locks held")
+    if sum(_["deadlocks"] for _ in stats) != 3 or not sum(_["wait_time"] for _ in stats) or sum(_["locks"] for _ in stats):
+        print("expected 3 deadlocks and some wait time to be counted, and no lock to be left")
+        num_errors += 1
+
+    db.close()
+    shutil.rmtree(DB_PATH, ignore_errors=True)
+    sys.exit(1 if num_errors else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+import os
+import shutil
+import sys
+import threading
+
+from lstore.bufferpool import BUFFERPOOL
+from lstore.db import Database
+from lstore.query import Query
+from lstore.transaction import Transaction
+from lstore.transaction_context import TRANSACTION_CONTEXT
+
+"""
+Dirty page tester: checks that a transaction only pins, commits and rolls
+back the pages it wrote itself.
+
+The footprint of a transaction updating one record is the base page and
+tail page of the record, pinned until the transaction ends. Committing
+leaves the pages other queries dirtied alone, and aborting restores only
+the entries the transaction overwrote, not the ones written meanwhile by
+other queries to the same page.
+"""
+
+DB_PATH = "./DIRTY_PAGE"
+
+number_of_records = 3000
+
+
+class Paused_Transaction:
+    """
+    Runs a transaction in a thread, pausing it after its queries until resumed.
+    The transaction aborts when resumed with is_aborted.
+    """
+
+    def __init__(self, transaction:Transaction)->None:
+        self.transaction:Transaction     = transaction
+        self.footprint:dict              = dict() # {page path: pins of the frame while paused}
+        self.is_paused                   = threading.Event()
+        self.can_resume                  = threading.Event()
+        self.is_aborted:bool             = False
+        self.result:bool|None            = None
+        self.thread:threading.Thread     = threading.Thread(target=self.__run)
+        transaction.add_query(self.__pause, None)
+
+    def __pause(self)->bool:
+        running_transaction = TRANSACTION_CONTEXT.get_transaction()
+        self.footprint = {page_path: frame.num_pins for page_path, frame in running_transaction.dirty_frames.items()}
+        self.is_paused.set()
+        self.can_resume.wait()
+        return not self.is_aborted
+
+    def __run(self)->None:
+        self.result = self.transaction.run()
+
+    def start(self)->None:
+        self.thread.start()
+        self.is_paused.wait()
+
+    def resume(self, is_aborted:bool=False)->bool:
+        self.is_aborted = is_aborted
+        self.can_resume.set()
+        self.thread.join()
+        return self.result
+
+
+def select_column(query:Query, key:int, column:int)->int:
+    return query.select(key, 0, [1, 1, 1, 1, 1])[0].columns[column]
+
+
+def main()->None:
+    shutil.rmtree(DB_PATH, ignore_errors=True)
+    db = Database()
+    db.open(DB_PATH)
+    grades_table = db.create_table('Grades', 5, 0)
+    query = Query(grades_table)
+    for key in range(number_of_records):
+        query.insert(key, 0, 0, 0, 0)
+    num_errors = 0
+
+    # the footprint of an update is the base page and tail page of the record, pinned until commit
+    transaction = Transaction()
+    transaction.add_query(query.update, grades_table, 10, None, 1, None, None, None)
+    paused = Paused_Transaction(transaction)
+    paused.start()
+    page_range_path = grades_table.page_ranges[grades_table.index.locate(10, 0)[0].get_page_range_index()].page_range_path
+    if sorted(paused.footprint) != [os.path.join(page_range_path, _) for _ in ("BP0", "TP0")] or \
+            any(num_pins < 1 for num_pins in paused.footprint.values()):
+        print(f"footprint of an update: {paused.footprint}, expected BP0 and TP0 of {page_range_path} pinned")
+        num_errors += 1
+    # pages dirtied by other queries meanwhile
+    query.update(2000, None, None, 2, None, None)
+    others_dirty = {page_path for page_path, frame in BUFFERPOOL.frames.items()
+                    if frame.is_dirty and not page_path in paused.footprint}
+    if not paused.resume():
+        print("the update transaction aborted")
+        num_errors += 1
+    if any(not BUFFERPOOL.frames[page_path].is_dirty for page_path in others_dirty):
+        print("the commit wrote pages the transaction did not dirty")
+        num_errors += 1
+    pinned = [page_path for page_path, frame in BUFFERPOOL.frames.items() if frame.num_pins]
+    if len(pinned):
+        print(f"frames still pinned after the commit: {pinned}")
+        num_errors += 1
+
+    # an abort restores the entries of the transaction, not the ones written meanwhile to the same page
+    transaction = Transaction()
+    transaction.add_query(query.update, grades_table, 20, None, 5, None, None, None)
+    paused = Paused_Transaction(transaction)
+    paused.start()
+    query.update(21, None, 7, None, None, None)
+    query.update(22, None, None, 8, None, None)
+    if paused.resume(is_aborted=True) != False:
+        print("the aborting transaction committed")
+        num_errors += 1
+    for key, column, expected_value in ((20, 1, 0), (21, 1, 7), (22, 2, 8), (10, 1, 1), (2000, 2, 2)):
+        value = select_column(query, key, column)
+        if value != expected_value:
+            print(f"key {key} column {column} is {value} after the abort, expected {expected_value}")
+            num_errors += 1
+    pinned = [page_path for page_path, frame in BUFFERPOOL.frames.items() if frame.num_pins]
+    if len(pinned):
+        print(f"frames still pinned after the abort: {pinned}")
+        num_errors += 1
+
+    print(f"dirty page tracking: {num_errors} errors")
+    db.close()
+    shutil.rmtree(DB_PATH, ignore_errors=True)
+    sys.exit(1 if num_errors else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,159 @@
+import shutil
+import sys
+import threading
+from random import Random, randint, seed
+from time import perf_counter, sleep
+
+from lstore.db import Database
+from lstore.query import Query
+from lstore.transaction import Transaction
+
+"""
+Background index build tester: builds indexes with create_index(background=True)
+while threads keep inserting, updating and deleting records, some of them in
+transactions that abort, then checks every posting list of the new index
+against the records of the table.
+
+A change made while an index is built is either read by the build's scan of
+the table or replayed on the index once it is built. A change lost between
+the two leaves a record missing from the index, or indexed under a value it
+no longer has.
+"""
+
+DB_PATH = "./INDEX_BUILD"
+
+num_threads = 4
+number_of_records = 4096
+number_of_rounds = 15
+cardinalities = [None, 10, 13, 7, 3]
+
+
+class Writer(threading.Thread):
+    """
+    Writes the keys congruent to its index modulo num_threads until stopped,
+    keeping the model of those keys.
+    """
+
+    def __init__(self, index:int, grades_table, query:Query, model:dict[int,list[int]])->None:
+        super().__init__(daemon=True)
+        self.index:int                 = index
+        self.grades_table              = grades_table
+        self.query:Query               = query
+        self.model:dict[int,list[int]] = model
+        self.random:Random             = Random(index)
+        self.next_key:int              = number_of_records * 2 + index
+        self.is_stopped                = threading.Event()
+        self.num_writes:int            = 0
+        self.error:Exception|None      = None
+
+    def random_columns(self, key:int)->list[int]:
+        return [key] + [self.random.randint(0, cardinality - 1) for cardinality in cardinalities[1:]]
+
+    def random_key(self)->int|None:
+        key = self.random.randrange(self.index, number_of_records, num_threads)
+        return key if key in self.model else None
+
+    def run(self)->None:
+        try:
+            self.write()
+        except Exception as exception:
+            # the locks of the failed write are never released, blocking the other writers
+            self.error = exception
+
+    def write(self)->None:
+        while not self.is_stopped.is_set():
+            operation = self.random.randint(0, 9)
+            if operation < 6:
+                key = self.random_key()
+                if key is None: continue
+                columns = self.random_columns(key)
+                if self.query.update(key, None, *columns[1:]) != False: self.model[key] = columns
+            elif operation == 6:
+                columns = self.random_columns(self.next_key)
+                if self.query.insert(*columns) != False: self.model[self.next_key] = columns
+                self.next_key += num_threads
+            elif operation == 7:
+                key = self.random_key()
+                if key is None: continue
+                if self.query.delete(key) != False: del self.model[key]
+            else:
+                # the index changes of an aborted transaction are undone
+                key = self.random_key()
+                if key is None: continue
+                transaction = Transaction()
+                transaction.add_query(self.query.update, self.grades_table, key, None, *self.random_columns(key)[1:])
+                transaction.add_query(self.query.insert, self.grades_table, *self.random_columns(self.next_key + num_threads * 1000000))
+                transaction.add_query(lambda: False, self.grades_table)
+                transaction.run()
+            self.num_writes += 1
+
+
+def check_index(query:Query, model:dict[int,list[int]], column:int)->int:
+    """
+    Compares the posting list of every value of a column with the RIDs of the
+    records holding the value, returns the number of mismatches.
+    """
+    num_errors = 0
+    expected_rids:list[set[int]] = [set() for _ in range(cardinalities[column])]
+    for key, columns in model.items():
+        records = query.select(key, 0, [1, 1, 1, 1, 1])
+        if records == False or len(records) != 1 or list(records[0].columns) != columns:
+            print(f"key {key}: selected {records and [str(_) for _ in records]}, expected {columns}")
+            num_errors += 1
+            continue
+        expected_rids[columns[column]].add(int(records[0].rid))
+    for value in range(cardinalities[column]):
+        rids = {int(_) for _ in query.table.index.locate(value, column)}
+        if rids != expected_rids[value]:
+            print(f"column {column} value {value}: {len(rids - expected_rids[value])} RIDs indexed but not holding it, "
+                  f"{len(expected_rids[value] - rids)} holding it but not indexed")
+            num_errors += 1
+    return num_errors
+
+
+def main()->None:
+    seed(3562901)
+    shutil.rmtree(DB_PATH, ignore_errors=True)
+    db = Database()
+    db.open(DB_PATH)
+    grades_table = db.create_table('Grades', 5, 0)
+    query = Query(grades_table)
+    model:dict[int,list[int]] = dict()
+    for key in range(number_of_records):
+        model[key] = [key] + [randint(0, cardinality - 1) for cardinality in cardinalities[1:]]
+        query.insert(*model[key])
+
+    num_errors = 0
+    for round_index in range(number_of_rounds):
+        for column in range(1, len(cardinalities)):
+            writers = [Writer(i, grades_table, query, model) for i in range(num_threads)]
+            for writer in writers:
+                writer.start()
+            # the build starts while writes are in flight
+            sleep(0.05)
+            start_time = perf_counter()
+            grades_table.index.create_index(column, background=True)
+            grades_table.index.wait_for_builds()
+            build_time = perf_counter() - start_time
+            for writer in writers:
+                writer.is_stopped.set()
+            for writer in writers:
+                writer.join(timeout=60)
+            if any(_.error is not None or _.is_alive() for _ in writers):
+                for writer in writers:
+                    if writer.is_alive(): print(f"writer {writer.index} blocked")
+                    elif writer.error is not None: print(f"writer {writer.index} failed: {writer.error!r}")
+                sys.exit(1)
+            column_errors = check_index(query, model, column)
+            print(f"round {round_index} column {column}: built in {build_time:.2f} s with "
+                  f"{sum(_.num_writes for _ in writers)} writes, {len(model)} records, {column_errors} errors")
+            num_errors += column_errors
+            grades_table.index.drop_index(column)
+
+    db.close()
+    shutil.rmtree(DB_PATH, ignore_errors=True)
+    sys.exit(1 if num_errors else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+import os
+import shutil
+from array import array
+from random import randrange, seed
+from time import perf_counter
+
+from bplustree.node import LeafNode
+
+from lstore.index import Index_Column, Posting_List
+from lstore.record_info import RID
+import lstore.config as Config
+
+"""
+Index benchmark: loads unique keys into trees of different orders and times
+the build, point lookups, range scans of 100 keys and inserts, to choose
+INDEX_ORDER_NUMBER and INDEX_CACHE_SIZE.
+
+Keys are even so that inserts of odd keys land between them. Every tree
+caches INDEX_CACHE_SIZE nodes with INDEX_CACHE_REPLACEMENT_POLICY.
+"""
+
+INDEX_PATH = "./INDEX"
+
+key_counts = [100000, 1000000]
+orders = [4, 8, 16, 32] # larger orders do not fit INDEX_VALUE_SIZE in a page
+num_lookups = 20000
+num_ranges = 1000
+num_inserts = 5000
+
+
+def get_depth(index_column:Index_Column)->int:
+    memory = index_column.tree._mem
+    node = memory.get_node(index_column.tree._root_node_page)
+    depth = 1
+    while not isinstance(node, LeafNode):
+        node = memory.get_node(node.entries[0].before)
+        depth += 1
+    return depth
+
+
+def run(num_keys:int, order:int)->None:
+    seed(3562901)
+    shutil.rmtree(INDEX_PATH, ignore_errors=True)
+    os.mkdir(INDEX_PATH)
+    index_column = Index_Column(os.path.join(INDEX_PATH, "0.db"), order)
+
+    start_time = perf_counter()
+    index_column.load_entries((2 * key, Posting_List(array("q", [key + 1]))) for key in range(num_keys))
+    build_time = perf_counter() - start_time
+
+    start_time = perf_counter()
+    for _ in range(num_lookups):
+        index_column.get_single_entry(2 * randrange(num_keys))
+    lookup_time = (perf_counter() - start_time) / num_lookups
+
+    start_time = perf_counter()
+    for _ in range(num_ranges):
+        start_key = 2 * randrange(num_keys - 100)
+        for _ in index_column.get_ranged_entry(start_key, start_key + 199): pass
+    range_time = (perf_counter() - start_time) / num_ranges
+
+    start_time = perf_counter()
+    for i in range(num_inserts):
+        index_column.add_value(2 * randrange(num_keys) + 1, RID(num_keys + i + 1))
+    insert_time = (perf_counter() - start_time) / num_inserts
+
+    cache = index_column.cache
+    hit_rate = cache.num_hits / (cache.num_hits + cache.num_misses) if cache is not None else 0.0
+    print(f"{num_keys:>8} keys, order {order:>3}: depth {get_depth(index_column):>2}, build {build_time:.2f} s, "
+          f"lookup {lookup_time * 1e6:.0f} us, range of 100 {range_time * 1e6:.0f} us, "
+          f"insert {insert_time * 1e6:.0f} us, cache hit rate {hit_rate:.2f}")
+    del index_column
+
+
+def main()->None:
+    print(f"cache of {Config.INDEX_CACHE_SIZE} nodes ({Config.INDEX_CACHE_REPLACEMENT_POLICY})")
+    for num_keys in key_counts:
+        for order in orders:
+            run(num_keys, order)
+    shutil.rmtree(INDEX_PATH, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,151 @@
+import os
+import shutil
+import sys
+from array import array
+from random import randint, sample, seed, shuffle
+
+import lstore.config as Config
+from lstore.db import Database
+from lstore.index import KEY_SNAPSHOT_FILENAME
+from lstore.query import Query
+
+"""
+Primary key hash index tester: checks that the in-memory {key: RID} map of
+the primary key agrees with the primary key's tree and a model of the table
+after inserts, deletes and updates of the key, and that point lookups of a
+key read no tree node.
+
+A checkpoint (and closing the database) writes a snapshot of the map, which
+the next open loads (and removes) instead of reading the tree. Without a
+snapshot the map is rebuilt from the tree.
+"""
+
+DB_PATH = "./KEY_SNAPSHOT"
+
+number_of_records = 5000
+number_of_deletes = 500
+number_of_key_updates = 300
+number_of_selects = 500
+moved_key_offset = 100000 # keys updated to key + moved_key_offset
+
+
+def get_snapshot_path(grades_table)->str:
+    return os.path.join(grades_table.index.index_dir_path, KEY_SNAPSHOT_FILENAME)
+
+
+def read_snapshot(grades_table)->dict[int,int]:
+    pairs = array("q")
+    with open(get_snapshot_path(grades_table), "rb") as f:
+        pairs.frombytes(f.read())
+    return dict(zip(pairs[0::2], pairs[1::2]))
+
+
+def check(tag:str, grades_table, query:Query, model:dict[int,list[int]], removed_keys:list[int])->int:
+    num_errors = 0
+    key_rids = grades_table.index.key_rids
+    if key_rids is None or set(key_rids) != set(model):
+        print(f"{tag}: the hash index holds {key_rids and len(key_rids)} keys, "
+              f"{key_rids and len(set(key_rids) - set(model))} of them not in the model, expected {len(model)}")
+        return 1
+    tree_rids = {key: [int(_) for _ in grades_table.index.locate_range(key, key, 0)] for key in model}
+    num_mismatches = sum(tree_rids[key] != [rid] for key, rid in key_rids.items())
+    if num_mismatches:
+        print(f"{tag}: {num_mismatches} keys of the hash index map to other RIDs than in the primary key's tree")
+        num_errors += 1
+
+    # point lookups go through the hash index only
+    stats = grades_table.index.get_cache_stats()
+    num_node_accesses = stats["hits"] + stats["misses"]
+    for key in sample(sorted(model), number_of_selects):
+        records = query.select(key, 0, [1, 1, 1, 1, 1])
+        if records == False or len(records) != 1 or list(records[0].columns) != model[key]:
+            print(f"{tag}: key {key} is {records and list(records[0].columns)}, expected {model[key]}")
+            num_errors += 1
+    for key in removed_keys[:number_of_selects]:
+        records = query.select(key, 0, [1, 1, 1, 1, 1])
+        if records != False and len(records):
+            print(f"{tag}: deleted or moved key {key} is {list(records[0].columns)}")
+            num_errors += 1
+    stats = grades_table.index.get_cache_stats()
+    num_node_accesses = stats["hits"] + stats["misses"] - num_node_accesses
+    if num_node_accesses:
+        print(f"{tag}: {number_of_selects} point lookups read {num_node_accesses} tree nodes")
+        num_errors += 1
+    return num_errors
+
+
+def main()->None:
+    Config.PRIMARY_KEY_INDEX = "HASH"
+    seed(3562901)
+    shutil.rmtree(DB_PATH, ignore_errors=True)
+    db = Database()
+    db.open(DB_PATH)
+    grades_table = db.create_table('Grades', 5, 0)
+    query = Query(grades_table)
+    model:dict[int,list[int]] = dict()
+    keys = list(range(number_of_records))
+    shuffle(keys)
+    for key in keys:
+        model[key] = [key, randint(0, 999), randint(0, 999), 0, 0]
+        query.insert(*model[key])
+    removed_keys = sample(keys, number_of_deletes + number_of_key_updates)
+    for key in removed_keys[:number_of_deletes]:
+        query.delete(key)
+        del model[key]
+    for key in removed_keys[number_of_deletes:]:
+        columns = [key + moved_key_offset, randint(0, 999)] + model.pop(key)[2:]
+        query.update(key, *columns)
+        model[columns[0]] = columns
+    for key in sample(sorted(model), 1000):
+        model[key][2] = randint(0, 999)
+        query.update(key, None, None, model[key][2], None, None)
+    num_errors = check("open", grades_table, query, model, removed_keys)
+
+    # a checkpoint writes the snapshot, closing writes it again with the later changes
+    db.checkpoint()
+    if not os.path.exists(get_snapshot_path(grades_table)) or read_snapshot(grades_table) != grades_table.index.key_rids:
+        print("the checkpoint did not write a snapshot of the hash index")
+        num_errors += 1
+    for key in range(number_of_records, number_of_records + 100):
+        model[key] = [key, 0, 0, 0, 0]
+        query.insert(*model[key])
+    for key in sample(sorted(model), 100):
+        query.delete(key)
+        del model[key]
+        removed_keys.insert(0, key)
+    key_rids = dict(grades_table.index.key_rids)
+    db.close()
+    if not os.path.exists(get_snapshot_path(grades_table)) or read_snapshot(grades_table) != key_rids:
+        print("closing did not write a snapshot of the hash index with the changes made since the checkpoint")
+        num_errors += 1
+    db = Database()
+    db.open(DB_PATH)
+    grades_table = db.get_table('Grades')
+    query = Query(grades_table)
+    print(f"reopened: {len(grades_table.index.key_rids)} keys loaded, "
+          f"snapshot {'kept' if os.path.exists(get_snapshot_path(grades_table)) else 'removed'}")
+    if grades_table.index.key_rids != key_rids or os.path.exists(get_snapshot_path(grades_table)):
+        print("reopened: the hash index was not loaded from the snapshot written at close, or the snapshot was kept")
+        num_errors += 1
+    num_errors += check("reopened", grades_table, query, model, removed_keys)
+
+    # without a snapshot, the hash index is rebuilt from the tree
+    db.close()
+    if os.path.exists(get_snapshot_path(grades_table)): os.remove(get_snapshot_path(grades_table))
+    db = Database()
+    db.open(DB_PATH)
+    grades_table = db.get_table('Grades')
+    query = Query(grades_table)
+    if grades_table.index.key_rids != key_rids:
+        print("rebuilt: the hash index rebuilt from the tree differs from the one before closing")
+        num_errors += 1
+    num_errors += check("rebuilt", grades_table, query, model, removed_keys)
+
+    print(f"primary key hash index: {num_errors} errors")
+    db.close()
+    shutil.rmtree(DB_PATH, ignore_errors=True)
+    sys.exit(1 if num_errors else 0)
+
+
+if __name__ == "__main__":
+    main()
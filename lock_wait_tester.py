@@ -0,0 +1,155 @@
+import shutil
+import sys
+import threading
+from time import perf_counter, sleep, thread_time
+
+from lstore.db import Database
+from lstore.query import Query
+from lstore.transaction import Transaction
+
+"""
+Lock wait tester: checks how a query waits for a record locked by a running
+transaction.
+
+In BLOCK mode the query sleeps until the lock is released (it uses next to
+no CPU while waiting) and then succeeds. With a timeout it gives up once the
+timeout expires, and in NO_WAIT mode it fails right away. A failed query
+returns False and leaves the record as the transaction wrote it.
+"""
+
+DB_PATH = "./LOCK_WAIT"
+
+number_of_records = 100
+blocked_time = 0.5 # seconds the lock is held in BLOCK mode
+lock_timeout = 0.2 # seconds
+
+
+class Lock_Holder(threading.Thread):
+    """
+    Runs a transaction updating a key, then holds its locks until released.
+    """
+
+    def __init__(self, grades_table, query:Query, key:int, value:int)->None:
+        super().__init__()
+        self.transaction:Transaction     = Transaction()
+        self.is_holding                  = threading.Event()
+        self.can_release                 = threading.Event()
+        self.transaction.add_query(query.update, grades_table, key, None, value, None, None, None)
+        self.transaction.add_query(self.__hold, grades_table)
+
+    def __hold(self)->bool:
+        self.is_holding.set()
+        self.can_release.wait()
+        return True
+
+    def run(self)->None:
+        self.transaction.run()
+
+    def hold(self)->None:
+        self.start()
+        self.is_holding.wait()
+
+    def release(self)->None:
+        self.can_release.set()
+        self.join()
+
+
+class Waiter(threading.Thread):
+    """
+    Updates a key outside of a transaction, timing the update.
+    """
+
+    def __init__(self, query:Query, key:int, value:int)->None:
+        super().__init__()
+        self.query:Query            = query
+        self.key:int                = key
+        self.value:int              = value
+        self.result:bool|None       = None
+        self.wait_time:float        = 0.0 # seconds
+        self.cpu_time:float         = 0.0 # seconds
+
+    def run(self)->None:
+        start_time, start_cpu_time = perf_counter(), thread_time()
+        self.result = self.query.update(self.key, None, self.value, None, None, None)
+        self.wait_time, self.cpu_time = perf_counter() - start_time, thread_time() - start_cpu_time
+
+
+def main()->None:
+    shutil.rmtree(DB_PATH, ignore_errors=True)
+    db = Database()
+    db.open(DB_PATH)
+    grades_table = db.create_table('Grades', 5, 0)
+    query = Query(grades_table)
+    lock_manager = grades_table.lock_manager
+    for key in range(number_of_records):
+        query.insert(key, 0, 0, 0, 0)
+    num_errors = 0
+
+    # BLOCK: the update sleeps until the transaction commits, then succeeds
+    holder = Lock_Holder(grades_table, query, 5, 1)
+    holder.hold()
+    waiter = Waiter(query, 5, 2)
+    waiter.start()
+    sleep(blocked_time)
+    is_blocked = waiter.is_alive()
+    holder.release()
+    waiter.join()
+    value = query.select(5, 0, [1, 1, 1, 1, 1])[0].columns[1]
+    print(f"   block: waited {waiter.wait_time:.2f} s using {waiter.cpu_time:.3f} s of CPU, returned {waiter.result}, value {value}")
+    if not is_blocked or waiter.result == False or value != 2:
+        print("the blocked update did not wait for the lock and then succeed")
+        num_errors += 1
+    if waiter.cpu_time > waiter.wait_time / 4:
+        print("the blocked update spun while waiting")
+        num_errors += 1
+
+    # BLOCK with a timeout: the update gives up once the timeout expires
+    lock_manager.timeout = lock_timeout
+    num_timeouts = lock_manager.get_stats()["timeouts"]
+    holder = Lock_Holder(grades_table, query, 6, 1)
+    holder.hold()
+    waiter = Waiter(query, 6, 2)
+    waiter.start()
+    waiter.join(timeout=lock_timeout * 20)
+    is_timed_out = not waiter.is_alive()
+    holder.release()
+    waiter.join()
+    value = query.select(6, 0, [1, 1, 1, 1, 1])[0].columns[1]
+    print(f" timeout: waited {waiter.wait_time:.2f} s, returned {waiter.result}, value {value}")
+    if not is_timed_out or waiter.result != False or value != 1 or not lock_timeout <= waiter.wait_time < lock_timeout * 10:
+        print(f"the update did not fail once its {lock_timeout} s timeout expired")
+        num_errors += 1
+    if lock_manager.get_stats()["timeouts"] != num_timeouts + 1:
+        print("the timeout was not counted")
+        num_errors += 1
+    lock_manager.timeout = None
+
+    # NO_WAIT: the update fails right away
+    lock_manager.is_blocking = False
+    holder = Lock_Holder(grades_table, query, 7, 1)
+    holder.hold()
+    waiter = Waiter(query, 7, 2)
+    waiter.start()
+    waiter.join(timeout=lock_timeout * 20)
+    is_failed_fast = not waiter.is_alive() and waiter.wait_time < lock_timeout
+    holder.release()
+    waiter.join()
+    value = query.select(7, 0, [1, 1, 1, 1, 1])[0].columns[1]
+    print(f" no wait: waited {waiter.wait_time:.3f} s, returned {waiter.result}, value {value}")
+    if not is_failed_fast or waiter.result != False or value != 1:
+        print("the update did not fail right away in NO_WAIT mode")
+        num_errors += 1
+    lock_manager.is_blocking = True
+
+    # no lock outlives its query or transaction
+    if lock_manager.get_stats()["locks"]:
+        print(f"{lock_manager.get_stats()['locks']} locks are still held")
+        num_errors += 1
+
+    db.close()
+    shutil.rmtree(DB_PATH, ignore_errors=True)
+    sys.exit(1 if num_errors else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,21 +1,43 @@
 import io
 import os
-from datetime import datetime
+import sys
+from array import array
+from contextlib import contextmanager
+from mmap import mmap, ACCESS_COPY
+from struct import Struct
 from bitarray import bitarray
 from threading import RLock
 
 import lstore.config as Config
+from lstore.catalog import CATALOG
 from lstore.disk import Disk
+from lstore.log_info import Log_Manager
+from lstore.numpy_support import numpy
+from lstore.replacement_policy import Replacement_Policy, REPLACEMENT_POLICIES
 from lstore.record_info import Record, RID, TID
+from lstore.timestamp_info import TIMESTAMP_ORACLE
+from lstore.transaction_context import TRANSACTION_CONTEXT
 
 INITIAL_SCHEMA_ENCODING = 0
 INITIAL_INDIRECTION_VALUE = -1
+# version links of tail records are packed as depth << VERSION_DEPTH_SHIFT | skip TID
+VERSION_DEPTH_SHIFT = 32
+VERSION_SKIP_MASK = (1 << VERSION_DEPTH_SHIFT) - 1
+SEGMENT_FILENAME = "segment.bin"
 
 class Bufferpool:
 
-    def __init__(self)->None:
-        self.frames:dict[str,Frame] = dict()
-        self.latch:RLock             = RLock()
+    def __init__(self, replacement_policy:str=Config.BUFFERPOOL_REPLACEMENT_POLICY)->None:
+        self.frames:dict[str,Frame]                   = dict()
+        self.latch:RLock                              = RLock()
+        self.replacement_policy:Replacement_Policy    = REPLACEMENT_POLICIES[replacement_policy]()
+        # open logs by the path of their database, frames follow the write-ahead rule of the log covering their page
+        self.log_managers:dict[str,Log_Manager]       = dict()
+
+        # statistics used to size NUM_FRAMES_IN_BUFFERPOOL
+        self.num_hits:int                             = 0
+        self.num_misses:int                           = 0
+        self.num_evictions:int                        = 0
 
     def __del__(self)->None:
         del self.frames
@@ -27,84 +49,274 @@ class Bufferpool:
     def __is_page_in_buffer(self, page_path:str)->bool:
         return page_path in self.frames
 
-    def __evict_frame(self)->None:
-        earliest_time = datetime.now()
-        earliest_frame_path = None
-        for frame_path, frame in self.frames.items():
-            if earliest_time > frame.get_last_time_used():
-                earliest_frame_path = frame_path
-        del self.frames[earliest_frame_path]
+    def __is_frame_evictable(self, page_path:str)->bool:
+        return not self.frames[page_path].num_pins
 
-    def __import_frame(self, page_path:str)->None:
-        if not self.__has_capacity():
-            self.__evict_frame()
-        self.frames[page_path] = Frame(page_path)
+    def __get_log_manager(self, page_path:str)->Log_Manager|None:
+        path = os.path.normpath(page_path)
+        while not path in self.log_managers:
+            parent_path = os.path.dirname(path)
+            if parent_path == path: return None
+            path = parent_path
+        return self.log_managers[path]
 
-    def __access_frame(self, page_path:str)->None:
+    def __evict_frame(self)->tuple[Log_Manager,int]|None:
+        """
+        Evicts a frame, unless the log records of its changes are not durable
+        yet (write-ahead rule). The log and LSN to wait for are then returned,
+        waiting under the latch would stall every query on the bufferpool.
+        """
+        victim_path = self.replacement_policy.choose_victim(self.__is_frame_evictable)
+        # every frame is pinned, let the bufferpool grow past its capacity for now
+        if victim_path is None: return None
+        victim = self.frames[victim_path]
+        if victim.log_manager is not None and not victim.log_manager.is_flushed(victim.page_lsn):
+            return (victim.log_manager, victim.page_lsn)
+        self.replacement_policy.remove(victim_path)
+        self.frames.pop(victim_path)
+        victim.write_frame_to_disk()
+        self.num_evictions += 1
+        return None
+
+    def __access_frame(self, page_path:str)->"Frame":
+        """
+        Returns the frame of the page (importing it if needed) pinned so it
+        cannot be evicted until the caller unpins it.
+        """
+        while True:
+            with self.latch:
+                if self.__is_page_in_buffer(page_path):
+                    self.num_hits += 1
+                else:
+                    unflushed_victim = None if self.__has_capacity() else self.__evict_frame()
+                    if unflushed_victim is None:
+                        self.num_misses += 1
+                        self.frames[page_path] = Frame(page_path, self.__get_log_manager(page_path))
+                if self.__is_page_in_buffer(page_path):
+                    self.replacement_policy.record_access(page_path)
+                    frame = self.frames[page_path]
+                    frame.pin()
+                    return frame
+            # the victim is chosen again once its log records are durable
+            log_manager, lsn = unflushed_victim
+            log_manager.wait_flushed(lsn)
+
+    @contextmanager
+    def __pinned_frame(self, page_path:str):
+        frame = self.__access_frame(page_path)
+        try:
+            yield frame
+        finally:
+            frame.unpin()
+
+    def attach_log(self, db_path:str, log_manager:Log_Manager)->None:
+        """
+        Makes the frames of a database's pages follow the write-ahead rule of its log.
+        """
+        with self.latch:
+            # a database reopened at another path
+            self.log_managers = {path: _ for path, _ in self.log_managers.items() if _ is not log_manager}
+            self.log_managers[os.path.normpath(db_path)] = log_manager
+            for page_path, frame in self.frames.items():
+                frame.log_manager = self.__get_log_manager(page_path)
+
+    def detach_log(self, log_manager:Log_Manager)->None:
         with self.latch:
-            if not self.__is_page_in_buffer(page_path):
-                self.__import_frame(page_path)
+            self.log_managers = {path: _ for path, _ in self.log_managers.items() if _ is not log_manager}
+            for page_path, frame in self.frames.items():
+                frame.log_manager = self.__get_log_manager(page_path)
 
-    def insert_record(self, record:Record, base_page_path:str)->None:
-        self.__access_frame(base_page_path)
-        self.frames[base_page_path].insert_record(record)
+    def set_replacement_policy(self, replacement_policy:str)->None:
+        with self.latch:
+            self.replacement_policy = REPLACEMENT_POLICIES[replacement_policy]()
+            for page_path in self.frames:
+                self.replacement_policy.record_access(page_path)
+
+    def get_stats(self)->dict:
+        with self.latch:
+            num_accesses = self.num_hits + self.num_misses
+            return {
+                "hits": self.num_hits,
+                "misses": self.num_misses,
+                "evictions": self.num_evictions,
+                "hit_rate": self.num_hits / num_accesses if num_accesses else 0.0,
+                # of the frames in the bufferpool, columns no query read are not loaded
+                "physical_pages": sum(_.get_num_loaded_physical_pages() for _ in self.frames.values()),
+            }
+
+    def reset_stats(self)->None:
+        with self.latch:
+            self.num_hits = 0
+            self.num_misses = 0
+            self.num_evictions = 0
+
+    def insert_record(self, record:Record, base_page_path:str, timestamp:int|None=None)->None:
+        with self.__pinned_frame(base_page_path) as frame:
+            frame.insert_record(record, timestamp)
 
     def get_record_entry(self, id:RID, page_path:str, column_index:int)->int:
-        self.__access_frame(page_path)
-        return self.frames[page_path].get_record_entry(id, column_index)
+        with self.__pinned_frame(page_path) as frame:
+            return frame.get_record_entry(id, column_index)
+
+    def get_record_entries(self, id:RID, page_path:str, column_indices:list[int])->list[int]:
+        with self.__pinned_frame(page_path) as frame:
+            return [frame.get_record_entry(id, column_index) for column_index in column_indices]
+
+    def get_version_entries(self, id:RID, page_path:str, column_indices:list[int])->tuple[TID,int,list[int]]:
+        # indirection, timestamp and columns of a version in a single frame access
+        with self.__pinned_frame(page_path) as frame:
+            return (frame.get_indirection_tid(id), frame.get_timestamp(id),
+                    [frame.get_record_entry(id, column_index) for column_index in column_indices])
+
+    def get_column_entries(self, page_path:str, physical_page_index:int)->"numpy.ndarray|array":
+        with self.__pinned_frame(page_path) as frame:
+            return frame.get_column_entries(physical_page_index)
 
     def get_schema_encoding(self, rid:RID, base_page_path:str)->bitarray:
-        self.__access_frame(base_page_path)
-        return self.frames[base_page_path].get_schema_encoding(rid)
+        with self.__pinned_frame(base_page_path) as frame:
+            return frame.get_schema_encoding(rid)
 
     def set_schema_encoding(self, rid:RID, schema_encoding:bitarray, base_page_path:str)->None:
-        self.__access_frame(base_page_path)
-        self.frames[base_page_path].set_schema_encoding(rid, schema_encoding)
+        with self.__pinned_frame(base_page_path) as frame:
+            frame.set_schema_encoding(rid, schema_encoding)
 
     def get_indirection_tid(self, id:RID, page_path:str)->TID:
-        self.__access_frame(page_path)
-        return self.frames[page_path].get_indirection_tid(id)
+        with self.__pinned_frame(page_path) as frame:
+            return frame.get_indirection_tid(id)
 
     def set_indirection_tid(self, id:RID, tid:TID, page_path:str)->None:
-        self.__access_frame(page_path)
-        self.frames[page_path].set_indirection_tid(id, tid)
+        with self.__pinned_frame(page_path) as frame:
+            frame.set_indirection_tid(id, tid)
+
+    def get_timestamp(self, id:RID, page_path:str)->int:
+        with self.__pinned_frame(page_path) as frame:
+            return frame.get_timestamp(id)
+
+    def get_version_link(self, tid:TID, tail_page_path:str)->tuple[int,TID]:
+        with self.__pinned_frame(tail_page_path) as frame:
+            return frame.get_version_link(tid)
+
+    def set_version_link(self, tid:TID, depth:int, skip_tid:TID, tail_page_path:str)->None:
+        with self.__pinned_frame(tail_page_path) as frame:
+            frame.set_version_link(tid, depth, skip_tid)
 
     def delete_record(self, rid:RID, base_page_path:str)->None:
-        self.__access_frame(base_page_path)
-        self.frames[base_page_path].delete_record(rid)
+        with self.__pinned_frame(base_page_path) as frame:
+            frame.delete_record(rid)
+
+    def is_record_deleted(self, rid:RID, base_page_path:str)->bool:
+        with self.__pinned_frame(base_page_path) as frame:
+            return frame.is_record_deleted(rid)
+
+    def get_page_lsn(self, page_path:str)->int:
+        with self.__pinned_frame(page_path) as frame:
+            return frame.page_lsn
+
+    def set_page_lsn(self, page_path:str, page_lsn:int)->None:
+        with self.__pinned_frame(page_path) as frame:
+            frame.page_lsn = max(frame.page_lsn, page_lsn)
 
     def commit_writes_to_disk(self)->None:
+        """
+        Writes every dirty frame of the bufferpool to disk.
+        """
+        with self.latch:
+            log_managers = set(self.log_managers.values())
+        for log_manager in log_managers:
+            log_manager.flush()
         with self.latch:
             for frame in self.frames.values():
                 frame.write_frame_to_disk()
 
-    def abort_writes_to_disk(self)->None:
+    def clear(self)->None:
+        """
+        Drops every frame once they were all written to disk. Their page LSNs
+        belong to the log of the database being closed.
+        """
         with self.latch:
-            for frame in self.frames.values():
-                frame.keep_original_frame_to_disk()
+            for page_path in self.frames:
+                self.replacement_policy.remove(page_path)
+            self.frames = dict()
+
+    def remove_page(self, page_path:str)->None:
+        """
+        Drops the frame of a page about to be deleted without writing it.
+        """
+        with self.latch:
+            if not self.__is_page_in_buffer(page_path): return
+            self.replacement_policy.remove(page_path)
+            self.frames.pop(page_path).discard()
+
+    def write_pages_to_disk(self, dirty_pages:set[tuple[str,int]])->None:
+        """
+        Writes the given (page path, physical page index) pairs to disk.
+
+        Pages no longer in the bufferpool were written when their frame was evicted.
+        """
+        with self.latch:
+            for page_path, physical_page_index in dirty_pages:
+                if self.__is_page_in_buffer(page_path):
+                    self.frames[page_path].write_physical_page_to_disk(physical_page_index)
+
+    def rollback_writes(self, undo_entries:list[tuple[str,int,int,int]])->None:
+        """
+        Restores the entries overwritten by a transaction, most recent first.
+        """
+        for page_path, physical_page_index, id, old_value in reversed(undo_entries):
+            with self.__pinned_frame(page_path) as frame:
+                frame.restore_entry(physical_page_index, id, old_value)
+
+    def set_commit_timestamps(self, versions:list[tuple[str,int]], commit_timestamp:int)->None:
+        """
+        Stamps the (page path, id) versions written by a committing transaction.
+        """
+        for page_path, id in versions:
+            with self.__pinned_frame(page_path) as frame:
+                frame.restore_entry(Config.TIMESTAMP_COLUMN, id, commit_timestamp)
+
+    def release_frames(self, frames:list["Frame"], commit_lsns:dict[Log_Manager,int]|None=None)->None:
+        """
+        Unpins the frames a transaction kept in the bufferpool while it ran,
+        stamping them with the LSN of its commit record in their log.
+        """
+        commit_lsns = commit_lsns if commit_lsns is not None else dict()
+        with self.latch:
+            for frame in frames:
+                frame.page_lsn = max(frame.page_lsn, commit_lsns.get(frame.log_manager, 0))
+                frame.unpin()
 
 
 class Frame:
 
-    def __init__(self, page_path:str)->None:
+    def __init__(self, page_path:str, log_manager:Log_Manager|None=None)->None:
         self.page_path:str                      = page_path
+        # log of the database the page belongs to, None if the database has no open log
+        self.log_manager:Log_Manager|None       = log_manager
         self.num_pins:int                       = 0
         self.is_dirty:bool                      = False
-        self.physical_pages:list[Physical_Page] = list()
-        self.last_time_used:datetime            = datetime.now()
+        # physical pages are loaded on first access, so columns a query does not read are never loaded
+        self.physical_pages:list[Physical_Page|None] = list()
+        self.segment:mmap|None                  = None
+        self.segment_fd:int|None                = None
 
         self.latch:RLock                         = RLock()
 
         # find number of columns from table metadata (in grandparent dir from base/tail page)
         self.num_columns:int                        = \
-            Disk.read_from_path_metadata(os.path.dirname(os.path.dirname(page_path)))["num_columns"]
+            CATALOG.read_metadata(os.path.dirname(os.path.dirname(page_path)))["num_columns"]
+
+        # LSN of the last log record describing a change to the frame, and of the one on disk
+        self.page_lsn:int                       = CATALOG.read_metadata(page_path).get("page_lsn", 0)
+        self.disk_page_lsn:int                  = self.page_lsn
 
         # get physical pages
-        self.__load_physical_pages()
+        self.__open_physical_pages()
         self.__assert_num_physical_pages()
 
     def __del__(self)->None:
         self.write_frame_to_disk()
+        if self.segment_fd is not None:
+            os.close(self.segment_fd)
 
     def __assert_num_physical_pages(self)->None:
         assert len(self.physical_pages) == Config.NUM_METADATA_COLUMNS + self.num_columns
@@ -115,122 +327,247 @@ class Frame:
             with open(physical_page_path, 'wb') as f:
                 f.write(bytearray(Config.PHYSICAL_PAGE_SIZE))
 
-    def __load_physical_pages(self)->None:
+    def __get_segment_path(self)->str:
+        return os.path.join(self.page_path, SEGMENT_FILENAME)
+
+    def __is_page_mapped(self)->bool:
+        """
+        Pages stored as a single segment file are mapped, pages stored as one
+        file per physical page are read. New pages follow FRAME_STORAGE_MODE.
+        """
+        if os.path.isfile(self.__get_segment_path()):
+            return True
+        return Config.FRAME_STORAGE_MODE == "MMAP" and not len(Disk.list_directories_in_path(self.page_path))
+
+    def __map_physical_pages(self)->None:
+        """
+        Maps the page's segment file into memory, one stripe per physical page
         """
-        Reads data from disk and loads it into the physical pages
+        segment_size = (self.num_columns + Config.NUM_METADATA_COLUMNS) * Config.PHYSICAL_PAGE_SIZE
+        self.segment_fd = os.open(self.__get_segment_path(), os.O_RDWR | os.O_CREAT)
+        if os.fstat(self.segment_fd).st_size != segment_size:
+            os.ftruncate(self.segment_fd, segment_size)
+        # private mapping: changes only reach the file when the stripe is written back,
+        # so a crash can never leave uncommitted changes behind in the page cache
+        self.segment = mmap(self.segment_fd, segment_size, access=ACCESS_COPY)
+
+    def __open_physical_pages(self)->None:
         """
-        if not len(Disk.list_directories_in_path(self.page_path)):
+        Maps the segment file or creates the physical page files of the page,
+        whose physical pages are loaded by __get_physical_page
+        """
+        if self.__is_page_mapped():
+            self.__map_physical_pages()
+        elif not len(Disk.list_directories_in_path(self.page_path)):
             self.__create_physical_pages()
-        physical_page_paths:list[str] = Disk.list_directories_in_path(self.page_path)
-        physical_page_paths.sort(key=lambda x: int(x.split('/')[-1].split('.')[0]))
-        for physical_page_path in physical_page_paths:
-            if not os.path.isfile(physical_page_path): raise ValueError
-            with open(physical_page_path, 'rb') as f:
-                data = bytearray(f.read())
-            self.physical_pages.append(Physical_Page(physical_page_path, data))
-
-    def __pin_frame_decorator(func):
-        def wrapper(self, *args, **kwargs):
-            with self.latch:
-                self.num_pins += 1
-            result = func(self, *args, **kwargs)
+        self.physical_pages = [None] * (self.num_columns + Config.NUM_METADATA_COLUMNS)
+
+    def __load_physical_page(self, physical_page_index:int)->"Physical_Page":
+        """
+        Maps a stripe of the segment or reads a physical page file from disk
+        """
+        if self.segment is not None:
+            return Mapped_Physical_Page(self.segment, self.segment_fd, physical_page_index)
+        physical_page_path = os.path.join(self.page_path, f"{physical_page_index}.bin")
+        if not os.path.isfile(physical_page_path): raise ValueError
+        with open(physical_page_path, 'rb') as f:
+            data = bytearray(f.read())
+        return Physical_Page(physical_page_path, data)
+
+    def __get_physical_page(self, physical_page_index:int)->"Physical_Page":
+        physical_page = self.physical_pages[physical_page_index]
+        if physical_page is None:
             with self.latch:
-                self.num_pins -= 1
-            return result
-        return wrapper
+                physical_page = self.physical_pages[physical_page_index]
+                if physical_page is None:
+                    physical_page = self.__load_physical_page(physical_page_index)
+                    self.physical_pages[physical_page_index] = physical_page
+        return physical_page
+
+    def get_num_loaded_physical_pages(self)->int:
+        return sum(_ is not None for _ in self.physical_pages)
 
     def __set_dirty_bit(self)->None:
         self.is_dirty = True
 
-    def get_last_time_used(self)->datetime:
-        return self.last_time_used
+    def pin(self)->None:
+        with self.latch:
+            self.num_pins += 1
 
-    def write_frame_to_disk(self)->None:
-        if self.is_dirty:
-            for physical_page in self.physical_pages:
-                physical_page.write_data_to_disk()
+    def unpin(self)->None:
+        with self.latch:
+            self.num_pins -= 1
+
+    def __write_entry(self, physical_page_index:int, entry_value, id:int)->None:
+        """
+        Writes an entry, remembering the overwritten value for the running transaction.
+        """
+        physical_page = self.__get_physical_page(physical_page_index)
+        transaction = TRANSACTION_CONTEXT.get_transaction()
+        if transaction is not None:
+            transaction.track_write(self, physical_page_index, id, physical_page.read_record_info_from_data(id))
+        elif self.log_manager is not None:
+            # the change was logged right before it is applied
+            self.page_lsn = max(self.page_lsn, self.log_manager.get_last_lsn())
+        physical_page.write_record_info_to_data(entry_value, id)
 
-    def keep_original_frame_to_disk(self)->None:
+    def write_frame_to_disk(self)->None:
         if self.is_dirty:
             for physical_page in self.physical_pages:
-                physical_page.keep_original_data_to_disk()
+                if physical_page is not None:
+                    physical_page.write_data_to_disk()
+            self.is_dirty = False
+        # the page LSN is only persisted once the data it covers is on disk
+        if self.page_lsn > self.disk_page_lsn:
+            CATALOG.set_metadata_field(self.page_path, "page_lsn", self.page_lsn)
+            self.disk_page_lsn = self.page_lsn
+
+    def discard(self)->None:
+        # nothing of a deleted page has to reach the disk (or the catalog)
+        self.is_dirty = False
+        self.disk_page_lsn = self.page_lsn
+
+    def write_physical_page_to_disk(self, physical_page_index:int)->None:
+        # physical pages never loaded were never written
+        if self.physical_pages[physical_page_index] is not None:
+            self.physical_pages[physical_page_index].write_data_to_disk()
+
+    def restore_entry(self, physical_page_index:int, id:int, entry_value:int)->None:
+        self.__get_physical_page(physical_page_index).write_record_info_to_data(entry_value, id)
+        self.__set_dirty_bit()
 
-    @__pin_frame_decorator
-    def insert_record(self, record:Record)->None:
+    def insert_record(self, record:Record, timestamp:int|None=None)->None:
+        """
+        Writes a record, timestamped as a new version unless a timestamp is given.
+        """
         rid = int(record.get_rid())
-        # create metadata for data
-        self.physical_pages[Config.INDIRECTION_COLUMN].write_record_info_to_data(INITIAL_INDIRECTION_VALUE, rid)
-        self.physical_pages[Config.RID_COLUMN].write_record_info_to_data(rid, rid)
-        self.physical_pages[Config.TIMESTAMP_COLUMN].write_record_info_to_data(datetime.now().timestamp(), rid)
-        self.physical_pages[Config.SCHEMA_ENCODING_COLUMN].write_record_info_to_data(INITIAL_SCHEMA_ENCODING, rid)
-
         # write columns to data
         for i, entry_value in enumerate(record.get_columns()):
-            self.physical_pages[i+Config.NUM_METADATA_COLUMNS].write_record_info_to_data(entry_value, rid)
+            self.__write_entry(i+Config.NUM_METADATA_COLUMNS, entry_value, rid)
+
+        # create metadata for data, timestamp and RID last so lock-free readers never see a partial record
+        self.__write_entry(Config.INDIRECTION_COLUMN, INITIAL_INDIRECTION_VALUE, rid)
+        self.__write_entry(Config.SCHEMA_ENCODING_COLUMN, INITIAL_SCHEMA_ENCODING, rid)
+        if timestamp is None:
+            timestamp = TIMESTAMP_ORACLE.get_write_timestamp()
+        self.__write_entry(Config.TIMESTAMP_COLUMN, timestamp, rid)
+        self.__write_entry(Config.RID_COLUMN, rid, rid)
 
         # set frame as dirty
         self.__set_dirty_bit()
 
-    @__pin_frame_decorator
     def get_schema_encoding(self, rid:RID)->bitarray:
         rbarr = bitarray()
-        rbarr.frombytes(self.physical_pages[Config.SCHEMA_ENCODING_COLUMN].read_record_info_from_data(int(rid)).to_bytes(Config.RECORD_FIELD_SIZE, "big"))
+        rbarr.frombytes(self.__get_physical_page(Config.SCHEMA_ENCODING_COLUMN).read_record_info_from_data(int(rid)).to_bytes(Config.RECORD_FIELD_SIZE, "big"))
         rbarr = rbarr[-self.num_columns:]
         return rbarr
 
-    @__pin_frame_decorator
     def set_schema_encoding(self, rid:RID, schema_encoding:bitarray)->None:
         schema_encoding = int(schema_encoding.to01(), 2)
-        self.physical_pages[Config.SCHEMA_ENCODING_COLUMN].write_record_info_to_data(schema_encoding, int(rid))
+        self.__write_entry(Config.SCHEMA_ENCODING_COLUMN, schema_encoding, int(rid))
         self.__set_dirty_bit()
 
-    @__pin_frame_decorator
     def get_indirection_tid(self, rid:RID)->TID:
-        return TID(self.physical_pages[Config.INDIRECTION_COLUMN].read_record_info_from_data(int(rid)))
+        return TID(self.__get_physical_page(Config.INDIRECTION_COLUMN).read_record_info_from_data(int(rid)))
 
-    @__pin_frame_decorator
     def set_indirection_tid(self, id:RID, tid:TID)->None:
-        self.physical_pages[Config.INDIRECTION_COLUMN].write_record_info_to_data(tid, int(id))
+        self.__write_entry(Config.INDIRECTION_COLUMN, tid, int(id))
         self.__set_dirty_bit()
 
-    @__pin_frame_decorator
     def get_record_entry(self, id:RID, column_index:int)->int:
-        return self.physical_pages[column_index+Config.NUM_METADATA_COLUMNS].read_record_info_from_data(int(id))
+        return self.__get_physical_page(column_index+Config.NUM_METADATA_COLUMNS).read_record_info_from_data(int(id))
+
+    def get_timestamp(self, id:RID)->int:
+        return self.__get_physical_page(Config.TIMESTAMP_COLUMN).read_record_info_from_data(int(id))
+
+    def get_column_entries(self, physical_page_index:int)->"numpy.ndarray|array":
+        return self.__get_physical_page(physical_page_index).read_entries()
+
+    def get_version_link(self, tid:TID)->tuple[int,TID]:
+        """
+        Returns the depth of a tail record in its version chain (0 if unknown)
+        and its skip pointer. Tail records have no schema encoding of their
+        own, so the link is stored in their schema encoding column.
+        """
+        link = self.__get_physical_page(Config.SCHEMA_ENCODING_COLUMN).read_record_info_from_data(int(tid))
+        skip_tid = link & VERSION_SKIP_MASK
+        return (link >> VERSION_DEPTH_SHIFT, TID(-1 if skip_tid == VERSION_SKIP_MASK else skip_tid))
+
+    def set_version_link(self, tid:TID, depth:int, skip_tid:TID)->None:
+        link = depth << VERSION_DEPTH_SHIFT | (int(skip_tid) & VERSION_SKIP_MASK)
+        self.__write_entry(Config.SCHEMA_ENCODING_COLUMN, link, int(tid))
+        self.__set_dirty_bit()
 
-    @__pin_frame_decorator
     def delete_record(self, rid:RID)->None:
-        self.physical_pages[Config.RID_COLUMN].write_record_info_to_data(0, int(rid))
+        self.__write_entry(Config.RID_COLUMN, 0, int(rid))
         self.__set_dirty_bit()
 
+    def is_record_deleted(self, rid:RID)->bool:
+        # deleted records (and slots never written) have no RID
+        return not self.__get_physical_page(Config.RID_COLUMN).read_record_info_from_data(int(rid))
+
 
 class Physical_Page:
 
-    def __init__(self, physical_page_path:str, data:bytearray)->None:
+    # entries are stored as big-endian signed 8 byte integers
+    RECORD_FIELD_STRUCT:Struct = Struct(">q")
+
+    def __init__(self, physical_page_path:str, data:bytearray|memoryview)->None:
         assert len(data) == Config.PHYSICAL_PAGE_SIZE
-        self.physical_page_path:str  = physical_page_path
-        self.data:bytearray          = data
-        self.original_data:bytearray = data
+        self.physical_page_path:str     = physical_page_path
+        self.data:bytearray|memoryview  = data
+        self.is_dirty:bool              = False
 
     def __get_offset(self, rid:int)->int:
         return (rid - 1) * Config.RECORD_FIELD_SIZE % Config.PHYSICAL_PAGE_SIZE
 
-    def keep_original_data_to_disk(self)->int:
-        with io.open(self.physical_page_path, 'wb') as f:
-            f.write(self.original_data)
-
-    def write_data_to_disk(self)->int:
+    def _write_to_disk(self)->None:
         with io.open(self.physical_page_path, 'wb') as f:
             f.write(self.data)
 
+    def write_data_to_disk(self)->None:
+        if not self.is_dirty: return
+        self._write_to_disk()
+        self.is_dirty = False
+
     def write_record_info_to_data(self, entry_value, id:int)->None:
-        offset = self.__get_offset(id)
-        self.data = self.data[:offset] + \
-                    int(entry_value).to_bytes(Config.RECORD_FIELD_SIZE, "big", signed=True) + \
-                    self.data[offset+Config.RECORD_FIELD_SIZE:]
-        assert len(self.data) == Config.PHYSICAL_PAGE_SIZE
+        self.is_dirty = True
+        self.RECORD_FIELD_STRUCT.pack_into(self.data, self.__get_offset(id), int(entry_value))
 
     def read_record_info_from_data(self, id:int)->int:
-        offset = self.__get_offset(id)
-        return int.from_bytes(self.data[offset:offset+Config.RECORD_FIELD_SIZE], "big", signed=True)
+        return self.RECORD_FIELD_STRUCT.unpack_from(self.data, self.__get_offset(id))[0]
+
+    def read_entries(self)->"numpy.ndarray|array":
+        """
+        Decodes a copy of every entry of the page at once, as an int64 NumPy
+        array when NumPy is installed.
+        """
+        if numpy is not None:
+            return numpy.frombuffer(self.data, dtype=">i8").astype(numpy.int64)
+        entries = array("q", bytes(self.data))
+        if sys.byteorder == "little":
+            entries.byteswap()
+        return entries
+
+
+class Mapped_Physical_Page(Physical_Page):
+    """
+    Physical page backed by a stripe of a privately mapped segment file.
+
+    Reads and writes go straight to the mapping, writing to disk only writes
+    the stripe's range of the segment back to the file.
+    """
+
+    def __init__(self, segment:mmap, segment_fd:int, stripe_index:int)->None:
+        self.segment_fd:int    = segment_fd
+        self.stripe_offset:int = stripe_index * Config.PHYSICAL_PAGE_SIZE
+        super().__init__(
+            f"{SEGMENT_FILENAME}[{stripe_index}]",
+            memoryview(segment)[self.stripe_offset:self.stripe_offset+Config.PHYSICAL_PAGE_SIZE],
+        )
+
+    def _write_to_disk(self)->None:
+        os.pwrite(self.segment_fd, self.data, self.stripe_offset)
+
 
 BUFFERPOOL = Bufferpool()
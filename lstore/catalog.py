@@ -0,0 +1,64 @@
+from threading import RLock
+
+from lstore.disk import Disk
+
+
+class Catalog:
+    """
+    In-memory cache of the .metadata.pkl files of tables, page ranges and pages.
+
+    Metadata of new objects is written through so the directory tree can always
+    be loaded. Counters (num_records, latest_tid, page_lsn, ...) only change the
+    cached metadata and reach disk on checkpoint. After a crash they are
+    restored from the log.
+    """
+
+    def __init__(self)->None:
+        self.metadata:dict[str,dict] = dict()
+        self.dirty_paths:set[str]    = set()
+        self.latch:RLock             = RLock()
+
+    def read_metadata(self, path:str)->dict:
+        """
+        Returns the (cached) metadata of a path, which must not be modified directly.
+        """
+        with self.latch:
+            if not path in self.metadata:
+                self.metadata[path] = Disk.read_from_path_metadata(path)
+            return self.metadata[path]
+
+    def write_metadata(self, path:str, metadata:dict)->None:
+        with self.latch:
+            Disk.write_to_path_metadata(path, metadata)
+            self.metadata[path] = dict(metadata)
+            self.dirty_paths.discard(path)
+
+    def set_metadata_field(self, path:str, field:str, value)->None:
+        with self.latch:
+            self.read_metadata(path)[field] = value
+            self.dirty_paths.add(path)
+
+    def remove_metadata(self, path:str)->None:
+        """
+        Forgets the metadata of a path about to be deleted.
+        """
+        with self.latch:
+            self.metadata.pop(path, None)
+            self.dirty_paths.discard(path)
+
+    def checkpoint(self)->None:
+        """
+        Writes every modified metadata to disk.
+        """
+        with self.latch:
+            for path in self.dirty_paths:
+                Disk.write_to_path_metadata(path, self.metadata[path])
+            self.dirty_paths.clear()
+
+    def clear(self)->None:
+        with self.latch:
+            self.checkpoint()
+            self.metadata.clear()
+
+
+CATALOG = Catalog()
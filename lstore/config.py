@@ -10,12 +10,48 @@ RECORD_FIELD_SIZE = 8 # bytes
 PHYSICAL_PAGE_SIZE = 4096 # bytes
 NUM_RECORDS_PER_PAGE = 512 # records
 NUM_BASE_PAGES_PER_PAGE_RANGE = 4 # base pages
+FRAME_STORAGE_MODE = "MMAP" # MMAP (one mapped segment file per page) or FILES (one file per physical page)
 
 # index configuration
-INDEX_ORDER_NUMBER = 4
+INDEX_ORDER_NUMBER = 32 # children of a tree node, at most (INDEX_PAGE_SIZE - 8) / (INDEX_KEY_SIZE + INDEX_VALUE_SIZE + 8) + 1
+INDEX_PAGE_SIZE = 4096 # bytes of a tree node
+INDEX_KEY_SIZE = 8 # bytes of an entry value
+INDEX_VALUE_SIZE = 115 # bytes of a posting list kept in its leaf (9 + 8 per RID + 1 per 8 RIDs, 13 RIDs), longer ones are written to overflow pages
+INDEX_CACHE_SIZE = 1024 # deserialized nodes cached per tree, 0 disables the cache
+INDEX_CACHE_REPLACEMENT_POLICY = "LRU" # LRU, CLOCK or LRU_K
+INDEX_RANGE_BATCH_SIZE = 256 # entry values a range scan reads from the tree at a time, the tree is unlocked in between
+PRIMARY_KEY_INDEX = "HASH" # HASH (in-memory key to RID map for point lookups, snapshotted on checkpoint) or BTREE (the on-disk tree only)
+POSTING_LIST_COMPACTION_RATIO = 0.5 # fraction of the RIDs of an entry value marked deleted before they are dropped from its posting list
 
 # bufferpool configuration
 NUM_FRAMES_IN_BUFFERPOOL = 100
+BUFFERPOOL_REPLACEMENT_POLICY = "LRU" # LRU, CLOCK or LRU_K
+LRU_K = 2 # number of references tracked per frame by LRU_K
+
+# lock configuration
+LOCK_WAIT_MODE = "BLOCK" # BLOCK (wait for conflicting locks) or NO_WAIT (abort on conflict)
+LOCK_TIMEOUT = None # seconds a blocked acquire waits before aborting, None waits forever
+DEADLOCK_CHECK_INTERVAL = 0.05 # seconds between deadlock checks of a blocked acquire
+LOCK_ESCALATION_THRESHOLD = 256 # record locks an owner takes in a page range before locking the whole page range
+
+# concurrency control configuration
+SNAPSHOT_READS = True # select/sum read the snapshot taken when the transaction started instead of locking records
+TRANSACTION_CONCURRENCY_MODE = "LOCKING" # default mode of a Transaction: LOCKING or OCC (optimistic)
+
+# transaction worker configuration
+TRANSACTION_MAX_ATTEMPTS = 16 # runs of a transaction before it is given up as aborted
+TRANSACTION_BACKOFF_BASE = 0.001 # seconds, doubled on every retry
+TRANSACTION_BACKOFF_MAX = 0.1 # seconds
+TRANSACTION_RETRY_ONLY_ON_LOCK_CONFLICT = True # do not retry transactions aborted by a failed query (e.g. duplicate key)
 
 # merge configuration
-MERGE_THRESHOLD = 1024
+MERGE_THRESHOLD = 1024 # tail records a page range accumulates before it is merged in the background
+
+# version retention configuration (compaction runs after merges, only when a limit is set)
+VERSION_RETENTION_COUNT = None # newest versions of a record kept, None keeps every version unless VERSION_RETENTION_PERIOD is set
+VERSION_RETENTION_PERIOD = None # seconds a replaced version stays readable, None keeps every version unless VERSION_RETENTION_COUNT is set
+COMPACTION_THRESHOLD = 4096 # tail records a page range merges after its last compaction before it is compacted again
+COMPACTION_MIN_GARBAGE = 0.5 # fraction of its versions a tail page must be able to drop before compaction rewrites it
+
+# log configuration
+GROUP_COMMIT_DELAY = 0 # seconds the group commit thread waits for more commits before an fsync
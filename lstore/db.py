@@ -1,15 +1,22 @@
 import os
 from threading import RLock
+from time import perf_counter
 
 from lstore.bufferpool import BUFFERPOOL
+from lstore.catalog import CATALOG
 from lstore.disk import Disk
+from lstore.log_info import Log_Manager, LOG_FILENAME, Log_Record_Type
+from lstore.merge_info import MERGE_MANAGER
 from lstore.table import Table
+from lstore.timestamp_info import TIMESTAMP_ORACLE
 
 class Database():
 
     def __init__(self)->None:
-        self.tables:dict[str,Table] = None
+        self.tables:dict[str,Table] = dict()
         self.db_path = ""
+        # write-ahead log of the database, its tables log their changes to it
+        self.log_manager:Log_Manager = Log_Manager()
 
         self.lock:RLock = RLock()
 
@@ -22,14 +29,61 @@ class Database():
             table_paths, _ = self.__get_tables()
             for table_path in table_paths:
                 table_name = os.path.basename(table_path)
-                metadata = Disk.read_from_path_metadata(table_path)
+                metadata = CATALOG.read_metadata(table_path)
                 self.tables[table_name] = Table(
                     metadata["table_path"],
                     metadata["num_columns"],
                     metadata["key_index"],
-                    metadata["num_records"]
+                    metadata["num_records"],
+                    self.log_manager,
                 )
 
+    def __recover(self, log_path:str)->None:
+        """
+        Replays the log left behind by a crash.
+
+        Analysis finds the committed transactions, redo reapplies their
+        records (and autocommitted ones) to every page whose LSN is older.
+        Changes of transactions without a commit record never reached the
+        disk (frames they dirty stay pinned), so undoing them only means not
+        redoing them. Indexes are then rebuilt from the recovered pages.
+        """
+        records = self.log_manager.read_records(log_path)
+        if not len([_ for _ in records if _.record_type != Log_Record_Type.CHECKPOINT]): return
+        start_time = perf_counter()
+
+        # analysis
+        commit_timestamps = {_.transaction_id: _.timestamp for _ in records if _.record_type == Log_Record_Type.COMMIT}
+
+        # redo (versions keep the commit timestamp they had before the crash)
+        num_redone = 0
+        unknown_table_names = set()
+        for record in records:
+            if record.record_type in (Log_Record_Type.COMMIT, Log_Record_Type.CHECKPOINT): continue
+            if record.transaction_id is not None and not record.transaction_id in commit_timestamps: continue
+            # logs written before each database had its own log may hold changes to the tables of another database
+            if not record.table_name in self.tables:
+                unknown_table_names.add(record.table_name)
+                continue
+            timestamp = record.timestamp if record.transaction_id is None else commit_timestamps[record.transaction_id]
+            if timestamp is not None:
+                TIMESTAMP_ORACLE.advance(timestamp)
+            self.tables[record.table_name].redo(record, timestamp)
+            num_redone += 1
+
+        if len(unknown_table_names):
+            print(f"Skipped the log records of unknown tables {sorted(unknown_table_names)}.")
+
+        # make the recovered state (and the indexes rebuilt from it) durable before the log is truncated
+        for table in self.tables.values():
+            table.index.rebuild()
+        self.checkpoint()
+
+        log_size = os.path.getsize(log_path) / (1024 * 1024)
+        recovery_time = perf_counter() - start_time
+        print(f"Recovered {num_redone}/{len(records)} log records ({log_size:.3f} MB) in {recovery_time:.3f}s "
+              f"({recovery_time / log_size if log_size else 0:.3f} s/MB).")
+
     def open(self, path:str)->None:
         self.tables = dict()
         self.db_path = path
@@ -40,11 +94,42 @@ class Database():
             self.__load_tables()
         else:
             print(f"Database at path {path} created.")
+        # recover before opening the log so replayed changes are not logged again
+        log_path = os.path.join(path, LOG_FILENAME)
+        self.__recover(log_path)
+        self.log_manager.open(log_path)
+        BUFFERPOOL.attach_log(path, self.log_manager)
+        self.log_manager.truncate()
+
+    def checkpoint(self)->None:
+        """
+        Persist every page and the catalog, after which the log is no longer needed.
+        """
+        # merges in flight would write pages after they were persisted
+        MERGE_MANAGER.wait()
+        for table in self.tables.values():
+            table.index.wait_for_builds()
+        BUFFERPOOL.commit_writes_to_disk()
+        for table in self.tables.values():
+            table.checkpoint()
+        CATALOG.checkpoint()
+        for table in self.tables.values():
+            table.remove_retired_pages()
 
     def close(self):
+        self.checkpoint()
+        if self.log_manager.is_open():
+            self.log_manager.truncate()
+            BUFFERPOOL.detach_log(self.log_manager)
+            self.log_manager.close()
+        # the tables may outlive the database (and its directory) in their callers' variables
+        for table in self.tables.values():
+            table.index.close()
         # delete tables (causes cascade of deletes)
         del self.tables
-        self.tables = None
+        self.tables = dict()
+        BUFFERPOOL.clear()
+        CATALOG.clear()
 
     def create_table(self, name:str, num_columns:int, key_index:int)->Table:
         """
@@ -66,8 +151,9 @@ class Database():
             "key_index": key_index,
             "num_records": 0,
         }
-        Disk.write_to_path_metadata(table_path, metadata)
-        table = Table(table_path, num_columns, key_index, 0)
+        CATALOG.write_metadata(table_path, metadata)
+        table = Table(table_path, num_columns, key_index, 0, self.log_manager)
+        self.tables[name] = table
         return table
 
     def drop_table(self, name:str)->None:
@@ -1,5 +1,6 @@
 import io
 import os
+import shutil
 from pickle import load, dump
 
 class Disk:
@@ -8,12 +9,20 @@ class Disk:
     if os.path.exists(path): raise FileExistsError
     os.mkdir(path)
 
+  def remove_path_directory(path:str)->None:
+    shutil.rmtree(path)
+
+  def get_path_size(path:str)->int:
+    return sum(os.path.getsize(os.path.join(dir_path, filename)) for dir_path, _, filenames in os.walk(path) for filename in filenames)
+
   def list_directories_in_path(path:str)->list[str]:
     rlist = os.listdir(path)
     try: rlist.remove(".metadata.pkl")
     except ValueError: pass
     try: rlist.remove("index")
     except ValueError: pass
+    try: rlist.remove("wal.log")
+    except ValueError: pass
     rlist = [os.path.join(path, _) for _ in rlist]
     return rlist
 
@@ -1,21 +1,181 @@
+import io
 import os
-from pickle import loads, dumps
+from array import array
+from bisect import bisect_left
+from bitarray import bitarray
+from itertools import groupby
+from pickle import loads
 from bplustree import BPlusTree
-from threading import RLock
+from bplustree.const import NODE_TYPE_BYTES, USED_PAGE_LENGTH_BYTES, PAGE_REFERENCE_BYTES, USED_KEY_LENGTH_BYTES, USED_VALUE_LENGTH_BYTES
+from threading import RLock, Thread
+from typing import Callable, Iterable, Iterator
 
-from lstore.disk import Disk
-from lstore.bufferpool import BUFFERPOOL
+from lstore.numpy_support import numpy
 from lstore.record_info import RID
+from lstore.replacement_policy import Replacement_Policy, REPLACEMENT_POLICIES
 import lstore.config as Config
 
 # source for bplustree module: https://github.com/NicolasLM/bplustree
 
+# (key, RID) pairs of the primary key hash index, written on checkpoint
+KEY_SNAPSHOT_FILENAME = "key.snapshot"
+
+
+# posting lists are tagged so the pickled RID sets of older indexes can still be read
+POSTING_LIST_TAG = b"P"
+
+
+class Posting_List:
+    """
+    RIDs of an entry value as a sorted int64 array, with a bitmap marking the
+    deleted ones.
+
+    RIDs are allocated in increasing order, so adding one appends it in place.
+    Deleting one only sets its bit, the deleted RIDs are dropped once they
+    make up POSTING_LIST_COMPACTION_RATIO of the list.
+    """
+
+    def __init__(self, rids:array|None=None, deleted:bitarray|None=None) -> None:
+        self.rids:array        = array("q") if rids is None else rids
+        self.deleted:bitarray  = bitarray(len(self.rids)) if deleted is None else deleted
+        if deleted is None: self.deleted.setall(0)
+        self.num_deleted:int   = self.deleted.count(1)
+
+    def __len__(self) -> int:
+        return len(self.rids) - self.num_deleted
+
+    def __iter__(self) -> Iterator[int]:
+        """
+        Yields the RIDs that are not deleted in increasing order.
+        """
+        if not self.num_deleted:
+            yield from self.rids
+            return
+        for i, rid in enumerate(self.rids):
+            if not self.deleted[i]: yield rid
+
+    def __find(self, rid:int) -> int:
+        return bisect_left(self.rids, rid)
+
+    def add(self, rid:int) -> None:
+        """
+        Adds an RID. If the RID exists, raises a KeyError.
+        """
+        if not len(self.rids) or rid > self.rids[-1]:
+            self.rids.append(rid)
+            self.deleted.append(0)
+            return
+        i = self.__find(rid)
+        if i < len(self.rids) and self.rids[i] == rid:
+            if not self.deleted[i]: raise KeyError
+            self.deleted[i] = 0
+            self.num_deleted -= 1
+            return
+        self.rids.insert(i, rid)
+        self.deleted.insert(i, 0)
+
+    def remove(self, rid:int) -> None:
+        """
+        Marks an RID as deleted, if it exists.
+        """
+        i = self.__find(rid)
+        if i == len(self.rids) or self.rids[i] != rid or self.deleted[i]: return
+        self.deleted[i] = 1
+        self.num_deleted += 1
+        if self.num_deleted >= len(self.rids) * Config.POSTING_LIST_COMPACTION_RATIO:
+            self.rids = array("q", iter(self))
+            self.deleted = bitarray(len(self.rids))
+            self.deleted.setall(0)
+            self.num_deleted = 0
+
+    def get_last_rid(self) -> int:
+        return self.rids[-1] if len(self.rids) else 0
+
+    def to_bitmap(self, size:int) -> bitarray:
+        """
+        Returns a bitmap of a given size with the bits of the RIDs set.
+        """
+        bitmap = bitarray(size)
+        bitmap.setall(0)
+        bitmap[self.rids if not self.num_deleted else array("q", self)] = 1
+        return bitmap
+
+    def to_bytes(self) -> bytes:
+        return POSTING_LIST_TAG + array("q", [len(self.rids)]).tobytes() + self.rids.tobytes() + self.deleted.tobytes()
+
+    @staticmethod
+    def from_bytes(data:bytes) -> "Posting_List":
+        if data[:1] != POSTING_LIST_TAG:
+            return Posting_List(array("q", sorted(int(_) for _ in loads(data))))
+        num_rids = array("q", data[1:9])[0]
+        rids = array("q", data[9:9 + 8 * num_rids])
+        deleted = bitarray()
+        deleted.frombytes(data[9 + 8 * num_rids:])
+        # drop the padding of the last byte
+        del deleted[num_rids:]
+        return Posting_List(rids, deleted)
+
+
+class Index_Cache:
+    """
+    Cache of the deserialized nodes of a tree, in place of the bplustree
+    library's own LRU cache, evicting nodes with a replacement policy of its
+    own (INDEX_CACHE_REPLACEMENT_POLICY, separate from the bufferpool's).
+
+    The tree only reads and writes it under the latch of its Index_Column.
+    """
+
+    def __init__(self, cache_size:int, replacement_policy:str=Config.INDEX_CACHE_REPLACEMENT_POLICY) -> None:
+        self.cache_size:int                         = cache_size
+        self.nodes:dict[int,object]                 = dict()  # {page: node}
+        self.replacement_policy_name:str            = replacement_policy
+        self.replacement_policy:Replacement_Policy  = REPLACEMENT_POLICIES[replacement_policy]()
+
+        self.num_hits:int                           = 0
+        self.num_misses:int                         = 0
+        self.num_evictions:int                      = 0
+
+    def get(self, page:int):
+        node = self.nodes.get(page)
+        if node is None:
+            self.num_misses += 1
+            return None
+        self.num_hits += 1
+        self.replacement_policy.record_access(page)
+        return node
+
+    def __setitem__(self, page:int, node) -> None:
+        if not page in self.nodes and len(self.nodes) >= self.cache_size:
+            victim = self.replacement_policy.choose_victim(lambda _: True)
+            self.replacement_policy.remove(victim)
+            del self.nodes[victim]
+            self.num_evictions += 1
+        self.nodes[page] = node
+        self.replacement_policy.record_access(page)
+
+    def clear(self) -> None:
+        # the tree drops its nodes when a transaction is rolled back
+        self.nodes.clear()
+        self.replacement_policy = REPLACEMENT_POLICIES[self.replacement_policy_name]()
+
 
 class Index_Column:
 
-    def __init__(self, file_path: str, order: int) -> None:
+    def __init__(self, file_path: str, order: int, page_size:int=Config.INDEX_PAGE_SIZE, key_size:int=Config.INDEX_KEY_SIZE,
+                 value_size:int=Config.INDEX_VALUE_SIZE, cache_size:int=Config.INDEX_CACHE_SIZE,
+                 cache_replacement_policy:str=Config.INDEX_CACHE_REPLACEMENT_POLICY) -> None:
+        # a leaf of order - 1 entries has to fit in a page, the tree only checks it once a leaf is written
+        entry_size = USED_KEY_LENGTH_BYTES + key_size + USED_VALUE_LENGTH_BYTES + value_size + PAGE_REFERENCE_BYTES
+        if NODE_TYPE_BYTES + USED_PAGE_LENGTH_BYTES + PAGE_REFERENCE_BYTES + (order - 1) * entry_size >= page_size:
+            raise ValueError
         self.file_path = file_path
-        self.tree = BPlusTree(filename=file_path, order=order)
+        # the order and sizes of an existing tree are read from its file
+        self.tree = BPlusTree(filename=file_path, page_size=page_size, order=order, key_size=key_size, value_size=value_size,
+                              cache_size=0)
+        self.cache:Index_Cache|None = None
+        if cache_size:
+            self.cache = Index_Cache(cache_size, cache_replacement_policy)
+            self.tree._mem._cache = self.cache
         self.is_key = False
 
         self.latch:RLock = RLock()
@@ -24,102 +184,144 @@ class Index_Column:
         """
         Delete index column.
         """
-        self.tree.close()
+        # not set when the options were rejected
+        if hasattr(self, "tree"): self.tree.close()
 
-    def __add_rid_to_non_existant_entry_value(self, entry_value, rid: RID) -> None:
+    def __get_posting_list(self, entry_value) -> Posting_List:
         """
-        Adds an RID to a non-existant entry value of the column's tree.
-
-        If entry value is found, raises a KeyError.
+        Returns the posting list of an entry value, empty if it is not found.
         """
-        if entry_value in self.tree:
-            raise KeyError
-        self.tree[entry_value] = dumps({rid})
+        # a single search of the tree, "in" followed by a lookup searches it twice
+        data = self.tree.get(entry_value)
+        return Posting_List() if data is None else Posting_List.from_bytes(data)
+
+    def __set_posting_list(self, entry_value, posting_list:Posting_List) -> None:
+        self.tree[entry_value] = posting_list.to_bytes()
 
-    def __add_rid_to_existing_entry_value(self, entry_value, rid: RID) -> None:
+    def __add_rid_to_entry_value(self, entry_value, rid: RID) -> None:
         """
-        Adds an RID to an existing entry value of the column's tree.
+        Adds an RID to an entry value of the column's tree.
 
-        If not entry value is found or the RID exists, raises a KeyError.
+        If the RID exists, raises a KeyError.
         """
-        if not entry_value in self.tree:
-            raise KeyError
-        entry_value_set = set(loads(self.tree[entry_value]))
-        if rid in entry_value_set:
-            raise KeyError
-        entry_value_set.add(rid)
-        self.tree[entry_value] = dumps(entry_value_set)
+        posting_list = self.__get_posting_list(entry_value)
+        posting_list.add(int(rid))
+        self.__set_posting_list(entry_value, posting_list)
 
     def __remove_rid_from_entry_value(self, entry_value, removed_rid:RID) -> None:
         """
         Deletes an RID from a specified entry value of the column's tree.
 
-        If no entry value or RID found, raises a KeyError.
+        If no entry value found, raises a KeyError.
         """
-        if not entry_value in self.tree:
+        data = self.tree.get(entry_value)
+        if data is None:
             raise KeyError
-        entry_value_set = set(loads(self.tree[entry_value]))
-        for rid in entry_value_set:
-            if int(rid) == int(removed_rid):
-                entry_value_set.remove(rid)
-                break
-        self.tree[entry_value] = dumps(entry_value_set)
+        posting_list = Posting_List.from_bytes(data)
+        posting_list.remove(int(removed_rid))
+        self.__set_posting_list(entry_value, posting_list)
 
     def set_as_primary_key(self):
         self.is_key = True
 
     def add_value(self, entry_value, rid: int) -> None:
         with self.latch:
-            if not entry_value in self.tree:
-                self.__add_rid_to_non_existant_entry_value(entry_value, rid)
-            else:
-                self.__add_rid_to_existing_entry_value(entry_value, rid)
+            self.__add_rid_to_entry_value(entry_value, rid)
 
     def update_value(self, old_entry_value, new_entry_value, rid: RID) -> None:
         with self.latch:
             self.__remove_rid_from_entry_value(old_entry_value, rid)
-            if not new_entry_value in self.tree:
-                self.__add_rid_to_non_existant_entry_value(new_entry_value, rid)
-            else:
-                self.__add_rid_to_existing_entry_value(new_entry_value, rid)
+            self.__add_rid_to_entry_value(new_entry_value, rid)
 
     def delete_value(self, entry_value, rid: RID) -> None:
         with self.latch:
             self.__remove_rid_from_entry_value(entry_value, rid)
 
-    def get_single_entry(self, entry_value) -> set[RID]:
+    def load_entries(self, entries:Iterable[tuple]) -> None:
+        """
+        Loads (entry value, posting list) pairs in increasing order of entry
+        values into an empty tree at once: leaves are filled left to right
+        without searching the tree for every entry value.
+        """
+        with self.latch:
+            self.tree.batch_insert((entry_value, posting_list.to_bytes()) for entry_value, posting_list in entries)
+
+    def get_posting_list(self, entry_value) -> Posting_List:
         with self.latch:
-            if not entry_value in self.tree:
-                return {}
-            return set(loads(self.tree[entry_value]))
+            return self.__get_posting_list(entry_value)
+
+    def get_single_entry(self, entry_value) -> list[RID]:
+        return [RID(_) for _ in self.get_posting_list(entry_value)]
 
-    def get_ranged_entry(self, lower_bound, upper_bound) -> set[RID]:
+    def __get_entries(self, lower_bound, upper_bound, is_lower_bound_included:bool) -> list[tuple]:
+        """
+        Returns up to INDEX_RANGE_BATCH_SIZE (entry value, serialized posting list) pairs
+        between the bounds, seeking to the lower bound instead of scanning
+        the tree from its first leaf.
+        """
+        entries = list()
         with self.latch:
-            rset = set()
+            tree_entries = self.tree.items(slice(lower_bound, None))
             try:
-                for key, rids in self.tree.items():
-                    if lower_bound <= key and key <= upper_bound:
-                        rset = rset.union(set(loads(rids)))
-            except RuntimeError:  # bypasses issue w/ using iteration on tree
+                for key, rids in tree_entries:
+                    if key > upper_bound: break
+                    if key == lower_bound and not is_lower_bound_included: continue
+                    entries.append((key, rids))
+                    if len(entries) == Config.INDEX_RANGE_BATCH_SIZE: break
+            # the tree's iterator raises a RuntimeError past its last leaf (StopIteration raised in a generator)
+            except RuntimeError:
                 pass
-            return rset
+            finally:
+                # releases the tree's read lock
+                tree_entries.close()
+        return entries
+
+    def get_ranged_entry(self, lower_bound, upper_bound) -> Iterator[RID]:
+        """
+        Yields the RIDs of the entry values between the bounds (inclusive) in
+        key order. The tree is read in batches, so it is not locked while the
+        caller consumes them.
+        """
+        is_lower_bound_included = True
+        while True:
+            entries = self.__get_entries(lower_bound, upper_bound, is_lower_bound_included)
+            for _, rids in entries:
+                yield from map(RID, Posting_List.from_bytes(rids))
+            if len(entries) < Config.INDEX_RANGE_BATCH_SIZE: return
+            # the next batch starts after the last entry value of this one
+            lower_bound, is_lower_bound_included = entries[-1][0], False
 
 
 class Index:
 
-    def __init__(self, table_dir_path:str, num_columns:int, primary_key_index:int) -> None:
+    def __init__(self, table_dir_path:str, num_columns:int, primary_key_index:int,
+                 scan_column:Callable[[int],Iterator[tuple]], order:int=Config.INDEX_ORDER_NUMBER,
+                 page_size:int=Config.INDEX_PAGE_SIZE, key_size:int=Config.INDEX_KEY_SIZE, value_size:int=Config.INDEX_VALUE_SIZE,
+                 cache_size:int=Config.INDEX_CACHE_SIZE, cache_replacement_policy:str=Config.INDEX_CACHE_REPLACEMENT_POLICY) -> None:
         assert primary_key_index < num_columns, IndexError
 
         self.index_dir_path:str              = os.path.join(table_dir_path, "index")
         self.num_columns:int                 = num_columns
         self.primary_key_index:int           = primary_key_index
-        self.order:int                       = Config.INDEX_ORDER_NUMBER
+        # batches of (newest values of a column, RIDs of the values) of the records that are not deleted, read by the table
+        self.scan_column:Callable[[int],Iterator[tuple]] = scan_column
+        # options of the trees of new indexes (create_index may override them), existing trees keep their own
+        self.tree_options:dict               = {"order": order, "page_size": page_size, "key_size": key_size, "value_size": value_size,
+                                                "cache_size": cache_size, "cache_replacement_policy": cache_replacement_policy}
         self.indices:dict[int, Index_Column] = dict()  # {column_index: Index_Column}
+        # the primary key's tree is then only read by range queries
+        self.key_rids:dict[int,int]|None     = dict() if Config.PRIMARY_KEY_INDEX == "HASH" else None  # {key: RID}
+        # changes to the columns of indexes being built, replayed on them once built
+        self.build_changes:dict[int,list[tuple]] = dict()  # {column_index: [(entry value, RID, is added)]}
+        self.build_threads:list[Thread]      = list()
+        # exceptions of the builds run in the background, raised by wait_for_builds
+        self.build_errors:list[Exception]    = list()
 
         self.latch:RLock                      = RLock()
 
         if os.path.exists(self.index_dir_path):
             self.__load_column_indices()
+            self.__load_key_rids()
         else:
             os.makedirs(self.index_dir_path, exist_ok=False)
             # always have an index for the primary key
@@ -128,9 +330,43 @@ class Index:
     def __load_column_indices(self) -> None:
         with self.latch:
             for column_db_file in os.listdir(self.index_dir_path):
+                # skip the trees' own write-ahead logs
+                if not column_db_file.endswith(".db"): continue
                 column_index = int(column_db_file.removesuffix(".db"))
                 column_index_path = os.path.join(self.index_dir_path, column_db_file)
-                self.indices[column_index] = Index_Column(column_index_path, self.order)
+                self.indices[column_index] = Index_Column(column_index_path, **self.tree_options)
+
+    def __load_key_rids(self) -> None:
+        """
+        Loads the primary key hash index from the snapshot of the last
+        checkpoint, or from the primary key's tree without one.
+
+        The snapshot is removed once loaded, it is only trusted until the
+        index changes (the next checkpoint writes it again).
+        """
+        if self.key_rids is None: return
+        snapshot_path = os.path.join(self.index_dir_path, KEY_SNAPSHOT_FILENAME)
+        if os.path.exists(snapshot_path):
+            pairs = array("q")
+            with io.open(snapshot_path, "rb") as f:
+                pairs.frombytes(f.read())
+            self.key_rids = dict(zip(pairs[0::2], pairs[1::2]))
+            os.remove(snapshot_path)
+            return
+        tree_entries = self.indices[self.primary_key_index].tree.items()
+        try:
+            for key, rids in tree_entries:
+                for rid in Posting_List.from_bytes(rids):
+                    self.key_rids[key] = rid
+        # the tree's iterator raises a RuntimeError past its last leaf
+        except RuntimeError:
+            pass
+        finally:
+            tree_entries.close()
+
+    def __remove_index_files(self, column_index: int) -> None:
+        for filename in (self.__get_column_index_filename(column_index), f"{self.__get_column_index_filename(column_index)}-wal"):
+            if os.path.exists(filename): os.remove(filename)
 
     def __get_column_index_filename(self, column_index: int) -> str:
         return os.path.join(self.index_dir_path, f"{column_index}.db")
@@ -148,30 +384,151 @@ class Index:
         if len(columns) != self.num_columns:
             raise ValueError
 
-    def create_index(self, column_index: int) -> None:
+    def create_index(self, column_index: int, background: bool = False, **tree_options) -> None:
         """
         Creates an index for a specified column. This scans the existing data
-        in the disk.
+        in the disk a page range at a time, sorts it and loads it into the
+        tree at once.
+
+        In the background, the index is built by a thread while the table keeps
+        serving writes, and is used once it is built.
+
+        Tree options (order, page_size, key_size, value_size, cache_size,
+        cache_replacement_policy) override the ones of the Index.
         """
         with self.latch:
             if self.__does_index_filename_exist(column_index): raise FileExistsError
             if self.__is_index_in_indices(column_index): raise KeyError
 
-            self.indices[column_index] = Index_Column(self.__get_column_index_filename(column_index), self.order)
-
-            # add column index values and their respective RIDs to the new tree
-            num_records:int = Disk.read_from_path_metadata(os.path.dirname(self.index_dir_path))["num_records"]
-            for rid in range(1, num_records+1):
-                rid = RID(rid)
-                # get info of rid's base page
-                base_page_path = os.path.join(os.path.dirname(self.index_dir_path), f"PR{rid.get_page_range_index()}", f"BP{rid.get_base_page_index()}")
-                assert os.path.isdir(base_page_path)
-                tid = BUFFERPOOL.get_indirection_tid(rid, base_page_path)
-                tail_page_path = os.path.join(os.path.dirname(self.index_dir_path), f"PR{tid.get_page_range_index()}", f"TP{tid.get_tail_page_index()}")
-                schema_encoding = BUFFERPOOL.get_schema_encoding(rid, base_page_path)
-                if not schema_encoding[column_index]: entry_val = BUFFERPOOL.get_record_entry(rid, base_page_path, column_index)
-                else:                                 entry_val = BUFFERPOOL.get_record_entry(tid, tail_page_path, column_index)
-                self.indices[column_index].add_value(entry_val, rid)
+            index_column = Index_Column(self.__get_column_index_filename(column_index), **{**self.tree_options, **tree_options})
+            if self.__is_index_key(column_index) and self.key_rids is not None:
+                self.key_rids.clear()
+            self.build_changes[column_index] = list()
+
+        if not background:
+            self.__build_index(column_index, index_column)
+            return
+        thread = Thread(target=self.__build_index_in_background, args=(column_index, index_column), daemon=True)
+        with self.latch:
+            self.build_threads = [_ for _ in self.build_threads if _.is_alive()] + [thread]
+        thread.start()
+
+    def __sort_entries(self, column_index: int) -> Iterator[tuple[int,Posting_List]]:
+        """
+        Yields the entry values of a column with their posting lists, in
+        increasing order of entry values.
+        """
+        is_key = self.__is_index_key(column_index) and self.key_rids is not None
+        batches = list(self.scan_column(column_index))
+        if numpy is not None:
+            entry_values = numpy.concatenate([numpy.asarray(values, dtype=numpy.int64) for values, _ in batches] + [numpy.zeros(0, dtype=numpy.int64)])
+            rids = numpy.concatenate([numpy.asarray(rids, dtype=numpy.int64) for _, rids in batches] + [numpy.zeros(0, dtype=numpy.int64)])
+            order = numpy.lexsort((rids, entry_values))
+            entry_values, rids = entry_values[order], rids[order]
+            bounds = [0] + (numpy.flatnonzero(entry_values[1:] != entry_values[:-1]) + 1).tolist() + [len(entry_values)]
+            for start, end in zip(bounds[:-1], bounds[1:]):
+                if start == end: continue
+                if is_key: self.key_rids[int(entry_values[start])] = int(rids[start])
+                yield (int(entry_values[start]), Posting_List(array("q", rids[start:end].tobytes())))
+            return
+        entries = sorted((entry_value, rid) for values, rids in batches for entry_value, rid in zip(values, rids))
+        for entry_value, group in groupby(entries, key=lambda _: _[0]):
+            posting_list = Posting_List(array("q", (rid for _, rid in group)))
+            if is_key: self.key_rids[entry_value] = posting_list.rids[0]
+            yield (entry_value, posting_list)
+
+    def __build_index(self, column_index: int, index_column: Index_Column) -> None:
+        try:
+            index_column.load_entries(self.__sort_entries(column_index))
+            with self.latch:
+                # changes made while the index was built, the scan may already have seen them
+                for entry_value, rid, is_added in self.build_changes[column_index]:
+                    try:
+                        if is_added: index_column.add_value(entry_value, rid)
+                        else: index_column.delete_value(entry_value, rid)
+                    except KeyError:
+                        pass
+                self.indices[column_index] = index_column
+        except Exception:
+            # a partly built tree would be loaded as the column's index at the next open
+            index_column.tree.close()
+            self.__remove_index_files(column_index)
+            raise
+        finally:
+            with self.latch:
+                del self.build_changes[column_index]
+
+    def __build_index_in_background(self, column_index: int, index_column: Index_Column) -> None:
+        try:
+            self.__build_index(column_index, index_column)
+        except Exception as exception:
+            with self.latch:
+                self.build_errors.append(exception)
+
+    def get_cache_stats(self) -> dict:
+        """
+        Returns the statistics of the node caches of the index trees.
+        """
+        with self.latch:
+            caches = [_.cache for _ in self.indices.values() if _.cache is not None]
+        num_hits, num_misses = sum(_.num_hits for _ in caches), sum(_.num_misses for _ in caches)
+        return {
+            "hits": num_hits,
+            "misses": num_misses,
+            "evictions": sum(_.num_evictions for _ in caches),
+            "hit_rate": num_hits / (num_hits + num_misses) if num_hits + num_misses else 0.0,
+            "cached_nodes": sum(len(_.nodes) for _ in caches),
+        }
+
+    def wait_for_builds(self) -> None:
+        """
+        Waits for the indexes being built in the background, raising the
+        exception of a build that failed.
+        """
+        with self.latch:
+            build_threads = list(self.build_threads)
+        for thread in build_threads:
+            thread.join()
+        with self.latch:
+            build_errors, self.build_errors = self.build_errors, list()
+        if len(build_errors):
+            raise build_errors[0]
+
+    def rebuild(self) -> None:
+        """
+        Recreates every index from the data on disk (e.g. after crash recovery).
+        """
+        with self.latch:
+            for column_index in list(self.indices):
+                self.indices.pop(column_index).tree.close()
+                self.__remove_index_files(column_index)
+                self.create_index(column_index)
+
+    def close(self) -> None:
+        """
+        Closes the trees of the indexes, so their files can be deleted.
+        """
+        with self.latch:
+            for index_column in self.indices.values():
+                index_column.tree.close()
+            self.indices = dict()
+
+    def checkpoint(self) -> None:
+        """
+        Writes a snapshot of the primary key hash index, loaded instead of
+        the primary key's tree at the next open.
+        """
+        with self.latch:
+            if self.key_rids is None: return
+            pairs = array("q")
+            for key, rid in self.key_rids.items():
+                pairs.append(key)
+                pairs.append(rid)
+            snapshot_path = os.path.join(self.index_dir_path, KEY_SNAPSHOT_FILENAME)
+            # a crash while writing leaves the previous snapshot, or none
+            with io.open(f"{snapshot_path}.tmp", "wb") as f:
+                f.write(pairs.tobytes())
+            os.replace(f"{snapshot_path}.tmp", snapshot_path)
 
     def drop_index(self, column_index: int) -> None:
         """
@@ -187,8 +544,8 @@ class Index:
             if self.__is_index_key(column_index):
                 raise ValueError
             assert column_index in self.indices
-            del self.indices[column_index]
-            os.remove(self.__get_column_index_filename(column_index))
+            self.indices.pop(column_index).tree.close()
+            self.__remove_index_files(column_index)
 
     def insert(self, record_columns:tuple, rid:RID) -> None:
         """
@@ -199,6 +556,10 @@ class Index:
             for i, record_entry_value in enumerate(record_columns):
                 if i in self.indices:
                     self.indices[i].add_value(record_entry_value, rid)
+            for i, changes in self.build_changes.items():
+                changes.append((record_columns[i], rid, True))
+            if self.key_rids is not None:
+                self.key_rids[record_columns[self.primary_key_index]] = int(rid)
 
     def delete(self, record_columns:tuple, rid:RID) -> None:
         """
@@ -209,21 +570,58 @@ class Index:
             for i, record_entry_value in enumerate(record_columns):
                 if i in self.indices:
                     self.indices[i].delete_value(record_entry_value, rid)
-
-    def locate(self, entry_value, column_index: int) -> set[RID]:
+            for i, changes in self.build_changes.items():
+                changes.append((record_columns[i], rid, False))
+            if self.key_rids is not None and self.key_rids.get(record_columns[self.primary_key_index]) == int(rid):
+                del self.key_rids[record_columns[self.primary_key_index]]
+
+    def __get_posting_list(self, entry_value, column_index: int) -> Posting_List:
+        if self.__is_index_key(column_index) and self.key_rids is not None:
+            rid = self.key_rids.get(entry_value)
+            return Posting_List(array("q", [] if rid is None else [rid]))
+        return self.indices[column_index].get_posting_list(entry_value)
+
+    def locate(self, entry_value, column_index: int) -> list[RID]:
         """
         Returns the location of all records with the given value
-        within a specified column.
+        within a specified column, in RID order.
         """
         with self.latch:
             if not column_index in self.indices:
                 raise KeyError
+            if self.__is_index_key(column_index) and self.key_rids is not None:
+                rid = self.key_rids.get(entry_value)
+                return [] if rid is None else [RID(rid)]
             return self.indices[column_index].get_single_entry(entry_value)
 
-    def locate_range(self, begin, end, column_index: int) -> set[RID]:
+    def locate_all(self, search_keys:dict, match_any:bool=False) -> list[RID]:
+        """
+        Returns the location of all records with the given values in every
+        (or with match_any, in any) of the specified columns, in RID order.
+        The posting lists are combined as bitmaps with AND (or OR).
+
+        Columns without an index are left out of an AND for the caller to
+        check. If none (or with match_any, not all) of the columns are
+        indexed, raises a KeyError.
+        """
+        with self.latch:
+            indexed_keys = [(i, _) for i, _ in search_keys.items() if i in self.indices]
+            if not len(indexed_keys) or (match_any and len(indexed_keys) < len(search_keys)):
+                raise KeyError
+            if len(indexed_keys) == 1:
+                return self.locate(indexed_keys[0][1], indexed_keys[0][0])
+            posting_lists = [self.__get_posting_list(_, i) for i, _ in indexed_keys]
+        size = max(_.get_last_rid() for _ in posting_lists) + 1
+        bitmap = posting_lists[0].to_bitmap(size)
+        for posting_list in posting_lists[1:]:
+            if match_any: bitmap |= posting_list.to_bitmap(size)
+            else: bitmap &= posting_list.to_bitmap(size)
+        return [RID(_) for _ in bitmap.search(1)]
+
+    def locate_range(self, begin, end, column_index: int) -> Iterator[RID]:
         """
         Returns the RIDs of all records with values in a specified column
-        between "begin" and "end" (bounds-inclusive).
+        between "begin" and "end" (bounds-inclusive), in order of their values.
         """
         with self.latch:
             if not column_index in self.indices:
@@ -239,3 +637,9 @@ class Index:
             for i in range(len(new_entries)):
                 if new_entries[i] != None and new_entries[i] != old_entries[i] and i in self.indices:
                     self.indices[i].update_value(old_entries[i], new_entries[i], rid)
+                    if self.__is_index_key(i) and self.key_rids is not None:
+                        del self.key_rids[old_entries[i]]
+                        self.key_rids[new_entries[i]] = int(rid)
+            for i, changes in self.build_changes.items():
+                if new_entries[i] != None and new_entries[i] != old_entries[i]:
+                    changes.extend(((old_entries[i], rid, False), (new_entries[i], rid, True)))
@@ -1,51 +1,325 @@
 import threading
 from collections import defaultdict
+from enum import Enum
+from time import perf_counter
 
+import lstore.config as Config
+from lstore.record_info import RID
+from lstore.transaction_context import TRANSACTION_CONTEXT
 
 
-class Lock_Manager:
+class Lock_Mode(Enum):
+    IS = 0
+    IX = 1
+    S = 2
+    SIX = 3
+    X = 4
 
-    def __init__(self)->None:
-        self.locks:defaultdict[int,RWL] = defaultdict(RWL)
 
-    def acquire_read(self, page_range_index:int, search_key=None)->bool:
-        return self.locks[page_range_index].acquire_read()
+# COMPATIBLE[held][requested]
+COMPATIBLE:dict[Lock_Mode,set[Lock_Mode]] = {
+    Lock_Mode.IS:  {Lock_Mode.IS, Lock_Mode.IX, Lock_Mode.S, Lock_Mode.SIX},
+    Lock_Mode.IX:  {Lock_Mode.IS, Lock_Mode.IX},
+    Lock_Mode.S:   {Lock_Mode.IS, Lock_Mode.S},
+    Lock_Mode.SIX: {Lock_Mode.IS},
+    Lock_Mode.X:   set(),
+}
+
+# weakest mode granting both the held and the requested mode
+SUPREMUM:dict[tuple[Lock_Mode,Lock_Mode],Lock_Mode] = dict()
+for held in Lock_Mode:
+    for requested in Lock_Mode:
+        modes = {held, requested}
+        if Lock_Mode.X in modes:                        supremum = Lock_Mode.X
+        elif Lock_Mode.SIX in modes:                    supremum = Lock_Mode.SIX
+        elif modes == {Lock_Mode.S, Lock_Mode.IX}:      supremum = Lock_Mode.SIX
+        elif Lock_Mode.S in modes:                      supremum = Lock_Mode.S
+        elif Lock_Mode.IX in modes:                     supremum = Lock_Mode.IX
+        else:                                           supremum = Lock_Mode.IS
+        SUPREMUM[(held, requested)] = supremum
 
-    def acquire_write(self, page_range_index:int)->bool:
-        return self.locks[page_range_index].acquire_write()
-    
-    def release_read(self, page_range_index:int)->None:
-        self.locks[page_range_index].release_read()
+# modes of a page range lock that cover reads/writes of all of its records
+READ_COVERING_MODES:set[Lock_Mode]  = {Lock_Mode.S, Lock_Mode.SIX, Lock_Mode.X}
+WRITE_COVERING_MODES:set[Lock_Mode] = {Lock_Mode.X}
 
-    def release_write(self, page_range_index:int)->None:
-        self.locks[page_range_index].release_write()
+TABLE_RESOURCE = ("TABLE",)
 
 
-class RWL:
+class Wait_For_Graph:
+    """
+    Edges from waiting lock owners to the owners holding the locks they wait
+    for, shared by the lock managers of every table so that deadlocks across
+    tables are found too.
+
+    Cycles are searched whenever an owner (re)starts waiting. The youngest
+    transaction of a cycle (highest id) is chosen as the victim and aborts
+    the next time it checks is_victim while waiting.
+    """
 
     def __init__(self)->None:
-        self.num_readers:int = 0
-        self.is_writer:bool  = False
-        self.lock            = threading.RLock()
+        self.waits_for:dict[object,set] = dict()
+        self.victims:set                = set()
+        self.latch                      = threading.Lock()
 
-    def acquire_read(self)->bool:
-        with self.lock:
-            if self.is_writer:
-                return False
-            self.num_readers += 1
-        return True
+        # statistics
+        self.num_deadlocks:int          = 0
+
+    def __find_cycle(self, owner)->list|None:
+        # depth first search for a path from the owner back to itself
+        path = [owner]
+        stack = [iter(self.waits_for.get(owner, ()))]
+        visited = {owner}
+        while len(stack):
+            next_owner = next(stack[-1], None)
+            if next_owner is None:
+                stack.pop()
+                path.pop()
+            elif next_owner == owner:
+                return path
+            elif not next_owner in visited:
+                visited.add(next_owner)
+                path.append(next_owner)
+                stack.append(iter(self.waits_for.get(next_owner, ())))
+        return None
 
-    def acquire_write(self)->bool:
-        with self.lock:
-            if self.is_writer or self.num_readers:
+    def __get_age(self, owner)->int:
+        # queries run outside of a transaction (owned by a thread) are never younger
+        return owner.id if hasattr(owner, "id") else -1
+
+    def add_wait(self, owner, holders:set)->bool:
+        """
+        Records that the owner waits for the holders and returns True if that
+        closes a new cycle, in which case a victim has been chosen.
+        """
+        with self.latch:
+            self.waits_for[owner] = holders
+            cycle = self.__find_cycle(owner)
+            if cycle is None or any(_ in self.victims for _ in cycle):
                 return False
-            self.is_writer = True
+            self.victims.add(max(cycle, key=self.__get_age))
+            self.num_deadlocks += 1
+            return True
+
+    def remove_wait(self, owner)->None:
+        with self.latch:
+            self.waits_for.pop(owner, None)
+
+    def is_victim(self, owner)->bool:
+        with self.latch:
+            return owner in self.victims
+
+    def forget(self, owner)->None:
+        with self.latch:
+            self.waits_for.pop(owner, None)
+            self.victims.discard(owner)
+
+
+WAIT_FOR_GRAPH = Wait_For_Graph()
+
+
+class Lock_Manager:
+    """
+    Hierarchical locks of a table: IS/IX on the table and its page ranges,
+    S/X on records.
+
+    Locks belong to the running transaction, which holds them until it
+    commits or aborts (strict 2PL). Queries run outside of a transaction own
+    their locks through their thread and release them when they finish.
+    Once an owner holds LOCK_ESCALATION_THRESHOLD record locks in a page
+    range, it locks the whole page range instead.
+
+    In BLOCK mode an acquire waits until the lock is granted, LOCK_TIMEOUT
+    expires or the owner is chosen as a deadlock victim. In NO_WAIT mode it
+    fails right away. A failed acquire returns False so the query, and with
+    it the transaction, aborts.
+    """
+
+    def __init__(self, wait_mode:str=Config.LOCK_WAIT_MODE, timeout:float|None=Config.LOCK_TIMEOUT,
+                 escalation_threshold:int=Config.LOCK_ESCALATION_THRESHOLD)->None:
+        assert wait_mode in ("BLOCK", "NO_WAIT")
+        self.is_blocking:bool                          = wait_mode == "BLOCK"
+        self.timeout:float|None                        = timeout
+        self.escalation_threshold:int                  = escalation_threshold
+        self.condition                                 = threading.Condition(threading.Lock())
+
+        self.granted:defaultdict[tuple,dict]           = defaultdict(dict) # {resource: {owner: mode}}
+        self.owned:defaultdict[object,set[tuple]]      = defaultdict(set) # {owner: {resource}}
+        self.num_record_locks:defaultdict[object,defaultdict[int,int]] = defaultdict(lambda: defaultdict(int)) # {owner: {page range index: count}}
+
+        # statistics (lock table footprint and contention)
+        self.num_locks:int                             = 0
+        self.max_num_locks:int                         = 0
+        self.num_acquires:int                          = 0
+        self.num_waits:int                             = 0
+        self.num_timeouts:int                          = 0
+        self.num_escalations:int                       = 0
+        self.num_deadlocks:int                         = 0
+        self.wait_time:float                           = 0.0 # seconds
+
+    def __get_owner(self):
+        transaction = TRANSACTION_CONTEXT.get_transaction()
+        if transaction is None:
+            return threading.get_ident()
+        transaction.track_lock_manager(self)
+        return transaction
+
+    def __get_mode(self, owner, resource:tuple)->Lock_Mode|None:
+        return self.granted[resource].get(owner) if resource in self.granted else None
+
+    def __get_blocking_owners(self, owner, resource:tuple, mode:Lock_Mode)->set:
+        if not resource in self.granted: return set()
+        return {other_owner for other_owner, other_mode in self.granted[resource].items()
+                if other_owner != owner and not mode in COMPATIBLE[other_mode]}
+
+    def __is_grantable(self, owner, resource:tuple, mode:Lock_Mode)->bool:
+        return not len(self.__get_blocking_owners(owner, resource, mode))
+
+    def __wait(self, owner, resource:tuple, mode:Lock_Mode)->bool:
+        """
+        Waits until the lock can be granted. Returns False on timeout or when
+        the owner is chosen to break a deadlock. Must hold the condition.
+        """
+        self.num_waits += 1
+        start_time = perf_counter()
+        deadline = None if self.timeout is None else start_time + self.timeout
+        try:
+            while True:
+                blocking_owners = self.__get_blocking_owners(owner, resource, mode)
+                if not len(blocking_owners):
+                    return True
+                if WAIT_FOR_GRAPH.add_wait(owner, blocking_owners):
+                    self.num_deadlocks += 1
+                    # the victim may be waiting on this lock manager
+                    self.condition.notify_all()
+                if WAIT_FOR_GRAPH.is_victim(owner):
+                    return False
+                wait_time = Config.DEADLOCK_CHECK_INTERVAL
+                if deadline is not None:
+                    if perf_counter() >= deadline:
+                        self.num_timeouts += 1
+                        return False
+                    wait_time = min(wait_time, deadline - perf_counter())
+                # victims waiting on another lock manager notice when the wait times out
+                self.condition.wait(wait_time)
+        finally:
+            WAIT_FOR_GRAPH.remove_wait(owner)
+            self.wait_time += perf_counter() - start_time
+
+    def __acquire(self, owner, resource:tuple, mode:Lock_Mode)->bool:
+        """
+        Grants (or upgrades to) mode on the resource. Must hold the condition.
+        """
+        held_mode = self.__get_mode(owner, resource)
+        if held_mode is not None:
+            mode = SUPREMUM[(held_mode, mode)]
+            if mode == held_mode: return True
+        self.num_acquires += 1
+        if not self.__is_grantable(owner, resource, mode):
+            if not self.is_blocking: return False
+            if not self.__wait(owner, resource, mode): return False
+        if held_mode is None:
+            self.num_locks += 1
+            self.max_num_locks = max(self.max_num_locks, self.num_locks)
+        self.granted[resource][owner] = mode
+        self.owned[owner].add(resource)
         return True
 
-    def release_read(self)->None:
-        with self.lock:
-            self.num_readers -= 1
+    def __acquire_record(self, rid:RID, intention_mode:Lock_Mode, mode:Lock_Mode, covering_modes:set[Lock_Mode])->bool:
+        owner = self.__get_owner()
+        page_range_resource = ("PAGE_RANGE", rid.get_page_range_index())
+        record_resource = ("RECORD", int(rid))
+        with self.condition:
+            if not self.__acquire(owner, TABLE_RESOURCE, intention_mode): return False
+            # record is covered by an escalated page range lock
+            if self.__get_mode(owner, page_range_resource) in covering_modes: return True
+            if self.__get_mode(owner, record_resource) in (mode, Lock_Mode.X): return True
+            # escalate once the owner locked many records of the page range
+            if self.num_record_locks[owner][rid.get_page_range_index()] >= self.escalation_threshold:
+                self.num_escalations += 1
+                return self.__acquire(owner, page_range_resource, mode)
+            if not self.__acquire(owner, page_range_resource, intention_mode): return False
+            if not self.__acquire(owner, record_resource, mode): return False
+            self.num_record_locks[owner][rid.get_page_range_index()] += 1
+            return True
+
+    def __track_conflict(self, is_acquired:bool)->bool:
+        # tells the transaction it aborts because of a lock conflict (so it may be retried)
+        transaction = TRANSACTION_CONTEXT.get_transaction()
+        if not is_acquired and transaction is not None:
+            transaction.track_lock_conflict()
+        return is_acquired
+
+    def acquire_read(self, rid:RID)->bool:
+        return self.__track_conflict(self.__acquire_record(rid, Lock_Mode.IS, Lock_Mode.S, READ_COVERING_MODES))
+
+    def acquire_write(self, rid:RID)->bool:
+        return self.__track_conflict(self.__acquire_record(rid, Lock_Mode.IX, Lock_Mode.X, WRITE_COVERING_MODES))
+
+    def acquire_page_range_read(self, page_range_index:int)->bool:
+        """
+        Locks every record of a page range for reading at once, waiting for
+        the owners writing to it to finish.
+        """
+        owner = self.__get_owner()
+        with self.condition:
+            if not self.__acquire(owner, TABLE_RESOURCE, Lock_Mode.IS): return False
+            return self.__acquire(owner, ("PAGE_RANGE", page_range_index), Lock_Mode.S)
+
+    def is_write_locked(self, rid:RID)->bool:
+        """
+        Checks if another owner holds (or covers) a write lock on the record.
+        """
+        owner = self.__get_owner()
+        with self.condition:
+            for resource in (("RECORD", int(rid)), ("PAGE_RANGE", rid.get_page_range_index())):
+                if not resource in self.granted: continue
+                for other_owner, other_mode in self.granted[resource].items():
+                    if other_owner != owner and other_mode == Lock_Mode.X:
+                        return True
+            return False
+
+    def release_all(self, owner)->None:
+        """
+        Releases every lock of an owner in a single pass over its lock set.
+        """
+        with self.condition:
+            resources = self.owned.pop(owner, set())
+            for resource in resources:
+                del self.granted[resource][owner]
+                if not len(self.granted[resource]):
+                    del self.granted[resource]
+            self.num_locks -= len(resources)
+            self.num_record_locks.pop(owner, None)
+            self.condition.notify_all()
+        WAIT_FOR_GRAPH.forget(owner)
+
+    def release_query_locks(self)->None:
+        """
+        Releases the locks of a query run outside of a transaction. Transactions
+        keep their locks until they commit or abort.
+        """
+        if TRANSACTION_CONTEXT.get_transaction() is None:
+            self.release_all(threading.get_ident())
+
+    def get_stats(self)->dict:
+        with self.condition:
+            return {
+                "locks": self.num_locks,
+                "max_locks": self.max_num_locks,
+                "acquires": self.num_acquires,
+                "waits": self.num_waits,
+                "timeouts": self.num_timeouts,
+                "escalations": self.num_escalations,
+                "deadlocks": self.num_deadlocks,
+                "wait_time": self.wait_time,
+            }
 
-    def release_write(self)->None:
-        with self.lock:
-            self.is_writer = False
+    def reset_stats(self)->None:
+        with self.condition:
+            self.max_num_locks = self.num_locks
+            self.num_acquires = 0
+            self.num_waits = 0
+            self.num_timeouts = 0
+            self.num_escalations = 0
+            self.num_deadlocks = 0
+            self.wait_time = 0.0
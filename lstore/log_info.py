@@ -0,0 +1,204 @@
+import io
+import os
+from bitarray import bitarray
+from enum import Enum
+from pickle import loads, dumps
+from struct import Struct
+from threading import Condition, Thread
+from time import sleep
+from zlib import crc32
+
+import lstore.config as Config
+from lstore.transaction_context import TRANSACTION_CONTEXT
+
+LOG_FILENAME = "wal.log"
+
+class Log_Record_Type(Enum):
+    INSERT = 0
+    UPDATE = 1
+    DELETE = 2
+    COMMIT = 3
+    CHECKPOINT = 4
+
+
+class Log_Record:
+
+    def __init__(self, record_type:Log_Record_Type, table_name:str=None, page_range_index:int=None,
+                 rid:int=None, tid:int=None, previous_tid:int=None, columns:tuple=None,
+                 schema_encoding:bitarray=None, transaction_id:int|None=None, timestamp:int|None=None)->None:
+        self.lsn:int                     = 0
+        self.record_type:Log_Record_Type = record_type
+        # autocommitted records (run outside of a transaction) have no transaction id
+        self.transaction_id:int|None     = transaction_id
+        self.table_name:str              = table_name
+        self.page_range_index:int        = page_range_index
+        self.rid:int                     = rid
+        self.tid:int                     = tid
+        self.previous_tid:int            = previous_tid
+        self.columns:tuple               = columns
+        self.schema_encoding:bitarray    = schema_encoding
+        # commit timestamp of the versions written by the record (autocommitted) or by its transaction (COMMIT)
+        self.timestamp:int|None          = timestamp
+
+    def __str__(self)->str:
+        return f"LSN {self.lsn}: {self.record_type.name} T{self.transaction_id} {self.table_name} RID {self.rid} TID {self.tid}"
+
+
+class Log_Manager:
+    """
+    Append-only write-ahead log of logical insert/update/delete records.
+
+    Records are appended to an in-memory buffer and a group commit thread
+    writes and fsyncs everything buffered so far at once, so concurrent
+    commits share a single fsync.
+
+    Each database has a log of its own, its tables log their changes to it.
+    """
+
+    # each entry is prefixed by the length and checksum of its payload
+    HEADER_STRUCT:Struct = Struct(">II")
+
+    def __init__(self)->None:
+        self.log_path:str|None  = None
+        self.file:io.FileIO     = None
+        self.condition          = Condition()
+        self.pending:list[bytes] = list()
+        self.last_lsn:int       = 0
+        self.flushed_lsn:int    = 0
+        self.thread:Thread      = None
+        self.is_running:bool    = False
+
+        # statistics
+        self.num_flushes:int    = 0
+        self.num_records:int    = 0
+
+    def __encode(self, record:Log_Record)->bytes:
+        payload = dumps(record)
+        return self.HEADER_STRUCT.pack(len(payload), crc32(payload)) + payload
+
+    def __group_commit(self)->None:
+        while True:
+            with self.condition:
+                while not len(self.pending) and self.is_running:
+                    self.condition.wait()
+                if not len(self.pending) and not self.is_running:
+                    return
+            # let commits from other workers join the group
+            if Config.GROUP_COMMIT_DELAY:
+                sleep(Config.GROUP_COMMIT_DELAY)
+            with self.condition:
+                batch, self.pending = self.pending, list()
+                batch_lsn = self.last_lsn
+            self.file.write(b"".join(batch))
+            self.file.flush()
+            os.fsync(self.file.fileno())
+            with self.condition:
+                self.flushed_lsn = batch_lsn
+                self.num_flushes += 1
+                self.condition.notify_all()
+
+    def is_open(self)->bool:
+        return self.log_path is not None
+
+    def open(self, log_path:str)->None:
+        self.close()
+        self.log_path = log_path
+        records = self.read_records(log_path)
+        self.last_lsn = records[-1].lsn if len(records) else 0
+        self.flushed_lsn = self.last_lsn
+        self.file = io.open(self.log_path, 'ab')
+        self.is_running = True
+        self.thread = Thread(target=self.__group_commit, daemon=True)
+        self.thread.start()
+
+    def close(self)->None:
+        if not self.is_open(): return
+        with self.condition:
+            self.is_running = False
+            self.condition.notify_all()
+        self.thread.join()
+        self.file.close()
+        self.log_path = None
+        self.file = None
+        self.thread = None
+        self.last_lsn = 0
+        self.flushed_lsn = 0
+
+    def read_records(self, log_path:str)->list[Log_Record]:
+        """
+        Reads every complete record of a log. A torn record at the end of
+        the log (crash in the middle of a write) ends the log.
+        """
+        records = list()
+        if not os.path.isfile(log_path):
+            return records
+        with io.open(log_path, 'rb') as f:
+            data = f.read()
+        offset = 0
+        while offset + self.HEADER_STRUCT.size <= len(data):
+            length, checksum = self.HEADER_STRUCT.unpack_from(data, offset)
+            payload = data[offset+self.HEADER_STRUCT.size:offset+self.HEADER_STRUCT.size+length]
+            if len(payload) != length or crc32(payload) != checksum:
+                break
+            records.append(loads(payload))
+            offset += self.HEADER_STRUCT.size + length
+        return records
+
+    def truncate(self)->None:
+        """
+        Empties the log once every page it covers has been written to disk.
+
+        The log restarts with a checkpoint record so LSNs keep increasing.
+        """
+        self.flush()
+        with self.condition:
+            self.file.truncate(0)
+        self.append([Log_Record(Log_Record_Type.CHECKPOINT)])
+        self.flush()
+
+    def get_last_lsn(self)->int:
+        return self.last_lsn
+
+    def append(self, records:list[Log_Record])->int:
+        """
+        Buffers records at the end of the log and returns the LSN of the last one.
+        """
+        with self.condition:
+            for record in records:
+                self.last_lsn += 1
+                record.lsn = self.last_lsn
+                self.pending.append(self.__encode(record))
+            self.num_records += len(records)
+            self.condition.notify_all()
+            return self.last_lsn
+
+    def wait_flushed(self, lsn:int)->None:
+        """
+        Blocks until every record up to the LSN is durable.
+        """
+        if not self.is_open(): return
+        with self.condition:
+            while self.flushed_lsn < lsn:
+                self.condition.wait()
+
+    def is_flushed(self, lsn:int)->bool:
+        return not self.is_open() or self.flushed_lsn >= lsn
+
+    def flush(self)->None:
+        self.wait_flushed(self.last_lsn)
+
+    def log(self, record:Log_Record)->None:
+        """
+        Logs a record for the running transaction, which appends it on commit.
+        Outside of a transaction the record is appended right away.
+
+        Must be called before the change is applied to the pages.
+        """
+        if not self.is_open(): return
+        transaction = TRANSACTION_CONTEXT.get_transaction()
+        if transaction is not None:
+            record.transaction_id = transaction.id
+            transaction.track_log_record(self, record)
+        else:
+            self.append([record])
+
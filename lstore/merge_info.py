@@ -0,0 +1,90 @@
+from collections import deque
+from threading import Condition, Thread
+from time import perf_counter
+
+
+class Merge_Manager:
+    """
+    Background thread merging the tail records of page ranges into merged
+    base pages, so reads of updated records stop following tail pages.
+
+    A page range is queued once it accumulates MERGE_THRESHOLD tail records
+    since its last merge. Merges run one at a time, off the query threads,
+    each followed by the compaction of the merged tail pages.
+    """
+
+    def __init__(self)->None:
+        self.condition:Condition           = Condition()
+        self.queue:deque                   = deque() # page ranges waiting for (or being) merged
+        self.thread:Thread                 = None
+
+        # statistics
+        self.num_merges:int                = 0
+        self.merge_time:float              = 0.0 # seconds
+        self.num_compactions:int           = 0
+        self.num_dropped_versions:int      = 0
+        self.num_copied_versions:int       = 0
+        self.num_reclaimed_bytes:int       = 0 # on disk, freed by the checkpoint following the compaction
+        self.compaction_time:float         = 0.0 # seconds
+
+    def __run(self)->None:
+        while True:
+            with self.condition:
+                while not len(self.queue):
+                    self.condition.wait()
+                page_range = self.queue[0]
+            start_time = perf_counter()
+            try:
+                page_range.merge()
+            finally:
+                with self.condition:
+                    self.queue.popleft()
+                    self.num_merges += 1
+                    self.merge_time += perf_counter() - start_time
+                    self.condition.notify_all()
+
+    def schedule(self, page_range)->None:
+        """
+        Queues a page range to be merged in the background.
+        """
+        with self.condition:
+            self.queue.append(page_range)
+            if self.thread is None or not self.thread.is_alive():
+                self.thread = Thread(target=self.__run, daemon=True)
+                self.thread.start()
+            self.condition.notify_all()
+
+    def wait(self)->None:
+        """
+        Blocks until every queued merge is done.
+        """
+        with self.condition:
+            while len(self.queue):
+                self.condition.wait()
+
+    def track_compaction(self, num_dropped_versions:int, num_copied_versions:int, num_reclaimed_bytes:int,
+                         compaction_time:float)->None:
+        with self.condition:
+            self.num_compactions += 1
+            self.num_dropped_versions += num_dropped_versions
+            self.num_copied_versions += num_copied_versions
+            self.num_reclaimed_bytes += num_reclaimed_bytes
+            self.compaction_time += compaction_time
+
+    def get_stats(self)->dict:
+        with self.condition:
+            return {
+                "merges": self.num_merges,
+                "queued": len(self.queue),
+                "merge_time": self.merge_time,
+                "compactions": self.num_compactions,
+                "dropped_versions": self.num_dropped_versions,
+                "copied_versions": self.num_copied_versions,
+                "reclaimed_bytes": self.num_reclaimed_bytes,
+                "compaction_time": self.compaction_time,
+                # versions dropped per second of compaction
+                "compaction_throughput": self.num_dropped_versions / self.compaction_time if self.compaction_time else 0.0,
+            }
+
+
+MERGE_MANAGER = Merge_Manager()
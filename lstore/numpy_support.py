@@ -0,0 +1,5 @@
+# numpy is optional, batch scans decode pages into arrays (array.array) without it
+try:
+    import numpy
+except ImportError:
+    numpy = None
@@ -1,13 +1,42 @@
 import os
+from array import array
 from bitarray import bitarray
+from collections import defaultdict
 from enum import Enum
-from threading import RLock
+from threading import Lock, RLock
+from time import perf_counter, time
 from copy import deepcopy
 
 import lstore.config as Config
+from lstore.catalog import CATALOG
 from lstore.disk import Disk
 from lstore.bufferpool import BUFFERPOOL
+from lstore.log_info import Log_Manager, Log_Record, Log_Record_Type
+from lstore.merge_info import MERGE_MANAGER
+from lstore.numpy_support import numpy
 from lstore.record_info import Record, RID, TID
+from lstore.timestamp_info import TIMESTAMP_ORACLE, UNCOMMITTED_TIMESTAMP
+
+# depth of the version a skip pointer of a version at a given depth points to
+SKIP_DEPTHS:list[int] = [0]
+SKIP_DEPTHS_LATCH:Lock = Lock()
+
+def get_skip_depth(depth:int)->int:
+    """
+    Skew-binary jump pointers (Myers' random access stacks) only depend on the
+    depth of a version, so the depth they point to never has to be read.
+    """
+    if depth >= len(SKIP_DEPTHS):
+        with SKIP_DEPTHS_LATCH:
+            while len(SKIP_DEPTHS) <= depth:
+                parent_depth = len(SKIP_DEPTHS) - 1
+                skip_depth = SKIP_DEPTHS[parent_depth]
+                if parent_depth - skip_depth == skip_depth - SKIP_DEPTHS[skip_depth]:
+                    SKIP_DEPTHS.append(SKIP_DEPTHS[skip_depth])
+                else:
+                    SKIP_DEPTHS.append(parent_depth)
+    return SKIP_DEPTHS[depth]
+
 
 class Page_Type(Enum):
     ANY = 0
@@ -17,22 +46,38 @@ class Page_Type(Enum):
 
 class Page_Range:
 
-    def __init__(self, page_range_path:str, page_range_index:int, latest_tid:int, tps_index:int)->None:
+    def __init__(self, page_range_path:str, page_range_index:int, latest_tid:int, tps_index:int, num_columns:int, key_index:int,
+                 log_manager:Log_Manager)->None:
         self.page_range_path:str            = page_range_path
         self.page_range_index:int           = page_range_index
+        self.table_name:str                 = os.path.basename(os.path.dirname(page_range_path))
+        self.num_columns:int                = num_columns
+        self.key_index:int                  = key_index
+        # log of the table's database
+        self.log_manager:Log_Manager        = log_manager
         self.latest_tid:int                 = latest_tid
+        # every tail record up to the TPS is merged (or was rolled back)
         self.tps_index:int                  = tps_index
 
         self.latch:RLock                     = RLock()
 
         self.base_pages:dict[int,Base_Page] = dict()
         self.tail_pages:dict[int,Tail_Page] = dict()
+        # replaced as a whole by a merge, so readers always see a consistent set
+        self.merged_pages:dict[int,Merged_Page] = dict()
         self.__load_pages()
 
+        # TIDs allocated to tail records that are still being written
+        self.pending_tids:set[int]          = set()
+        self.is_merge_scheduled:bool        = False
+
+        # TPS of the last compaction, and pages replaced by merges and compactions, deleted once a checkpoint no longer uses them
+        self.compaction_tps_index:int         = 0
+        self.retired_page_paths:list[str]     = list()
+        self.reclaimable_page_paths:list[str] = list()
+
     def __del__(self)->None:
-        metadata = Disk.read_from_path_metadata(self.page_range_path)
-        metadata["latest_tid"] = self.latest_tid
-        Disk.write_to_path_metadata(self.page_range_path, metadata)
+        # counters reach the catalog on Database.checkpoint, a page range may outlive its database
         del self.base_pages
         self.base_pages = None
         del self.tail_pages
@@ -59,9 +104,40 @@ class Page_Range:
         with self.latch:
             page_paths, num_pages = self.__get_pages(Page_Type.ANY)
             if not num_pages: return
+            merged_page_paths = CATALOG.read_metadata(self.page_range_path).get("merged_page_paths", dict()).values()
+            compacted_page_paths = CATALOG.read_metadata(self.page_range_path).get("compacted_page_paths", dict())
+            compacted_pages:dict[str,Compacted_Tail_Page] = dict()
             for page_path in page_paths:
+                if os.path.basename(page_path)[:2] == "MP":
+                    # merged pages replaced (or left behind by a crash) before the last checkpoint
+                    if not page_path in merged_page_paths:
+                        Disk.remove_path_directory(page_path)
+                        continue
+                    metadata = CATALOG.read_metadata(page_path)
+                    self.merged_pages[metadata["base_page_index"]] = Merged_Page(
+                        metadata["merged_page_path"],
+                        metadata["base_page_index"],
+                        metadata["tps_index"],
+                    )
+                    continue
+                if os.path.basename(page_path)[:2] == "CP":
+                    # compacted pages replaced (or left behind by a crash) before the last checkpoint
+                    if not page_path in compacted_page_paths.values():
+                        Disk.remove_path_directory(page_path)
+                        continue
+                    metadata = CATALOG.read_metadata(page_path)
+                    compacted_pages[page_path] = Compacted_Tail_Page(
+                        metadata["compacted_page_path"],
+                        metadata["tail_page_indices"],
+                        metadata["slots"],
+                    )
+                    continue
                 page_index = int(os.path.basename(page_path)[2:])
-                metadata = Disk.read_from_path_metadata(page_path)
+                # tail pages compacted before the last checkpoint
+                if os.path.basename(page_path)[:2] == "TP" and page_index in compacted_page_paths:
+                    Disk.remove_path_directory(page_path)
+                    continue
+                metadata = CATALOG.read_metadata(page_path)
                 match os.path.basename(page_path)[:2]:
                     case "BP": self.base_pages[page_index] = Base_Page(
                             metadata["base_page_path"],
@@ -72,6 +148,8 @@ class Page_Range:
                             metadata["tail_page_index"],
                         )
                     case _: raise FileNotFoundError
+            for tail_page_index, compacted_page_path in compacted_page_paths.items():
+                self.tail_pages[tail_page_index] = compacted_pages[compacted_page_path]
 
     def __create_base_page(self, base_page_index)->None:
         base_page_path = os.path.join(self.page_range_path, f"BP{base_page_index}")
@@ -81,7 +159,7 @@ class Page_Range:
             "base_page_path": base_page_path,
             "base_page_index": base_page_index,
         }
-        Disk.write_to_path_metadata(base_page_path, metadata)
+        CATALOG.write_metadata(base_page_path, metadata)
         self.base_pages[base_page_index] = Base_Page(
             metadata["base_page_path"],
             metadata["base_page_index"],
@@ -100,7 +178,7 @@ class Page_Range:
             "tail_page_path": tail_page_path,
             "tail_page_index": tail_page_index,
         }
-        Disk.write_to_path_metadata(tail_page_path, metadata)
+        CATALOG.write_metadata(tail_page_path, metadata)
         self.tail_pages[tail_page_index] = Tail_Page(
             metadata["tail_page_path"],
             metadata["tail_page_index"],
@@ -111,44 +189,664 @@ class Page_Range:
             if not tail_page_index in self.tail_pages:
                 self.__create_tail_page(tail_page_index)
 
-    def __merge(self)->None:
-        if not self.latest_tid % Config.MERGE_THRESHOLD:
-            return
-        # print("merge is happening")
-        # with self.latch:
-        #     # copy base pages associated w/ page range
-        #     base_pages = deepcopy(self.base_pages)
+    def __create_merged_page(self, base_page_index:int, tps_index:int)->"Merged_Page":
+        merged_page_path = os.path.join(self.page_range_path, f"MP{base_page_index}_{tps_index}")
+        Disk.create_path_directory(merged_page_path)
+        metadata = {
+            "merged_page_path": merged_page_path,
+            "base_page_index": base_page_index,
+            "tps_index": tps_index,
+        }
+        CATALOG.write_metadata(merged_page_path, metadata)
+        return Merged_Page(
+            metadata["merged_page_path"],
+            metadata["base_page_index"],
+            metadata["tps_index"],
+        )
+
+    def __create_compacted_page(self, tail_page_indices:list[int], slots:dict[int,int], tps_index:int)->"Compacted_Tail_Page":
+        compacted_page_path = os.path.join(self.page_range_path, f"CP{tail_page_indices[0]}_{tps_index}")
+        Disk.create_path_directory(compacted_page_path)
+        metadata = {
+            "compacted_page_path": compacted_page_path,
+            "tail_page_indices": tail_page_indices,
+            "slots": slots,
+        }
+        CATALOG.write_metadata(compacted_page_path, metadata)
+        return Compacted_Tail_Page(
+            metadata["compacted_page_path"],
+            metadata["tail_page_indices"],
+            metadata["slots"],
+        )
+
+    def __get_merge_bound(self)->int:
+        """
+        Get the TID up to which every tail record is final: written and either
+        committed (durably, not by a commit still in progress) or rolled back.
+        """
+        with self.latch:
+            tps_index = self.latest_tid if not len(self.pending_tids) else min(self.pending_tids) - 1
+        read_timestamp = TIMESTAMP_ORACLE.get_read_timestamp()
+        for tid in range(self.tps_index + 1, tps_index + 1):
+            tid = TID(tid)
+            timestamp = self.tail_pages[tid.get_tail_page_index()].get_timestamp(tid)
+            # rolled back tail records have no timestamp
+            if timestamp > read_timestamp or timestamp >= UNCOMMITTED_TIMESTAMP:
+                return int(tid) - 1
+        return tps_index
+
+    def __get_merge_tid(self, rid:RID, tps_index:int)->TID:
+        """
+        Walks the indirection chain to the newest tail record up to the TPS (-1 if none is).
+        """
+        base_page = self.base_pages[rid.get_base_page_index()]
+        tid = base_page.get_indirection_tid(rid)
+        while int(tid) > tps_index:
+            tid = self.tail_pages[tid.get_tail_page_index()].get_indirection_tid(tid)
+            if not int(tid):
+                # tail record of an update being rolled back, the base record points to its predecessor again
+                tid = base_page.get_indirection_tid(rid)
+        return tid
+
+    def __merge_base_page(self, base_page_index:int, tps_index:int)->"Merged_Page|None":
+        """
+        Builds a merged copy of a Base Page with the newest version of its
+        records up to the TPS, next to the merged page readers use meanwhile.
+        """
+        base_page = self.base_pages[base_page_index]
+        merged_page = self.merged_pages.get(base_page_index)
+        first_rid = self.page_range_index * Config.NUM_BASE_PAGES_PER_PAGE_RANGE * Config.NUM_RECORDS_PER_PAGE \
+                    + base_page_index * Config.NUM_RECORDS_PER_PAGE + 1
+        versions:dict[int,TID] = dict()
+        for rid in range(first_rid, first_rid + Config.NUM_RECORDS_PER_PAGE):
+            if base_page.is_record_deleted(RID(rid)): continue
+            tid = self.__get_merge_tid(RID(rid), tps_index)
+            if int(tid) != -1: versions[rid] = tid
+        # no record has a version newer than the current merged page
+        if merged_page is not None and all(int(tid) <= merged_page.tps_index for tid in versions.values()):
+            return merged_page
+        if not len(versions):
+            return None
+
+        new_merged_page = self.__create_merged_page(base_page_index, tps_index)
+        for rid, tid in versions.items():
+            rid = RID(rid)
+            # versions merged before are copied from the current merged page
+            if merged_page is not None and int(merged_page.get_indirection_tid(rid)) == int(tid):
+                page, id = merged_page, rid
+            else:
+                page, id = self.tail_pages[tid.get_tail_page_index()], tid
+            columns = [page.select_record(id, i) for i in range(self.num_columns)]
+            new_merged_page.insert_record(Record(rid, self.key_index, columns), tid, page.get_timestamp(id))
+        return new_merged_page
+
+    def merge(self)->None:
+        """
+        Merges the tail records up to a new TPS into merged copies of the base
+        pages, then swaps them in at once. Run by the merge thread: readers and
+        writers are never blocked, they keep using the previous merged pages and
+        the tail records until the swap.
+
+        Merged pages sit beside the base pages instead of replacing them: the
+        base page keeps the live indirection column (and the insert version
+        older versions and snapshots fall back to), so reading an updated
+        Record still takes two frames, the base page and its merged page.
+        """
+        try:
+            tps_index = self.__get_merge_bound()
+            if tps_index <= self.tps_index: return
+            with self.latch:
+                base_page_indices = list(self.base_pages)
+            merged_pages:dict[int,Merged_Page] = dict()
+            for base_page_index in base_page_indices:
+                merged_page = self.__merge_base_page(base_page_index, tps_index)
+                if merged_page is not None: merged_pages[base_page_index] = merged_page
+            with self.latch:
+                self.retired_page_paths.extend(_.merged_page_path for i, _ in self.merged_pages.items() if merged_pages.get(i) is not _)
+                self.merged_pages = merged_pages
+                self.tps_index = tps_index
+            self.compact()
+        finally:
+            with self.latch:
+                self.is_merge_scheduled = False
+
+    def __get_retention_horizon(self)->int|None:
+        """
+        Get the timestamp of the oldest snapshot in use or allowed by
+        VERSION_RETENTION_PERIOD (None if there is none), whose versions are kept.
+        """
+        horizons = list()
+        oldest_snapshot = TIMESTAMP_ORACLE.get_oldest_snapshot()
+        if oldest_snapshot is not None:
+            horizons.append(oldest_snapshot)
+        if Config.VERSION_RETENTION_PERIOD is not None:
+            horizons.append(TIMESTAMP_ORACLE.get_timestamp_at(time() - Config.VERSION_RETENTION_PERIOD))
+        return min(horizons, default=None)
 
-        #     # determine number of columns
-        #     num_columns:dict = Disk.read_from_path_metadata(os.path.dirname(self.page_range_path))["num_columns"]
+    def __get_kept_tids(self, rid:RID, tps_index:int, horizon:int|None)->list[TID]:
+        """
+        Get the versions of a Record up to the TPS the retention policy keeps,
+        newest first: the merged version, then older ones while they are among
+        the newest VERSION_RETENTION_COUNT or were replaced after the horizon.
+        """
+        base_page = self.base_pages[rid.get_base_page_index()]
+        num_versions = 0
+        tid = base_page.get_indirection_tid(rid)
+        while int(tid) > tps_index:
+            num_versions += 1
+            tid = self.tail_pages[tid.get_tail_page_index()].get_indirection_tid(tid)
+            if not int(tid):
+                # tail record of an update being rolled back, the base record points to its predecessor again
+                num_versions, tid = 0, base_page.get_indirection_tid(rid)
+        kept_tids = list()
+        newer_timestamp = None
+        while int(tid) > 0:
+            tail_page = self.__get_tail_page(tid)
+            if tail_page is None: break
+            num_versions += 1
+            if len(kept_tids) and num_versions > (Config.VERSION_RETENTION_COUNT or 0) and \
+               (horizon is None or newer_timestamp <= horizon):
+                break
+            kept_tids.append(tid)
+            newer_timestamp = tail_page.get_timestamp(tid)
+            tid = tail_page.get_indirection_tid(tid)
+        return kept_tids
+
+    def compact(self)->None:
+        """
+        Rewrites the tail pages up to the TPS without the versions the retention
+        policy no longer keeps. Run by the merge thread after a merge.
+
+        Kept versions are copied into compacted pages under their TID, so no
+        pointer to them changes. Pointers of copied versions to dropped ones are
+        cleared: the oldest kept version of a Record follows the base record,
+        which reads of older versions see instead.
+        """
+        if Config.VERSION_RETENTION_COUNT is None and Config.VERSION_RETENTION_PERIOD is None: return
+        tps_index = self.tps_index
+        if tps_index - self.compaction_tps_index < Config.COMPACTION_THRESHOLD: return
+        self.compaction_tps_index = tps_index
+        start_time = perf_counter()
+        # tail pages holding merged versions only
+        num_tail_pages = tps_index // Config.NUM_RECORDS_PER_PAGE
+        if not num_tail_pages: return
+        horizon = self.__get_retention_horizon()
+        with self.latch:
+            base_page_indices = list(self.base_pages)
+            tail_pages = [self.tail_pages[i] for i in range(num_tail_pages)]
+        kept_tids:dict[int,list[TID]] = {i: list() for i in range(num_tail_pages)}
+        for base_page_index in base_page_indices:
+            first_rid = self.page_range_index * Config.NUM_BASE_PAGES_PER_PAGE_RANGE * Config.NUM_RECORDS_PER_PAGE \
+                        + base_page_index * Config.NUM_RECORDS_PER_PAGE + 1
+            for rid in range(first_rid, first_rid + Config.NUM_RECORDS_PER_PAGE):
+                for tid in self.__get_kept_tids(RID(rid), tps_index, horizon):
+                    if tid.get_tail_page_index() < num_tail_pages:
+                        kept_tids[tid.get_tail_page_index()].append(tid)
+
+        # pages (compacted ones cover several tail page indices) that can drop enough versions
+        retired_pages:list[Tail_Page] = list()
+        for tail_page in dict.fromkeys(tail_pages):
+            num_versions = tail_page.get_num_versions()
+            num_kept_versions = sum(len(kept_tids[i]) for i in tail_page.get_tail_page_indices())
+            if num_versions > num_kept_versions and num_versions - num_kept_versions >= Config.COMPACTION_MIN_GARBAGE * num_versions:
+                retired_pages.append(tail_page)
+        if not len(retired_pages): return
+        retired_indices = sorted(i for _ in retired_pages for i in _.get_tail_page_indices())
+        copied_tids = {int(tid) for i in retired_indices for tid in kept_tids[i]}
+        retired_index_set = set(retired_indices)
+        is_dropped = lambda tid: int(tid) > 0 and tid.get_tail_page_index() in retired_index_set and not int(tid) in copied_tids
+
+        # pack the kept versions of whole tail page indices into as few pages as possible
+        groups:list[list[int]] = list()
+        num_slots = 0
+        for i in retired_indices:
+            if not len(groups) or num_slots + len(kept_tids[i]) > Config.NUM_RECORDS_PER_PAGE:
+                groups.append(list())
+                num_slots = 0
+            groups[-1].append(i)
+            num_slots += len(kept_tids[i])
+        compacted_pages:list[Compacted_Tail_Page] = list()
+        for group in groups:
+            tids = sorted((tid for i in group for tid in kept_tids[i]), key=int)
+            compacted_page = self.__create_compacted_page(group, {int(tid): slot for slot, tid in enumerate(tids, 1)}, tps_index)
+            for tid in tids:
+                tail_page = tail_pages[tid.get_tail_page_index()]
+                columns = [tail_page.select_record(tid, i) for i in range(self.num_columns)]
+                indirection_tid = tail_page.get_indirection_tid(tid)
+                depth, skip_tid = tail_page.get_version_link(tid)
+                compacted_page.insert_record(Record(tid, self.key_index, columns), tail_page.get_timestamp(tid))
+                compacted_page.set_indirection_tid(tid, TID(-1) if is_dropped(indirection_tid) else indirection_tid)
+                compacted_page.set_version_link(tid, depth, TID(0) if is_dropped(skip_tid) else skip_tid)
+            compacted_pages.append(compacted_page)
+
+        with self.latch:
+            for compacted_page in compacted_pages:
+                for i in compacted_page.get_tail_page_indices():
+                    self.tail_pages[i] = compacted_page
+            self.retired_page_paths.extend(_.tail_page_path for _ in retired_pages)
+        MERGE_MANAGER.track_compaction(
+            sum(_.get_num_versions() for _ in retired_pages) - len(copied_tids),
+            len(copied_tids),
+            sum(Disk.get_path_size(_.tail_page_path) for _ in retired_pages) - sum(Disk.get_path_size(_.tail_page_path) for _ in compacted_pages),
+            perf_counter() - start_time,
+        )
+
+    def __schedule_merge(self)->None:
+        with self.latch:
+            if self.is_merge_scheduled or self.latest_tid - self.tps_index < Config.MERGE_THRESHOLD:
+                return
+            self.is_merge_scheduled = True
+        MERGE_MANAGER.schedule(self)
+
+    def checkpoint(self)->None:
+        """
+        Store page range counters in the catalog.
+        """
+        with self.latch:
+            CATALOG.set_metadata_field(self.page_range_path, "latest_tid", self.latest_tid)
+            CATALOG.set_metadata_field(self.page_range_path, "tps_index", self.tps_index)
+            CATALOG.set_metadata_field(self.page_range_path, "merged_page_paths",
+                                       {i: _.merged_page_path for i, _ in self.merged_pages.items()})
+            CATALOG.set_metadata_field(self.page_range_path, "compacted_page_paths",
+                                       {i: _.compacted_page_path for i, _ in self.tail_pages.items() if isinstance(_, Compacted_Tail_Page)})
+            self.reclaimable_page_paths.extend(self.retired_page_paths)
+            self.retired_page_paths = list()
+
+    def remove_retired_pages(self)->None:
+        """
+        Delete the pages merges and compactions replaced before the last checkpoint.
+        """
+        with self.latch:
+            page_paths, self.reclaimable_page_paths = self.reclaimable_page_paths, list()
+        for page_path in page_paths:
+            BUFFERPOOL.remove_page(page_path)
+            CATALOG.remove_metadata(page_path)
+            Disk.remove_path_directory(page_path)
+
+    def redo(self, record:Log_Record, timestamp:int|None)->None:
+        """
+        Reapply a logged change to the pages that do not contain it yet,
+        stamping the versions it writes with their original commit timestamp.
+        """
+        rid = RID(record.rid)
+        self.__access_base_page(rid.get_base_page_index())
+        base_page = self.base_pages[rid.get_base_page_index()]
+        match record.record_type:
+            case Log_Record_Type.INSERT:
+                if base_page.get_page_lsn() < record.lsn:
+                    base_page.insert_record(Record(rid, self.key_index, record.columns), timestamp)
+            case Log_Record_Type.UPDATE:
+                tid = TID(record.tid)
+                self.latest_tid = max(self.latest_tid, int(tid))
+                self.__access_tail_page(tid.get_tail_page_index())
+                tail_page = self.tail_pages[tid.get_tail_page_index()]
+                if tail_page.get_page_lsn() < record.lsn:
+                    tail_page.insert_record(Record(tid, self.key_index, record.columns), timestamp)
+                    self.__link_tail_record(tid, TID(record.previous_tid))
+                    tail_page.set_page_lsn(record.lsn)
+                if base_page.get_page_lsn() < record.lsn:
+                    base_page.set_schema_encoding(rid, record.schema_encoding)
+                    base_page.set_indirection_tid(rid, tid)
+            case Log_Record_Type.DELETE:
+                if base_page.get_page_lsn() < record.lsn:
+                    base_page.delete_record(rid)
+        base_page.set_page_lsn(record.lsn)
 
     def insert_record(self, record:Record)->None:
         """
         Insert record to a base page in a page range.
         """
+        timestamp = TIMESTAMP_ORACLE.get_write_timestamp()
+        self.log_manager.log(Log_Record(
+            Log_Record_Type.INSERT,
+            self.table_name,
+            self.page_range_index,
+            rid=int(record.get_rid()),
+            columns=tuple(record.get_columns()),
+            timestamp=timestamp,
+        ))
         self.__access_base_page(record.get_base_page_index())
-        self.base_pages[record.get_base_page_index()].insert_record(record)
+        self.base_pages[record.get_base_page_index()].insert_record(record, timestamp)
 
-    def get_record_columns(self, rid:RID, rollback_version:int)->tuple:
+    def __read_version(self, rid:RID, tid:TID, column_indices:list[int])->tuple[int,list[int]]:
         """
-        Get Record columns
+        Read the commit timestamp and columns of a version of a Record from the
+        page holding it: the base page for the base record, its merged page
+        once the tail record is merged. The merged page is checked and read in
+        the same frame access.
         """
-        columns = list()
-        # print(f"GETTING COLUMNS FOR RID {rid} WITH {abs(rollback_version)} ROLLBACKS")
-        tid = self.base_pages[rid.get_base_page_index()].get_indirection_tid(rid)
-        schema_encoding = self.base_pages[rid.get_base_page_index()].get_schema_encoding(rid)
-        while rollback_version < 0 and int(tid) != -1:
-            tid = self.tail_pages[tid.get_tail_page_index()].get_indirection_tid(tid)
-            rollback_version += 1
-        # print(f"ACCESSING TID {tid}")
-        for i, bit in enumerate(schema_encoding):
-            if not bit or int(tid) == -1:
-                columns.append(self.base_pages[rid.get_base_page_index()].select_record(rid, i))
+        if int(tid) != -1:
+            merged_page = self.merged_pages.get(rid.get_base_page_index())
+            if merged_page is not None and int(tid) <= merged_page.tps_index:
+                merged_tid, timestamp, entries = merged_page.select_version(rid, column_indices)
+                if int(merged_tid) == int(tid):
+                    return (timestamp, entries)
+            tail_page = self.__get_tail_page(tid)
+            # the base record stands in for versions compaction dropped
+            if tail_page is not None:
+                return tail_page.select_version(tid, column_indices)[1:]
+        return self.base_pages[rid.get_base_page_index()].select_version(rid, column_indices)[1:]
+
+    def __get_tail_page(self, tid:TID)->"Tail_Page|None":
+        """
+        Get the page holding a tail record, None if compaction dropped it. The
+        page is only replaced as a whole, so reads through it stay consistent.
+        """
+        if int(tid) <= 0:
+            return None
+        tail_page = self.tail_pages[tid.get_tail_page_index()]
+        return tail_page if tail_page.has_version(tid) else None
+
+    def __get_parent_tid(self, tid:TID)->TID:
+        """
+        Get TID of the previous version of a tail record, -1 for the base record
+        (and versions compaction dropped or a rollback unlinked)
+        """
+        tail_page = self.__get_tail_page(tid)
+        parent_tid = tail_page.get_indirection_tid(tid) if tail_page is not None else TID(-1)
+        return parent_tid if self.__get_tail_page(parent_tid) is not None else TID(-1)
+
+    def __get_version_link(self, tid:TID)->tuple[int,TID]:
+        # the base record is the root of every version chain, versions compaction dropped have no link
+        if int(tid) == -1:
+            return (0, TID(-1))
+        tail_page = self.__get_tail_page(tid)
+        if tail_page is None:
+            return (0, TID(0))
+        return tail_page.get_version_link(tid)
+
+    def __link_tail_record(self, new_tid:TID, tid:TID)->None:
+        """
+        Chains a tail record to the previous version of its Record and gives it
+        a skip pointer, so any older version is O(log k) hops away.
+        """
+        tail_page = self.tail_pages[new_tid.get_tail_page_index()]
+        if int(tid) != -1:
+            tail_page.set_indirection_tid(new_tid, tid)
+        depth, skip_tid = self.__get_version_link(tid)
+        # chains written before skip pointers existed have no depth and are walked
+        if int(tid) != -1 and not depth:
+            return
+        if get_skip_depth(depth + 1) == depth:
+            tail_page.set_version_link(new_tid, depth + 1, tid)
+        else:
+            # skip pointers to versions compaction dropped are left out (TID 0)
+            tail_page.set_version_link(new_tid, depth + 1, self.__get_version_link(skip_tid)[1])
+
+    def __get_older_version(self, tid:TID, num_versions:int)->TID:
+        """
+        Get TID of the version num_versions older than a version, stopping at
+        the base record (-1)
+        """
+        depth, skip_tid = self.__get_version_link(tid)
+        if int(tid) != -1 and not depth:
+            while num_versions > 0 and int(tid) != -1:
+                tid = self.__get_parent_tid(tid)
+                num_versions -= 1
+            return tid
+        target_depth = max(depth - num_versions, 0)
+        while depth > target_depth:
+            # skip pointers to versions compaction dropped are not followed
+            if get_skip_depth(depth) >= target_depth and (int(skip_tid) == -1 or self.__get_tail_page(skip_tid) is not None):
+                tid, depth = skip_tid, get_skip_depth(depth)
             else:
-                columns.append(self.tail_pages[tid.get_tail_page_index()].select_record(tid, i))
-        # print(f"RID {rid} HAS COLUMNS {columns}")
+                tid, depth = self.__get_parent_tid(tid), depth - 1
+                # older versions were dropped by compaction
+                if int(tid) == -1: return tid
+            if depth > target_depth:
+                skip_tid = self.__get_version_link(tid)[1]
+        return tid
+
+    def __is_visible_version(self, tid:TID, read_timestamp:int)->bool:
+        tail_page = self.__get_tail_page(tid)
+        return tail_page is not None and TIMESTAMP_ORACLE.is_visible(tail_page.get_timestamp(tid), read_timestamp)
+
+    def __search_visible_tid(self, tid:TID, depth:int, skip_tid:TID, read_timestamp:int)->TID:
+        """
+        Searches the versions older than a version newer than the snapshot for
+        the newest one in the snapshot (-1 if none is), in O(log k) hops.
+
+        Versions of a Record are committed one after the other (the record is
+        locked until then), so their timestamps grow with their depth.
+        """
+        while depth > 1:
+            # skip pointers to versions compaction dropped are not followed
+            skip_page = self.__get_tail_page(skip_tid)
+            if skip_page is not None and not TIMESTAMP_ORACLE.is_visible(skip_page.get_timestamp(skip_tid), read_timestamp):
+                tid, depth = skip_tid, get_skip_depth(depth)
+            else:
+                tid, depth = self.__get_parent_tid(tid), depth - 1
+                # older versions were dropped by compaction
+                if int(tid) == -1: return tid
+                if self.__is_visible_version(tid, read_timestamp):
+                    return tid
+            skip_tid = self.__get_version_link(tid)[1]
+        return TID(-1)
+
+    def __get_visible_tid(self, rid:RID, read_timestamp:int)->TID:
+        """
+        Finds the newest tail record in the snapshot (-1 if none is).
+        """
+        base_page = self.base_pages[rid.get_base_page_index()]
+        tid = base_page.get_indirection_tid(rid)
+        while int(tid) > 0:
+            timestamp = self.__read_version(rid, tid, [])[0]
+            if TIMESTAMP_ORACLE.is_visible(timestamp, read_timestamp):
+                return tid
+            if not timestamp and int(base_page.get_indirection_tid(rid)) != int(tid):
+                # tail record of an update being rolled back, the base record points to its predecessor again
+                tid = base_page.get_indirection_tid(rid)
+                continue
+            depth, skip_tid = self.__get_version_link(tid)
+            if depth:
+                return self.__search_visible_tid(tid, depth, skip_tid, read_timestamp)
+            # chains written before skip pointers existed are walked
+            tid = self.__get_parent_tid(tid)
+        return TID(-1)
+
+    def get_record_version(self, rid:RID, read_timestamp:int|None=None)->int:
+        """
+        Get TID of the newest version of a Record (in a snapshot when a read
+        timestamp is given), -1 for the base record
+        """
+        self.__access_base_page(rid.get_base_page_index())
+        if read_timestamp is not None:
+            return int(self.__get_visible_tid(rid, read_timestamp))
+        return int(self.base_pages[rid.get_base_page_index()].get_indirection_tid(rid))
+
+    def get_version_timestamp(self, rid:RID)->int:
+        """
+        Get timestamp of the newest version of a Record
+        """
+        self.__access_base_page(rid.get_base_page_index())
+        return self.__read_version(rid, self.base_pages[rid.get_base_page_index()].get_indirection_tid(rid), [])[0]
+
+    def get_record_columns(self, rid:RID, rollback_version:int, read_timestamp:int|None=None,
+                           projected_columns:list[int]|None=None)->tuple|None:
+        """
+        Get Record columns, as of a snapshot when a read timestamp is given
+        (None if the record is not part of the snapshot). Only the columns set
+        in projected_columns are read, the others are None.
+        """
+        # print(f"GETTING COLUMNS FOR RID {rid} WITH {abs(rollback_version)} ROLLBACKS")
+        self.__access_base_page(rid.get_base_page_index())
+        base_page = self.base_pages[rid.get_base_page_index()]
+        if projected_columns is None:
+            column_indices = list(range(self.num_columns))
+        else:
+            column_indices = [i for i in range(self.num_columns) if projected_columns[i]]
+        # tail (and merged) records hold every column of their version
+        tid = base_page.get_indirection_tid(rid)
+        entries = None
+        if read_timestamp is not None:
+            # the newest version is read along with its timestamp, older ones are searched
+            timestamp, entries = self.__read_version(rid, tid, column_indices)
+            if not TIMESTAMP_ORACLE.is_visible(timestamp, read_timestamp):
+                entries = None
+                tid = self.__get_visible_tid(rid, read_timestamp)
+                if int(tid) == -1 and not TIMESTAMP_ORACLE.is_visible(base_page.get_timestamp(rid), read_timestamp):
+                    return None
+        if rollback_version < 0:
+            tid = self.__get_older_version(tid, -rollback_version)
+            entries = None
+        if entries is None:
+            entries = self.__read_version(rid, tid, column_indices)[1]
+        if projected_columns is None:
+            return tuple(entries)
+        columns = [None] * self.num_columns
+        for column_index, entry_value in zip(column_indices, entries):
+            columns[column_index] = entry_value
         return tuple(columns)
 
+    def scan_column(self, rids:list[RID], column_index:int,
+                    read_timestamp:int|None=None)->tuple["numpy.ndarray|array","numpy.ndarray|array",list[RID]]:
+        """
+        Batch scan of a column: reads the newest values of Records (in a
+        snapshot when a read timestamp is given) a whole page at a time instead
+        of record by record. Deleted Records are skipped.
+
+        Returns the values and the RIDs they belong to (int64 NumPy arrays,
+        arrays without NumPy), and the Records whose value is not in the newest
+        version of the pages (older versions of a snapshot, versions compaction
+        dropped), which are read record by record.
+        """
+        offsets:defaultdict[int,list[int]] = defaultdict(list)
+        for rid in rids:
+            position = int(rid) - 1
+            offsets[position // Config.NUM_RECORDS_PER_PAGE % Config.NUM_BASE_PAGES_PER_PAGE_RANGE].append(position % Config.NUM_RECORDS_PER_PAGE)
+        values, value_rids, skipped_rids = list(), list(), list()
+        for base_page_index, page_offsets in offsets.items():
+            self.__access_base_page(base_page_index)
+            if numpy is not None:
+                page_values, value_offsets, skipped_offsets = self.__scan_base_page_vectorized(base_page_index, page_offsets, column_index, read_timestamp)
+            else:
+                page_values, value_offsets, skipped_offsets = self.__scan_base_page(base_page_index, page_offsets, column_index, read_timestamp)
+            values.append(page_values)
+            first_rid = self.page_range_index * Config.NUM_BASE_PAGES_PER_PAGE_RANGE * Config.NUM_RECORDS_PER_PAGE \
+                        + base_page_index * Config.NUM_RECORDS_PER_PAGE + 1
+            value_rids.append(value_offsets + first_rid if numpy is not None else array("q", (first_rid + _ for _ in value_offsets)))
+            skipped_rids.extend(RID(first_rid + int(offset)) for offset in skipped_offsets)
+        if numpy is not None:
+            if not len(values): return (numpy.zeros(0, dtype=numpy.int64), numpy.zeros(0, dtype=numpy.int64), skipped_rids)
+            return (numpy.concatenate(values), numpy.concatenate(value_rids), skipped_rids)
+        return (array("q", (value for page_values in values for value in page_values)),
+                array("q", (rid for page_rids in value_rids for rid in page_rids)), skipped_rids)
+
+    def __get_updated_bit(self, column_index:int)->int:
+        # bit of a column in the schema encoding, set once the column of a Record is updated
+        return self.num_columns - 1 - column_index
+
+    def __scan_base_page_vectorized(self, base_page_index:int, offsets:list[int], column_index:int,
+                                    read_timestamp:int|None)->tuple["numpy.ndarray","numpy.ndarray","numpy.ndarray"]:
+        """
+        Reads a column of Records of a base page with NumPy: the schema encoding
+        picks the base value or the value of the newest version (merged or tail)
+        of every Record at once. Returns the values, the offsets of their
+        Records and the offsets of the Records whose value is not in the newest
+        version.
+        """
+        is_visible = lambda timestamps: numpy.ones(len(timestamps), dtype=bool) if read_timestamp is None \
+                                        else TIMESTAMP_ORACLE.get_visible_mask(timestamps, read_timestamp)
+        base_page = self.base_pages[base_page_index]
+        merged_page = self.merged_pages.get(base_page_index)
+        offsets = numpy.array(offsets, dtype=numpy.int64)
+        # read against the order records are written: RID last, indirection after schema encoding
+        offsets = offsets[base_page.get_column_entries(Config.RID_COLUMN)[offsets] != 0]
+        tids = base_page.get_column_entries(Config.INDIRECTION_COLUMN)[offsets]
+        schema_encodings = base_page.get_column_entries(Config.SCHEMA_ENCODING_COLUMN)[offsets]
+        timestamps = base_page.get_column_entries(Config.TIMESTAMP_COLUMN)[offsets]
+        values = base_page.get_column_entries(Config.NUM_METADATA_COLUMNS + column_index)[offsets]
+
+        # every version of a Record whose column was never updated holds the base value
+        is_base = (tids == -1) | ((schema_encodings >> self.__get_updated_bit(column_index)) & 1 == 0)
+        is_base_visible = is_visible(timestamps)
+        # Records inserted after the snapshot are left out, the versions of updated ones are searched
+        skipped_offsets = [offsets[is_base & ~is_base_visible & (tids != -1)]]
+        base_values = values[is_base & is_base_visible]
+        base_offsets = offsets[is_base & is_base_visible]
+
+        offsets, tids = offsets[~is_base], tids[~is_base]
+        version_timestamps = numpy.zeros(len(tids), dtype=numpy.int64)
+        version_values = numpy.zeros(len(tids), dtype=numpy.int64)
+        is_read = numpy.zeros(len(tids), dtype=bool)
+        if merged_page is not None and len(tids):
+            is_read = (merged_page.get_column_entries(Config.INDIRECTION_COLUMN)[offsets] == tids) & (tids <= merged_page.tps_index)
+            version_timestamps[is_read] = merged_page.get_column_entries(Config.TIMESTAMP_COLUMN)[offsets[is_read]]
+            version_values[is_read] = merged_page.get_column_entries(Config.NUM_METADATA_COLUMNS + column_index)[offsets[is_read]]
+        tail_page_indices = (tids - 1) // Config.NUM_RECORDS_PER_PAGE
+        for tail_page_index in numpy.unique(tail_page_indices[~is_read]):
+            tail_page = self.tail_pages.get(int(tail_page_index))
+            if tail_page is None: continue
+            is_in_page = ~is_read & (tail_page_indices == tail_page_index)
+            if isinstance(tail_page, Compacted_Tail_Page):
+                # versions compaction dropped are searched record by record
+                is_in_page[is_in_page] = [tail_page.has_version(TID(_)) for _ in tids[is_in_page]]
+                entry_indices = [tail_page.get_entry_index(TID(_)) for _ in tids[is_in_page]]
+            else:
+                entry_indices = (tids[is_in_page] - 1) % Config.NUM_RECORDS_PER_PAGE
+            version_timestamps[is_in_page] = tail_page.get_column_entries(Config.TIMESTAMP_COLUMN)[entry_indices]
+            version_values[is_in_page] = tail_page.get_column_entries(Config.NUM_METADATA_COLUMNS + column_index)[entry_indices]
+            is_read |= is_in_page
+        is_version_visible = is_read & is_visible(version_timestamps)
+        skipped_offsets.append(offsets[~is_version_visible])
+        return (numpy.concatenate((base_values, version_values[is_version_visible])),
+                numpy.concatenate((base_offsets, offsets[is_version_visible])), numpy.concatenate(skipped_offsets))
+
+    def __scan_base_page(self, base_page_index:int, offsets:list[int], column_index:int,
+                         read_timestamp:int|None)->tuple[array,array,list[int]]:
+        """
+        Reads a column of Records of a base page without NumPy, one Record at a
+        time but from pages decoded at once, like __scan_base_page_vectorized.
+        """
+        is_visible = lambda timestamp: read_timestamp is None or TIMESTAMP_ORACLE.is_visible(timestamp, read_timestamp)
+        base_page = self.base_pages[base_page_index]
+        merged_page = self.merged_pages.get(base_page_index)
+        updated_bit = self.__get_updated_bit(column_index)
+        # read against the order records are written: RID last, indirection after schema encoding
+        rid_entries = base_page.get_column_entries(Config.RID_COLUMN)
+        tid_entries = base_page.get_column_entries(Config.INDIRECTION_COLUMN)
+        schema_encoding_entries = base_page.get_column_entries(Config.SCHEMA_ENCODING_COLUMN)
+        timestamp_entries = base_page.get_column_entries(Config.TIMESTAMP_COLUMN)
+        value_entries = base_page.get_column_entries(Config.NUM_METADATA_COLUMNS + column_index)
+        merged_tid_entries = merged_page.get_column_entries(Config.INDIRECTION_COLUMN) if merged_page is not None else None
+        version_entries:dict[object,tuple] = dict() # {merged or tail page: (timestamps, values)}
+        def get_version_entries(page)->tuple:
+            if not page in version_entries:
+                version_entries[page] = (page.get_column_entries(Config.TIMESTAMP_COLUMN),
+                                         page.get_column_entries(Config.NUM_METADATA_COLUMNS + column_index))
+            return version_entries[page]
+
+        values, value_offsets, skipped_offsets = array("q"), array("q"), list()
+        for offset in offsets:
+            if not rid_entries[offset]: continue
+            tid = tid_entries[offset]
+            # every version of a Record whose column was never updated holds the base value
+            if tid == -1 or not schema_encoding_entries[offset] >> updated_bit & 1:
+                if is_visible(timestamp_entries[offset]):
+                    values.append(value_entries[offset])
+                    value_offsets.append(offset)
+                # Records inserted after the snapshot are left out, the versions of updated ones are searched
+                elif tid != -1:
+                    skipped_offsets.append(offset)
+                continue
+            if merged_page is not None and tid <= merged_page.tps_index and merged_tid_entries[offset] == tid:
+                version_timestamps, version_values = get_version_entries(merged_page)
+                entry_index = offset
+            else:
+                tail_page = self.tail_pages.get(TID(tid).get_tail_page_index())
+                # versions compaction dropped are searched record by record
+                if tail_page is None or not tail_page.has_version(TID(tid)):
+                    skipped_offsets.append(offset)
+                    continue
+                version_timestamps, version_values = get_version_entries(tail_page)
+                entry_index = tail_page.get_entry_index(TID(tid))
+            if is_visible(version_timestamps[entry_index]):
+                values.append(version_values[entry_index])
+                value_offsets.append(offset)
+            else:
+                skipped_offsets.append(offset)
+        return (values, value_offsets, skipped_offsets)
+
     def update_record(self, rid:RID, old_columns:tuple, new_columns:tuple)->None:
         """
         Update Record
@@ -166,32 +864,63 @@ class Page_Range:
             if new_columns[i] != None and old_columns[i] != new_columns[i]:
                 schema_encoding[i] = True
                 old_columns[i] = new_columns[i]
-        self.base_pages[rid.get_base_page_index()].set_schema_encoding(rid, schema_encoding)
 
-        # increment number of TIDs in a page range
-        self.latest_tid += 1
-        new_tid = TID(deepcopy(self.latest_tid))
-        self.__access_tail_page(new_tid.get_tail_page_index())
+        # increment number of TIDs in a page range (records of a page range are updated concurrently)
+        with self.latch:
+            self.latest_tid += 1
+            new_tid = TID(deepcopy(self.latest_tid))
+            # merges stop before tail records still being written
+            self.pending_tids.add(int(new_tid))
 
-        # write new data to new TID
-        key_index = Disk.read_from_path_metadata(os.path.dirname(self.page_range_path))["key_index"]
-        new_record = Record(new_tid, key_index, tuple(old_columns))
-        self.tail_pages[new_tid.get_tail_page_index()].insert_record(new_record)
+        try:
+            timestamp = TIMESTAMP_ORACLE.get_write_timestamp()
+            self.log_manager.log(Log_Record(
+                Log_Record_Type.UPDATE,
+                self.table_name,
+                self.page_range_index,
+                rid=int(rid),
+                tid=int(new_tid),
+                previous_tid=int(tid),
+                columns=tuple(old_columns),
+                schema_encoding=schema_encoding.copy(),
+                timestamp=timestamp,
+            ))
+            self.base_pages[rid.get_base_page_index()].set_schema_encoding(rid, schema_encoding)
+            self.__access_tail_page(new_tid.get_tail_page_index())
 
-        # handle indirection
-        self.base_pages[rid.get_base_page_index()].set_indirection_tid(rid, new_tid)
-        if not int(tid) == -1:
-            self.tail_pages[new_tid.get_tail_page_index()].set_indirection_tid(new_tid, tid)
+            # write new data to new TID
+            new_record = Record(new_tid, self.key_index, tuple(old_columns))
+            self.tail_pages[new_tid.get_tail_page_index()].insert_record(new_record, timestamp)
+
+            # handle indirection (chain the tail record before publishing it to lock-free readers)
+            self.__link_tail_record(new_tid, tid)
+            self.base_pages[rid.get_base_page_index()].set_indirection_tid(rid, new_tid)
+        finally:
+            with self.latch:
+                self.pending_tids.discard(int(new_tid))
 
         # print(f"UPDATED COLUMNS FOR RID {rid} TO {old_columns}")
 
         # perform merging if necessary
-        # self.__merge()
+        self.__schedule_merge()
+
+    def is_record_deleted(self, rid:RID)->bool:
+        """
+        Check if Record is deleted (or was never written)
+        """
+        self.__access_base_page(rid.get_base_page_index())
+        return self.base_pages[rid.get_base_page_index()].is_record_deleted(rid)
 
     def delete_record(self, rid:RID)->None:
         """
         Delete Record
         """
+        self.log_manager.log(Log_Record(
+            Log_Record_Type.DELETE,
+            self.table_name,
+            self.page_range_index,
+            rid=int(rid),
+        ))
         self.__access_base_page(rid.get_base_page_index())
         self.base_pages[rid.get_base_page_index()].delete_record(rid)
 
@@ -202,11 +931,11 @@ class Base_Page:
         self.base_page_path = base_page_path
         self.base_page_index = base_page_index
 
-    def insert_record(self, record:Record)->None:
+    def insert_record(self, record:Record, timestamp:int|None=None)->None:
         """
         Insert Base Record
         """
-        BUFFERPOOL.insert_record(record, self.base_page_path)
+        BUFFERPOOL.insert_record(record, self.base_page_path, timestamp)
 
     def get_schema_encoding(self, rid:RID)->bitarray:
         """
@@ -238,12 +967,74 @@ class Base_Page:
         """
         return BUFFERPOOL.get_record_entry(rid, self.base_page_path, column_index)
 
+    def select_columns(self, rid:RID, column_indices:list[int])->list[int]:
+        """
+        Select columns of Base Record, without loading the others
+        """
+        return BUFFERPOOL.get_record_entries(rid, self.base_page_path, column_indices)
+
+    def select_version(self, rid:RID, column_indices:list[int])->tuple[TID,int,list[int]]:
+        """
+        Select indirection, timestamp and columns of Base Record at once
+        """
+        return BUFFERPOOL.get_version_entries(rid, self.base_page_path, column_indices)
+
     def delete_record(self, rid:RID)->None:
         """
         Delete Base Record
         """
         BUFFERPOOL.delete_record(rid, self.base_page_path)
 
+    def is_record_deleted(self, rid:RID)->bool:
+        """
+        Check if Record of the Base Page is deleted
+        """
+        return BUFFERPOOL.is_record_deleted(rid, self.base_page_path)
+
+    def get_timestamp(self, rid:RID)->int:
+        """
+        Get commit timestamp of Record in Base Page
+        """
+        return BUFFERPOOL.get_timestamp(rid, self.base_page_path)
+
+    def get_column_entries(self, physical_page_index:int)->"numpy.ndarray|array":
+        """
+        Get every entry of a physical page of the Base Page, by offset of the Record
+        """
+        return BUFFERPOOL.get_column_entries(self.base_page_path, physical_page_index)
+
+    def get_page_lsn(self)->int:
+        """
+        Get LSN of the last logged change to the Base Page
+        """
+        return BUFFERPOOL.get_page_lsn(self.base_page_path)
+
+    def set_page_lsn(self, page_lsn:int)->None:
+        """
+        Set LSN of the last logged change to the Base Page
+        """
+        BUFFERPOOL.set_page_lsn(self.base_page_path, page_lsn)
+
+
+class Merged_Page(Base_Page):
+    """
+    Copy of a Base Page holding the newest version of its records up to the
+    TPS of the merge that built it. The indirection column of a merged record
+    holds the TID of the version it copies.
+    """
+
+    def __init__(self, merged_page_path:str, base_page_index:int, tps_index:int)->None:
+        super().__init__(merged_page_path, base_page_index)
+        self.merged_page_path = merged_page_path
+        self.tps_index = tps_index
+
+    def insert_record(self, record:Record, tid:TID, timestamp:int)->None:
+        """
+        Insert merged version of a Record
+        """
+        BUFFERPOOL.insert_record(record, self.merged_page_path, timestamp)
+        BUFFERPOOL.set_indirection_tid(record.get_rid(), tid, self.merged_page_path)
+
 
 class Tail_Page:
 
@@ -251,11 +1042,23 @@ class Tail_Page:
         self.tail_page_path = tail_page_path
         self.tail_page_index = tail_page_index
 
-    def insert_record(self, record:Record)->None:
+    def insert_record(self, record:Record, timestamp:int|None=None)->None:
         """
         Insert Tail Record
         """
-        BUFFERPOOL.insert_record(record, self.tail_page_path)
+        BUFFERPOOL.insert_record(record, self.tail_page_path, timestamp)
+
+    def has_version(self, tid:TID)->bool:
+        """
+        Check if the Tail Page holds a Tail Record
+        """
+        return True
+
+    def get_tail_page_indices(self)->list[int]:
+        return [self.tail_page_index]
+
+    def get_num_versions(self)->int:
+        return Config.NUM_RECORDS_PER_PAGE
 
     def select_record(self, tid:TID, column_index:int)->int:
         """
@@ -263,6 +1066,18 @@ class Tail_Page:
         """ 
         return BUFFERPOOL.get_record_entry(tid, self.tail_page_path, column_index)
 
+    def select_columns(self, tid:TID, column_indices:list[int])->list[int]:
+        """
+        Select columns of Tail Record, without loading the others
+        """
+        return BUFFERPOOL.get_record_entries(tid, self.tail_page_path, column_indices)
+
+    def select_version(self, tid:TID, column_indices:list[int])->tuple[TID,int,list[int]]:
+        """
+        Select indirection, timestamp and columns of Tail Record at once
+        """
+        return BUFFERPOOL.get_version_entries(tid, self.tail_page_path, column_indices)
+
     def get_indirection_tid(self, tid:TID)->TID:
         """
         Get indirection for Tail Record
@@ -274,3 +1089,104 @@ class Tail_Page:
         Set indirection for Tail Record
         """
         BUFFERPOOL.set_indirection_tid(tid, indirection_tid, self.tail_page_path)
+
+    def get_timestamp(self, tid:TID)->int:
+        """
+        Get commit timestamp of Tail Record
+        """
+        return BUFFERPOOL.get_timestamp(tid, self.tail_page_path)
+
+    def get_column_entries(self, physical_page_index:int)->"numpy.ndarray|array":
+        """
+        Get every entry of a physical page of the Tail Page, see get_entry_index
+        """
+        return BUFFERPOOL.get_column_entries(self.tail_page_path, physical_page_index)
+
+    def get_entry_index(self, tid:TID)->int:
+        """
+        Get position of Tail Record in the entries of get_column_entries
+        """
+        return (int(tid) - 1) % Config.NUM_RECORDS_PER_PAGE
+
+    def get_version_link(self, tid:TID)->tuple[int,TID]:
+        """
+        Get depth in the version chain and skip pointer of Tail Record
+        """
+        return BUFFERPOOL.get_version_link(tid, self.tail_page_path)
+
+    def set_version_link(self, tid:TID, depth:int, skip_tid:TID)->None:
+        """
+        Set depth in the version chain and skip pointer of Tail Record
+        """
+        BUFFERPOOL.set_version_link(tid, depth, skip_tid, self.tail_page_path)
+
+    def get_page_lsn(self)->int:
+        """
+        Get LSN of the last logged change to the Tail Page
+        """
+        return BUFFERPOOL.get_page_lsn(self.tail_page_path)
+
+    def set_page_lsn(self, page_lsn:int)->None:
+        """
+        Set LSN of the last logged change to the Tail Page
+        """
+        BUFFERPOOL.set_page_lsn(self.tail_page_path, page_lsn)
+
+
+class Compacted_Tail_Page(Tail_Page):
+    """
+    Tail records of one or more Tail Pages kept by compaction. They keep
+    their TID, slots maps it to the position of the record in the page.
+    """
+
+    def __init__(self, compacted_page_path:str, tail_page_indices:list[int], slots:dict[int,int])->None:
+        super().__init__(compacted_page_path, tail_page_indices[0])
+        self.compacted_page_path = compacted_page_path
+        self.tail_page_indices = tail_page_indices
+        self.slots = slots
+
+    def __get_slot(self, tid:TID)->RID:
+        return RID(self.slots[int(tid)])
+
+    def insert_record(self, record:Record, timestamp:int)->None:
+        """
+        Insert copy of a Tail Record
+        """
+        BUFFERPOOL.insert_record(Record(self.__get_slot(record.get_rid()), record.key_index, record.get_columns()),
+                                 self.compacted_page_path, timestamp)
+
+    def has_version(self, tid:TID)->bool:
+        return int(tid) in self.slots
+
+    def get_tail_page_indices(self)->list[int]:
+        return self.tail_page_indices
+
+    def get_num_versions(self)->int:
+        return len(self.slots)
+
+    def select_record(self, tid:TID, column_index:int)->int:
+        return super().select_record(self.__get_slot(tid), column_index)
+
+    def select_columns(self, tid:TID, column_indices:list[int])->list[int]:
+        return super().select_columns(self.__get_slot(tid), column_indices)
+
+    def select_version(self, tid:TID, column_indices:list[int])->tuple[TID,int,list[int]]:
+        return super().select_version(self.__get_slot(tid), column_indices)
+
+    def get_indirection_tid(self, tid:TID)->TID:
+        return super().get_indirection_tid(self.__get_slot(tid))
+
+    def set_indirection_tid(self, tid:TID, indirection_tid:TID)->None:
+        super().set_indirection_tid(self.__get_slot(tid), indirection_tid)
+
+    def get_timestamp(self, tid:TID)->int:
+        return super().get_timestamp(self.__get_slot(tid))
+
+    def get_entry_index(self, tid:TID)->int:
+        return super().get_entry_index(self.__get_slot(tid))
+
+    def get_version_link(self, tid:TID)->tuple[int,TID]:
+        return super().get_version_link(self.__get_slot(tid))
+
+    def set_version_link(self, tid:TID, depth:int, skip_tid:TID)->None:
+        super().set_version_link(self.__get_slot(tid), depth, skip_tid)
@@ -1,4 +1,5 @@
 from lstore.table import Table
+from lstore.timestamp_info import TIMESTAMP_ORACLE
 
 
 class Query:
@@ -45,6 +46,18 @@ class Query:
 
 
     
+    """
+    # Read records matching several search keys
+    # :param search_keys: {column index: value} you want to search based on
+    # :param projected_columns_index: what columns to return. array of 1 or 0 values.
+    # :param match_any: records need to match any search key instead of all of them
+    # Returns a list of Record objects upon success
+    # Returns False if record locked by TPL
+    """
+    def select_where(self, search_keys:dict, projected_columns_index, match_any:bool=False):
+        return self.table.select_records_where(search_keys, projected_columns_index, match_any=match_any)
+
+
     """
     # Read matching record with specified search key
     # :param search_key: the value you want to search based on
@@ -58,6 +71,20 @@ class Query:
     def select_version(self, search_key, search_key_index, projected_columns_index, relative_version):
         return self.table.select_record(search_key, search_key_index, projected_columns_index, relative_version)
 
+
+    """
+    # Read matching record with specified search key as it was at a point in time
+    # :param search_key: the value you want to search based on
+    # :param search_key_index: the column index you want to search based on
+    # :param projected_columns_index: what columns to return. array of 1 or 0 values.
+    # :param timestamp: the point in time, in seconds since the epoch (e.g. time.time())
+    # Returns a list of Record objects upon success (empty if the record did not exist yet)
+    # Records deleted since are not found through the index
+    """
+    def select_as_of(self, search_key, search_key_index, projected_columns_index, timestamp):
+        return self.table.select_record(search_key, search_key_index, projected_columns_index,
+                                        as_of_timestamp=TIMESTAMP_ORACLE.get_timestamp_at(timestamp))
+
     
     """
     # Update a record with specified key and columns
@@ -92,6 +119,19 @@ class Query:
     def sum_version(self, start_range, end_range, aggregate_column_index, relative_version):
         return self.table.sum_records(start_range, end_range, aggregate_column_index, relative_version)
 
+
+    """
+    :param start_range: int         # Start of the key range to aggregate 
+    :param end_range: int           # End of the key range to aggregate 
+    :param aggregate_columns: int  # Index of desired column to aggregate
+    :param timestamp: the point in time, in seconds since the epoch (e.g. time.time())
+    # this function is only called on the primary key.
+    # Returns the summation of the given range as it was at that point in time upon success
+    """
+    def sum_as_of(self, start_range, end_range, aggregate_column_index, timestamp):
+        return self.table.sum_records(start_range, end_range, aggregate_column_index,
+                                      as_of_timestamp=TIMESTAMP_ORACLE.get_timestamp_at(timestamp))
+
     
     """
     incremenets one column of the record
@@ -0,0 +1,148 @@
+from abc import ABC, abstractmethod
+from collections import OrderedDict, deque
+from heapq import heappush, heappop
+from typing import Callable
+
+import lstore.config as Config
+
+
+class Replacement_Policy(ABC):
+    """
+    Decides which frame of the bufferpool (or node of an index cache) gets evicted.
+
+    The bufferpool reports every frame access and removal to the policy and
+    asks it for a victim when it runs out of capacity. Frames that cannot be
+    evicted (i.e. pinned frames) are filtered out by the is_evictable callback.
+    """
+
+    @abstractmethod
+    def record_access(self, page_path:str)->None: ...
+
+    @abstractmethod
+    def remove(self, page_path:str)->None: ...
+
+    @abstractmethod
+    def choose_victim(self, is_evictable:Callable[[str],bool])->str|None: ...
+
+
+class LRU_Policy(Replacement_Policy):
+
+    def __init__(self)->None:
+        self.pages:OrderedDict[str,None] = OrderedDict()
+
+    def record_access(self, page_path:str)->None:
+        if page_path in self.pages:
+            self.pages.move_to_end(page_path)
+        else:
+            self.pages[page_path] = None
+
+    def remove(self, page_path:str)->None:
+        self.pages.pop(page_path, None)
+
+    def choose_victim(self, is_evictable:Callable[[str],bool])->str|None:
+        # least recently used page sits at the front; only pinned pages are skipped
+        for page_path in self.pages:
+            if is_evictable(page_path):
+                return page_path
+        return None
+
+
+class CLOCK_Policy(Replacement_Policy):
+
+    def __init__(self)->None:
+        self.slots:list[str|None]          = list()
+        self.slot_indices:dict[str,int]    = dict()
+        self.reference_bits:dict[str,bool] = dict()
+        self.free_slots:list[int]          = list()
+        self.hand:int                      = 0
+
+    def record_access(self, page_path:str)->None:
+        if not page_path in self.slot_indices:
+            if len(self.free_slots):
+                slot_index = self.free_slots.pop()
+                self.slots[slot_index] = page_path
+            else:
+                slot_index = len(self.slots)
+                self.slots.append(page_path)
+            self.slot_indices[page_path] = slot_index
+        self.reference_bits[page_path] = True
+
+    def remove(self, page_path:str)->None:
+        if not page_path in self.slot_indices:
+            return
+        slot_index = self.slot_indices.pop(page_path)
+        del self.reference_bits[page_path]
+        self.slots[slot_index] = None
+        self.free_slots.append(slot_index)
+
+    def choose_victim(self, is_evictable:Callable[[str],bool])->str|None:
+        if not len(self.slots):
+            return None
+        # two sweeps are enough to clear every reference bit once
+        for _ in range(2 * len(self.slots)):
+            page_path = self.slots[self.hand]
+            self.hand = (self.hand + 1) % len(self.slots)
+            if page_path is None or not is_evictable(page_path):
+                continue
+            if self.reference_bits[page_path]:
+                self.reference_bits[page_path] = False
+                continue
+            return page_path
+        return None
+
+
+class LRU_K_Policy(Replacement_Policy):
+
+    def __init__(self, k:int=Config.LRU_K)->None:
+        assert k > 0
+        self.k:int                         = k
+        self.clock:int                     = 0
+        self.histories:dict[str,deque[int]] = dict()
+        self.heap:list[tuple]              = list()
+
+    def __get_priority(self, page_path:str)->tuple[int,int]:
+        # pages with less than K references have an infinite backward K-distance
+        # and are evicted first, ties are broken by their last reference
+        history = self.histories[page_path]
+        kth_reference = history[0] if len(history) == self.k else -1
+        return (kth_reference, history[-1])
+
+    def __compact_heap(self)->None:
+        self.heap = [(self.__get_priority(page_path), page_path) for page_path in self.histories]
+        self.heap.sort()
+
+    def record_access(self, page_path:str)->None:
+        self.clock += 1
+        if not page_path in self.histories:
+            self.histories[page_path] = deque(maxlen=self.k)
+        self.histories[page_path].append(self.clock)
+        # stale heap entries are skipped lazily in choose_victim
+        heappush(self.heap, (self.__get_priority(page_path), page_path))
+        if len(self.heap) > 4 * len(self.histories) + 64:
+            self.__compact_heap()
+
+    def remove(self, page_path:str)->None:
+        self.histories.pop(page_path, None)
+
+    def choose_victim(self, is_evictable:Callable[[str],bool])->str|None:
+        skipped = list()
+        victim = None
+        while len(self.heap):
+            priority, page_path = heappop(self.heap)
+            if not page_path in self.histories or priority != self.__get_priority(page_path):
+                continue
+            if not is_evictable(page_path):
+                skipped.append((priority, page_path))
+                continue
+            victim = page_path
+            break
+        for entry in skipped:
+            heappush(self.heap, entry)
+        return victim
+
+
+REPLACEMENT_POLICIES:dict[str,type[Replacement_Policy]] = {
+    "LRU": LRU_Policy,
+    "CLOCK": CLOCK_Policy,
+    "LRU_K": LRU_K_Policy,
+}
@@ -1,25 +1,38 @@
 import os
+from collections import defaultdict
 from copy import deepcopy
-from threading import RLock
+from threading import Lock, RLock
+from time import sleep
+from typing import Iterator
 
+from lstore.catalog import CATALOG
 from lstore.disk import Disk
 from lstore.lock_info import Lock_Manager
+from lstore.log_info import Log_Manager, Log_Record, Log_Record_Type
+from lstore.numpy_support import numpy
 from lstore.record_info import Record, RID
 from lstore.page_info import Page_Range
 from lstore.index import Index
+from lstore.timestamp_info import TIMESTAMP_ORACLE
+from lstore.transaction_context import TRANSACTION_CONTEXT
+import lstore.config as Config
 
 
 class Table:
 
-    def __init__(self, table_path:str, num_columns:int, key_index:int, num_records:int)->None:
+    def __init__(self, table_path:str, num_columns:int, key_index:int, num_records:int, log_manager:Log_Manager)->None:
         self.table_path:str                   = table_path
         self.num_columns:int                  = num_columns
         self.key_index:int                    = key_index
         self.num_records:int                  = num_records
+        # log of the database, shared by its tables
+        self.log_manager:Log_Manager          = log_manager
 
-        self.index:Index                      = Index(self.table_path, self.num_columns, self.key_index)
+        self.index:Index                      = Index(self.table_path, self.num_columns, self.key_index, self.__scan_column)
         self.lock_manager:Lock_Manager        = Lock_Manager()
         self.latch:RLock                      = RLock()
+        # serializes the unique key check with the index insert
+        self.insert_latch:Lock                = Lock()
 
         self.page_ranges:dict[int,Page_Range] = dict()
         self.__load_page_ranges()
@@ -32,14 +45,16 @@ class Table:
         del self.index
         self.index = None
 
-    def __increment_num_records(self)->None:
+    def __allocate_rid(self)->RID:
+        """
+        Allocates the next base RID. Must hold the table latch.
+        """
         # increment number of records in memory
         self.num_records += 1
 
-        # increment number of records in data
-        metadata = Disk.read_from_path_metadata(self.table_path)
-        metadata["num_records"] = self.num_records
-        Disk.write_to_path_metadata(self.table_path, metadata)
+        # increment number of records in the catalog (persisted on checkpoint)
+        CATALOG.set_metadata_field(self.table_path, "num_records", self.num_records)
+        return RID(self.num_records)
 
     def __get_page_ranges(self)->tuple[list[str],int]:
         page_range_dirs = Disk.list_directories_in_path(self.table_path)
@@ -54,12 +69,15 @@ class Table:
             if not num_page_ranges: return
             for page_range_path in page_range_paths:
                 page_range_index = int(os.path.basename(page_range_path).removeprefix("PR"))
-                metadata = Disk.read_from_path_metadata(page_range_path)
+                metadata = CATALOG.read_metadata(page_range_path)
                 self.page_ranges[page_range_index] = Page_Range(
                     metadata["page_range_path"],
                     metadata["page_range_index"],
                     metadata["latest_tid"],
                     metadata["tps_index"],
+                    self.num_columns,
+                    self.key_index,
+                    self.log_manager,
                 )
 
     def __create_page_range(self, page_range_index:int):
@@ -72,12 +90,15 @@ class Table:
             "latest_tid": 0,
             "tps_index": 0,
         }
-        Disk.write_to_path_metadata(page_range_path, metadata)
+        CATALOG.write_metadata(page_range_path, metadata)
         self.page_ranges[page_range_index] = Page_Range(
             metadata["page_range_path"],
             metadata["page_range_index"],
             metadata["latest_tid"],
             metadata["tps_index"],
+            self.num_columns,
+            self.key_index,
+            self.log_manager,
         )
 
     def __access_page_range(self, page_range_index:int)->None:
@@ -85,104 +106,309 @@ class Table:
             if not page_range_index in self.page_ranges:
                 self.__create_page_range(page_range_index)
 
-    def __get_columns(self, rid:RID, rollback_version:int=0)->tuple:
+    def __get_columns(self, rid:RID, rollback_version:int=0, read_timestamp:int|None=None,
+                      projected_columns:list[int]|None=None)->tuple|None:
+        # the record lock (or the snapshot) protects the record, the latch only the page range lookup
+        self.__access_page_range(rid.get_page_range_index())
+        return self.page_ranges[rid.get_page_range_index()].get_record_columns(rid, rollback_version, read_timestamp, projected_columns)
+
+    def __read_record(self, rid:RID)->tuple|None:
+        # newest columns of a record (None if deleted)
+        if self.__is_record_deleted(rid): return None
+        return self.__get_columns(rid)
+
+    def __scan_column(self, column_index:int)->Iterator[tuple]:
+        """
+        Yields the newest values of a column with the RIDs of the values, a
+        page range at a time, leaving deleted records out. Indexes are built
+        from them.
+
+        Each page range is read under a page range lock. A write changes the
+        indexes and the pages of a record under its record lock, so the scan
+        waits for the writes in progress (and the transactions making them,
+        which may roll back) to finish, and the index being built records the
+        writes made after.
+        """
+        num_records = self.num_records
+        num_records_per_page_range = Config.NUM_RECORDS_PER_PAGE * Config.NUM_BASE_PAGES_PER_PAGE_RANGE
+        for page_range_index in range((num_records + num_records_per_page_range - 1) // num_records_per_page_range):
+            first_rid = page_range_index * num_records_per_page_range + 1
+            rids = [RID(_) for _ in range(first_rid, min(first_rid + num_records_per_page_range, num_records + 1))]
+            # fails without waiting in NO_WAIT mode (or once LOCK_TIMEOUT expires)
+            while not self.lock_manager.acquire_page_range_read(page_range_index):
+                sleep(Config.DEADLOCK_CHECK_INTERVAL)
+            try:
+                self.__access_page_range(page_range_index)
+                values, value_rids, skipped_rids = self.page_ranges[page_range_index].scan_column(rids, column_index)
+                # tail records may have been moved by compaction, the page range finds them
+                skipped_columns = [(rid, self.__read_record(rid)) for rid in skipped_rids]
+                skipped_columns = [(rid, columns) for rid, columns in skipped_columns if columns is not None]
+            finally:
+                self.lock_manager.release_query_locks()
+            yield (values, value_rids)
+            yield ([columns[column_index] for _, columns in skipped_columns], [int(rid) for rid, _ in skipped_columns])
+
+    def get_record_version(self, rid:RID, read_timestamp:int|None=None)->int:
+        """
+        TID of the newest version of a record (in a snapshot when a read
+        timestamp is given), -1 for the base record. Validated by OCC transactions.
+        """
+        self.__access_page_range(rid.get_page_range_index())
+        return self.page_ranges[rid.get_page_range_index()].get_record_version(rid, read_timestamp)
+
+    def __get_buffering_transaction(self):
+        # OCC transaction in its read phase, which buffers its writes instead of applying them
+        transaction = TRANSACTION_CONTEXT.get_transaction()
+        return transaction if transaction is not None and transaction.is_buffering else None
+
+    def __track_read(self, rid:RID, columns:tuple|None, read_timestamp:int|None)->tuple|None:
+        """
+        Records the version an OCC transaction read and applies its own
+        buffered writes to the columns (None if it deleted the record).
+        """
+        transaction = self.__get_buffering_transaction()
+        if transaction is None:
+            return columns
+        transaction.track_read(self, int(rid), self.get_record_version(rid, read_timestamp))
+        return transaction.get_buffered_columns(self, int(rid), columns)
+
+    def __get_read_timestamp(self, as_of_timestamp:int|None=None)->int|None:
+        """
+        Snapshot read by select/sum: the start of the running transaction, now
+        outside of one (kept from compaction until __end_read). None when reads
+        lock records instead.
+        """
+        # past snapshots never change, so they are read without locks
+        if as_of_timestamp is not None:
+            return TIMESTAMP_ORACLE.begin_snapshot(as_of_timestamp)
+        # OCC transactions never lock what they read
+        transaction = self.__get_buffering_transaction()
+        if transaction is not None:
+            return transaction.start_timestamp
+        if not Config.SNAPSHOT_READS:
+            return None
+        transaction = TRANSACTION_CONTEXT.get_transaction()
+        if transaction is not None:
+            return transaction.start_timestamp
+        return TIMESTAMP_ORACLE.begin_snapshot()
+
+    def __end_read(self, read_timestamp:int|None, as_of_timestamp:int|None)->None:
+        # snapshots of transactions end with them
+        if read_timestamp is not None and (as_of_timestamp is not None or TRANSACTION_CONTEXT.get_transaction() is None):
+            TIMESTAMP_ORACLE.end_snapshot(read_timestamp)
+
+    def __is_key_located(self, primary_key, rid:RID)->bool:
+        """
+        Checks that a record still exists and holds the primary key it was
+        located by.
+        """
+        if self.__is_record_deleted(rid): return False
+        return [int(_) for _ in self.index.locate(primary_key, self.key_index)] == [int(rid)]
+
+    def __is_write_conflict(self, rid:RID)->bool:
+        """
+        Snapshot isolation: a transaction may not overwrite a version committed
+        after its snapshot was taken (first updater wins).
+        """
+        transaction = TRANSACTION_CONTEXT.get_transaction()
+        if not Config.SNAPSHOT_READS or transaction is None:
+            return False
+        self.__access_page_range(rid.get_page_range_index())
+        timestamp = self.page_ranges[rid.get_page_range_index()].get_version_timestamp(rid)
+        if TIMESTAMP_ORACLE.is_visible(timestamp, transaction.start_timestamp):
+            return False
+        # retried like a lock conflict, with a newer snapshot
+        transaction.track_lock_conflict()
+        return True
+
+    def __is_record_deleted(self, rid:RID)->bool:
+        self.__access_page_range(rid.get_page_range_index())
+        return self.page_ranges[rid.get_page_range_index()].is_record_deleted(rid)
+
+    def __track_index_undo(self, undo, *args)->None:
+        # the running transaction reverts its index changes on abort
+        transaction = TRANSACTION_CONTEXT.get_transaction()
+        if transaction is not None:
+            transaction.track_index_undo(undo, *args)
+
+    def checkpoint(self)->None:
+        """
+        Store table and page range counters in the catalog, and snapshot the primary key index.
+        """
         with self.latch:
-            self.__access_page_range(rid.get_page_range_index())
-            return self.page_ranges[rid.get_page_range_index()].get_record_columns(rid, rollback_version)
+            CATALOG.set_metadata_field(self.table_path, "num_records", self.num_records)
+            for page_range in self.page_ranges.values():
+                page_range.checkpoint()
+            self.index.checkpoint()
 
-    def insert_record(self, columns:tuple)->None:
+    def remove_retired_pages(self)->None:
         """
-        Insert record to table.
+        Delete the pages merges and compactions replaced, once the checkpointed catalog no longer uses them.
         """
-        # lock RID
-        while not self.lock_manager.acquire_write(RID(self.num_records + 1).get_page_range_index()): pass
+        with self.latch:
+            for page_range in self.page_ranges.values():
+                page_range.remove_retired_pages()
 
-        # create RID from num_records (base RID starts at 1)
-        rid = RID(self.num_records + 1)
+    def redo(self, record:Log_Record, timestamp:int|None)->None:
+        """
+        Reapply a logged change during recovery, with the commit timestamp of its versions.
+        """
+        rid = RID(record.rid)
+        self.__access_page_range(rid.get_page_range_index())
+        self.page_ranges[rid.get_page_range_index()].redo(record, timestamp)
+        if record.record_type == Log_Record_Type.INSERT:
+            self.num_records = max(self.num_records, int(rid))
 
+    def insert_record(self, columns:tuple)->None:
+        """
+        Insert record to table.
+        """
         # perform checks that may cause operation to be aborted
+        # number of columns in inserted column is wrong
+        if len(columns) != self.num_columns: return False
+        # key already exists in table
+        if len(self.index.locate(columns[self.key_index], self.key_index)): return False
+
+        transaction = self.__get_buffering_transaction()
+        if transaction is not None:
+            # key already inserted by the transaction (buffered inserts are not in the index yet)
+            if any(table is self and rid is None and args[0][self.key_index] == columns[self.key_index]
+                   for table, rid, _, args in transaction.buffered_writes): return False
+            transaction.buffer_write(self, None, self.insert_record, columns)
+            return
+
+        # allocate RID from num_records (base RID starts at 1)
+        with self.latch:
+            rid = self.__allocate_rid()
+
         try:
-            # number of columns in inserted column is wrong
-            if len(columns) != self.num_columns: raise Exception
-            # key already exists in table
-            if len(self.index.locate(columns[self.key_index], self.key_index)): raise Exception
-        except Exception:
-            return False
-        else:
-            # create record
-            record = Record(rid, self.key_index, columns)
-            # insert to index
-            self.index.insert(record.get_columns(), rid)
+            # lock RID before it can be found through the index
+            if not self.lock_manager.acquire_write(rid): return False
+            # key may have been inserted concurrently, the allocated RID is left as a deleted record
+            with self.insert_latch:
+                if len(self.index.locate(columns[self.key_index], self.key_index)): return False
+                # create record
+                record = Record(rid, self.key_index, columns)
+                # insert to index
+                self.index.insert(record.get_columns(), rid)
+                self.__track_index_undo(self.index.delete, record.get_columns(), rid)
             # insert to physical disk
             self.__access_page_range(record.get_page_range_index())
             self.page_ranges[record.get_page_range_index()].insert_record(record)
-            # apply new num_records to table's metadata
-            self.__increment_num_records()
         finally:
-            self.lock_manager.release_write(rid.get_page_range_index())
+            self.lock_manager.release_query_locks()
+
+    def select_record(self, search_key, search_key_index:int, selected_columns:list=None, rollback_version:int=0,
+                      as_of_timestamp:int|None=None)->list[Record]:
+        """
+        Select Record from Table (as of a past timestamp if given)
+        """
+        return self.select_records_where({search_key_index: search_key}, selected_columns, rollback_version, as_of_timestamp)
 
-    def select_record(self, search_key, search_key_index:int, selected_columns:list=None, rollback_version:int=0)->list[Record]:
+    def select_records_where(self, search_keys:dict, selected_columns:list=None, rollback_version:int=0,
+                             as_of_timestamp:int|None=None, match_any:bool=False)->list[Record]:
         """
-        Select Record from Table
+        Select Records from Table matching every (or with match_any, any) {column index: value} of search_keys
         """
         rlist = list()
+        is_match = any if match_any else all
 
-        # get specific RIDs from index
+        # get specific RIDs from the indexes (the columns without one are checked on the records)
         try:
-            rids = self.index.locate(search_key, search_key_index)
+            rids = self.index.locate_all(search_keys, match_any)
+            is_full_scan = False
         # if no index available, conduct full table scan
         except KeyError:
             rids = {RID(i) for i in range(1, self.num_records + 1)}
+            is_full_scan = True
 
-        # construct a list of records
-        for rid in rids:
-            # lock RID
-            while not self.lock_manager.acquire_read(rid.get_page_range_index(), search_key): pass
+        # only the selected columns (and the searched ones) are read from disk
+        projected_columns = None
+        if selected_columns != None:
+            projected_columns = [int(_ == 1 or i in search_keys) for i, _ in enumerate(selected_columns)]
 
-            try:
+        # construct a list of records
+        read_timestamp = self.__get_read_timestamp(as_of_timestamp)
+        try:
+            for rid in rids:
+                # lock RID unless reading a snapshot (a scan locks whole page ranges once it locked enough of their records)
+                if read_timestamp is None and not self.lock_manager.acquire_read(rid): return False
+                if is_full_scan and self.__is_record_deleted(rid): continue
                 # access column values from disk
-                columns = self.__get_columns(rid, rollback_version)
+                columns = self.__get_columns(rid, rollback_version, read_timestamp, projected_columns)
+                # a past snapshot is not validated by an optimistic transaction
+                if as_of_timestamp is None: columns = self.__track_read(rid, columns, read_timestamp)
+                # record inserted after the snapshot (or deleted by the transaction)
+                if columns is None: continue
                 # conditional that avoids creating records for non-searched info (only really useful for full table scans)
-                if columns[search_key_index] != search_key: continue
+                if not is_match(columns[i] == _ for i, _ in search_keys.items()): continue
                 # construct record and add to records list
                 if selected_columns != None:
                     if len(columns) != len(selected_columns): raise Exception
                     columns = tuple([_ for i, _ in enumerate(columns) if selected_columns[i] == 1])
                 rlist.append(Record(rid, self.key_index, columns))
-            except Exception:
-                return False
-            finally:
-                self.lock_manager.release_read(rid.get_page_range_index())
+        except Exception:
+            return False
+        finally:
+            self.lock_manager.release_query_locks()
+            self.__end_read(read_timestamp, as_of_timestamp)
 
         return rlist
 
-    def sum_records(self, start_range, end_range, aggregate_column_index:int, rollback_version:int=0)->int:
+    def sum_records(self, start_range, end_range, aggregate_column_index:int, rollback_version:int=0,
+                    as_of_timestamp:int|None=None)->int:
         """
-        Sum Records from Table
+        Sum Records from Table (as of a past timestamp if given)
         """
         rsum = 0
 
         # get RIDs
         try:
-            rids = self.index.locate_range(start_range, end_range, self.key_index)
+            rids = list(self.index.locate_range(start_range, end_range, self.key_index))
+            is_full_scan = False
         except KeyError:
             rids = {RID(i) for i in range(1, self.num_records + 1)}
+            is_full_scan = True
 
-        for rid in rids:
-            # lock RID
-            while not self.lock_manager.acquire_read(rid.get_page_range_index()): pass
-
-            try:
+        read_timestamp = self.__get_read_timestamp(as_of_timestamp)
+        try:
+            # lock RIDs unless reading a snapshot
+            if read_timestamp is None and not all(self.lock_manager.acquire_read(rid) for rid in rids): return False
+            # the versions OCC transactions read are tracked record by record
+            if not rollback_version and (as_of_timestamp is not None or self.__get_buffering_transaction() is None):
+                rsum, rids = self.__scan_sum(rids, aggregate_column_index, read_timestamp)
+            for rid in rids:
+                if is_full_scan and self.__is_record_deleted(rid): continue
                 # access column from disk
-                columns = self.__get_columns(rid, rollback_version)
+                columns = self.__get_columns(rid, rollback_version, read_timestamp)
+                # a past snapshot is not validated by an optimistic transaction
+                if as_of_timestamp is None: columns = self.__track_read(rid, columns, read_timestamp)
+                if columns is None: continue
                 rsum += columns[aggregate_column_index]
-            except Exception:
-                return False
-            finally:
-                self.lock_manager.release_read(rid.get_page_range_index())
+        except Exception:
+            return False
+        finally:
+            self.lock_manager.release_query_locks()
+            self.__end_read(read_timestamp, as_of_timestamp)
 
         return rsum
 
+    def __scan_sum(self, rids:set[RID], aggregate_column_index:int, read_timestamp:int|None)->tuple[int,list[RID]]:
+        """
+        Sums a column of Records with a batch scan of each page range. Returns
+        the sum and the Records left to read record by record.
+        """
+        page_range_rids:defaultdict[int,list[RID]] = defaultdict(list)
+        for rid in rids:
+            page_range_rids[rid.get_page_range_index()].append(rid)
+        rsum, skipped_rids = 0, list()
+        for page_range_index, page_rids in page_range_rids.items():
+            self.__access_page_range(page_range_index)
+            values, _, page_skipped_rids = self.page_ranges[page_range_index].scan_column(page_rids, aggregate_column_index, read_timestamp)
+            rsum += int(values.sum()) if numpy is not None else sum(values)
+            skipped_rids.extend(page_skipped_rids)
+        return (rsum, skipped_rids)
+
     def update_record(self, primary_key, new_columns:tuple)->bool:
         """
         Update Record from Table
@@ -193,8 +419,14 @@ class Table:
         assert len(rids) == 1
         rid = rids.pop()
 
-        # lock RID
-        while not self.lock_manager.acquire_write(rid.get_page_range_index()): pass
+        transaction = self.__get_buffering_transaction()
+        if transaction is not None:
+            return self.__buffer_update(transaction, rid, primary_key, new_columns)
+
+        # lock RID, the record may have been deleted (or its key updated) while waiting for the lock
+        if not self.lock_manager.acquire_write(rid) or self.__is_write_conflict(rid) or not self.__is_key_located(primary_key, rid):
+            self.lock_manager.release_query_locks()
+            return False
 
         # perform checks that may abort the operation
         try:
@@ -213,24 +445,52 @@ class Table:
         else:
             # update entry values associated to RID in index
             self.index.update(old_columns, new_columns, rid)
+            updated_columns = tuple([old_columns[i] if new_columns[i] == None else new_columns[i] for i in range(len(old_columns))])
+            self.__track_index_undo(self.index.update, updated_columns, old_columns, rid)
             # update record in disk
             # print(f"UPDATING KEY {primary_key} OF RID {rid} AND ORIGINAL COLUMNS {old_columns} WITH NEW COLUMNS {new_columns}")
             self.__access_page_range(rid.get_page_range_index())
             self.page_ranges[rid.get_page_range_index()].update_record(rid, old_columns, new_columns)
             return True
         finally:
-            self.lock_manager.release_write(rid.get_page_range_index())
+            self.lock_manager.release_query_locks()
+
+    def __buffer_update(self, transaction, rid:RID, primary_key, new_columns:tuple)->bool:
+        """
+        Read phase of an OCC update: reads the record from the snapshot and
+        buffers the update until the transaction validates.
+        """
+        try:
+            old_columns = self.__track_read(rid, self.__get_columns(rid, 0, transaction.start_timestamp), transaction.start_timestamp)
+            if old_columns is None or len(old_columns) != len(new_columns): return False
+        except Exception:
+            return False
+        # only update if the new columns are changing values in the record
+        if all(new_columns[i] == None or new_columns[i] == old_columns[i] for i in range(len(new_columns))): return True
+        updated_columns = tuple([old_columns[i] if new_columns[i] == None else new_columns[i] for i in range(len(old_columns))])
+        transaction.buffer_columns(self, int(rid), updated_columns)
+        transaction.buffer_write(self, int(rid), self.update_record, primary_key, new_columns)
+        return True
 
     def delete_record(self, primary_key)->bool:
         """
         Delete Record from Table
         """
         rids = self.index.locate(primary_key, self.key_index)
-        assert len(rids) == 1
+        if len(rids) != 1: return False
         rid = rids.pop()
 
-        # lock RID
-        while not self.lock_manager.acquire_write(rid.get_page_range_index()): pass
+        transaction = self.__get_buffering_transaction()
+        if transaction is not None:
+            if self.__track_read(rid, self.__get_columns(rid, 0, transaction.start_timestamp), transaction.start_timestamp) is None: return False
+            transaction.buffer_columns(self, int(rid), None)
+            transaction.buffer_write(self, int(rid), self.delete_record, primary_key)
+            return True
+
+        # lock RID, the record may have been deleted (or its key updated) while waiting for the lock
+        if not self.lock_manager.acquire_write(rid) or self.__is_write_conflict(rid) or not self.__is_key_located(primary_key, rid):
+            self.lock_manager.release_query_locks()
+            return False
 
         try:
             # delete record from index
@@ -240,9 +500,10 @@ class Table:
         else:
             # delete info associated to RID in index
             self.index.delete(columns, rid)
+            self.__track_index_undo(self.index.insert, columns, rid)
             # delete record from disk
             self.__access_page_range(rid.get_page_range_index())
             self.page_ranges[rid.get_page_range_index()].delete_record(rid)
             return True
         finally:
-            self.lock_manager.release_write(rid.get_page_range_index())
+            self.lock_manager.release_query_locks()
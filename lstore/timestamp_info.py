@@ -0,0 +1,131 @@
+from collections import Counter
+from threading import Lock
+from time import time_ns
+
+from lstore.transaction_context import TRANSACTION_CONTEXT
+
+# versions written by a running transaction are stamped with UNCOMMITTED_TIMESTAMP
+# plus its id, which is newer than any snapshot, until it commits
+UNCOMMITTED_TIMESTAMP = 2 ** 62
+
+
+class Timestamp_Oracle:
+    """
+    Hands out monotonic microsecond timestamps for versions and snapshots.
+
+    A transaction stamps its versions with its commit timestamp while it
+    commits. Snapshots never include a commit timestamp whose versions are
+    still being stamped, so a snapshot never changes after it was taken.
+
+    Snapshots in use are registered so that compaction keeps the versions
+    they read.
+    """
+
+    def __init__(self)->None:
+        self.latch:Lock              = Lock()
+        self.last_timestamp:int      = 0
+        self.committing:set[int]     = set()
+        self.snapshots:Counter[int]  = Counter() # {read timestamp: number of readers}
+
+    def __next_timestamp(self)->int:
+        self.last_timestamp = max(time_ns() // 1000, self.last_timestamp + 1)
+        return self.last_timestamp
+
+    def get_write_timestamp(self)->int:
+        """
+        Returns the timestamp of a version written by the current thread.
+        Versions written outside of a transaction are committed right away.
+        """
+        transaction = TRANSACTION_CONTEXT.get_transaction()
+        if transaction is not None:
+            return UNCOMMITTED_TIMESTAMP + transaction.id
+        with self.latch:
+            return self.__next_timestamp()
+
+    def __get_read_timestamp(self)->int:
+        if len(self.committing):
+            return min(self.committing) - 1
+        # versions of a previous run of the database are older than the clock
+        return self.__next_timestamp()
+
+    def get_read_timestamp(self)->int:
+        """
+        Returns the timestamp of a snapshot including every committed version.
+        """
+        with self.latch:
+            return self.__get_read_timestamp()
+
+    def begin_snapshot(self, as_of_timestamp:int|None=None)->int:
+        """
+        Returns the read timestamp of a snapshot (of the past when a timestamp
+        is given) kept from compaction until end_snapshot.
+        """
+        with self.latch:
+            read_timestamp = self.__get_read_timestamp()
+            if as_of_timestamp is not None:
+                read_timestamp = min(read_timestamp, as_of_timestamp)
+            self.snapshots[read_timestamp] += 1
+            return read_timestamp
+
+    def end_snapshot(self, read_timestamp:int)->None:
+        with self.latch:
+            self.snapshots[read_timestamp] -= 1
+            if not self.snapshots[read_timestamp]:
+                del self.snapshots[read_timestamp]
+
+    def get_oldest_snapshot(self)->int|None:
+        """
+        Returns the read timestamp of the oldest snapshot in use, if any.
+        """
+        with self.latch:
+            return min(self.snapshots, default=None)
+
+    def get_timestamp_at(self, seconds:float)->int:
+        """
+        Returns the read timestamp of a snapshot of the versions committed up
+        to a time in seconds since the epoch (e.g. time.time()).
+        """
+        return int(seconds * 1_000_000)
+
+    def advance(self, timestamp:int)->None:
+        """
+        Moves the clock past a commit timestamp of a previous run replayed by
+        recovery, so newer versions are never stamped older than it.
+        """
+        with self.latch:
+            self.last_timestamp = max(self.last_timestamp, timestamp)
+
+    def begin_commit(self)->int:
+        with self.latch:
+            commit_timestamp = self.__next_timestamp()
+            self.committing.add(commit_timestamp)
+            return commit_timestamp
+
+    def end_commit(self, commit_timestamp:int)->None:
+        with self.latch:
+            self.committing.discard(commit_timestamp)
+
+    def is_visible(self, timestamp:int, read_timestamp:int)->bool:
+        """
+        Checks if a version belongs to a snapshot. Versions of aborted (or
+        never written) records have no timestamp.
+        """
+        if 0 < timestamp <= read_timestamp:
+            return True
+        transaction = TRANSACTION_CONTEXT.get_transaction()
+        # a transaction sees its own writes
+        return transaction is not None and timestamp == UNCOMMITTED_TIMESTAMP + transaction.id
+
+    def get_visible_mask(self, timestamps:"numpy.ndarray", read_timestamp:int)->"numpy.ndarray":
+        """
+        Checks which versions of a NumPy array of timestamps belong to a
+        snapshot at once, like is_visible.
+        """
+        mask = (timestamps > 0) & (timestamps <= read_timestamp)
+        transaction = TRANSACTION_CONTEXT.get_transaction()
+        if transaction is not None:
+            mask |= timestamps == UNCOMMITTED_TIMESTAMP + transaction.id
+        return mask
+
+
+TIMESTAMP_ORACLE = Timestamp_Oracle()
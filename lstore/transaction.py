@@ -1,19 +1,60 @@
-from lstore.bufferpool import BUFFERPOOL
+from threading import Lock
+
+import lstore.config as Config
+from lstore.bufferpool import BUFFERPOOL, Frame
+from lstore.lock_info import Lock_Manager
+from lstore.log_info import Log_Manager, Log_Record, Log_Record_Type
+from lstore.record_info import RID
 from lstore.table import Table
+from lstore.timestamp_info import TIMESTAMP_ORACLE
+from lstore.transaction_context import TRANSACTION_CONTEXT
 
 
 num_transactions = 0
+# guards the is_running flags of transactions (testers deepcopy transactions, so they cannot hold a lock)
+running_latch = Lock()
 
 class Transaction:
 
-    def __init__(self):
+    def __init__(self, concurrency_mode:str=Config.TRANSACTION_CONCURRENCY_MODE):
         """
         Creates a transaction object.
+
+        LOCKING transactions lock the records they write as they run. OCC
+        transactions buffer their writes, then lock the written records,
+        validate the versions they read and install the writes on commit.
         """
+        assert concurrency_mode in ("LOCKING", "OCC")
         global num_transactions
         self.id:int = num_transactions
         num_transactions += 1
         self.queries:list[tuple] = list() # [(query method, (args))]
+        self.concurrency_mode:str = concurrency_mode
+
+        # footprint of the transaction in the bufferpool
+        self.dirty_frames:dict[str,Frame]               = dict() # {page path: frame pinned until commit/abort}
+        self.dirty_pages:set[tuple[str,int]]            = set() # {(page path, physical page index)}
+        self.undo_entries:list[tuple[str,int,int,int]] = list() # [(page path, physical page index, id, old value)]
+        self.log_records:dict[Log_Manager,list[Log_Record]] = dict() # {log of a database written: records}
+        self.index_undos:list[tuple]                    = list() # [(index method, (args))]
+
+        # lock managers of the tables this transaction holds locks in (strict 2PL)
+        self.lock_managers:set[Lock_Manager]            = set()
+        # whether the last run aborted because a lock could not be acquired
+        self.is_lock_conflict:bool                      = False
+
+        # snapshot read by the transaction and timestamp of the versions it wrote
+        self.start_timestamp:int                        = 0
+        self.commit_timestamp:int                       = 0
+
+        # OCC read phase: versions read and writes buffered until commit
+        self.is_buffering:bool                          = False
+        self.read_versions:dict[tuple,int]              = dict() # {(table, rid): tid read (-1 for the base record)}
+        self.buffered_writes:list[tuple]                = list() # [(table, rid or None for inserts, table method, (args))]
+        self.buffered_columns:dict[tuple,tuple|None]    = dict() # {(table, rid): columns after the buffered writes, None if deleted}
+
+        # set while a thread runs the transaction
+        self.is_running:bool                            = False
 
     def add_query(self, query, table:Table, *args):
         """
@@ -27,20 +68,164 @@ class Transaction:
         self.queries.append((query, args))
         # use grades_table for aborting
 
+    def track_write(self, frame:Frame, physical_page_index:int, id:int, old_value:int)->None:
+        """
+        Records an entry overwritten by this transaction so it can be flushed
+        on commit or restored on abort.
+
+        The frame stays pinned until then so uncommitted changes never reach the disk.
+        """
+        if not frame.page_path in self.dirty_frames:
+            frame.pin()
+            self.dirty_frames[frame.page_path] = frame
+        self.dirty_pages.add((frame.page_path, physical_page_index))
+        self.undo_entries.append((frame.page_path, physical_page_index, id, old_value))
+
+    def track_log_record(self, log_manager:Log_Manager, record:Log_Record)->None:
+        self.log_records.setdefault(log_manager, list()).append(record)
+
+    def track_index_undo(self, undo, *args)->None:
+        self.index_undos.append((undo, args))
+
+    def track_lock_manager(self, lock_manager:Lock_Manager)->None:
+        self.lock_managers.add(lock_manager)
+
+    def track_lock_conflict(self)->None:
+        self.is_lock_conflict = True
+
+    def track_read(self, table:Table, rid:int, version:int)->None:
+        # the first read of a record is the version it is validated against
+        self.read_versions.setdefault((table, rid), version)
+
+    def buffer_write(self, table:Table, rid:int|None, write, *args)->None:
+        self.buffered_writes.append((table, rid, write, args))
+
+    def buffer_columns(self, table:Table, rid:int, columns:tuple|None)->None:
+        self.buffered_columns[(table, rid)] = columns
+
+    def get_buffered_columns(self, table:Table, rid:int, columns:tuple|None)->tuple|None:
+        """
+        Applies the buffered writes of the transaction to the columns it read.
+        """
+        return self.buffered_columns.get((table, rid), columns)
+
+    def __release_locks(self)->None:
+        for lock_manager in self.lock_managers:
+            lock_manager.release_all(self)
 
     def run(self):
+        # a run's footprint (undo entries, locks, commit state) belongs to a single thread
+        with running_latch:
+            if self.is_running: raise RuntimeError(f"Transaction {self.id} is already running in another thread")
+            self.is_running = True
+        try:
+            return self.__run()
+        finally:
+            self.is_running = False
+
+    def __run(self):
+        self.is_lock_conflict = False
+        self.start_timestamp = TIMESTAMP_ORACLE.begin_snapshot()
+        self.is_buffering = self.concurrency_mode == "OCC"
+        TRANSACTION_CONTEXT.set_transaction(self)
+        try:
+            try:
+                is_successful = self.__run_queries()
+            # a query that raises aborts the transaction like one that fails, releasing its locks and frames
+            except Exception:
+                is_successful = False
+            return self.commit() if is_successful else self.abort()
+        finally:
+            self.is_buffering = False
+            TRANSACTION_CONTEXT.clear_transaction()
+            TIMESTAMP_ORACLE.end_snapshot(self.start_timestamp)
+
+    def __run_queries(self)->bool:
         for query, args in self.queries:
             result = query(*args)
             # If the query has failed the transaction should abort
             if result == False:
-                return self.abort()
-        return self.commit()
+                return False
+        if self.is_buffering:
+            self.is_buffering = False
+            return self.__validate() and self.__install()
+        return True
+
+    def __validate(self)->bool:
+        """
+        Locks the records to write (in a global order, so validating transactions
+        cannot deadlock each other) and checks that no version read has been
+        replaced or is being replaced since.
+        """
+        # a read-only transaction read a committed snapshot, it serializes at its start
+        if not len(self.buffered_writes):
+            return True
+        written = {(table, rid) for table, rid, _, _ in self.buffered_writes if rid is not None}
+        for table, rid in sorted(written, key=lambda _: (_[0].table_path, _[1])):
+            if not table.lock_manager.acquire_write(RID(rid)):
+                return False
+        for (table, rid), version in self.read_versions.items():
+            if table.get_record_version(RID(rid)) != version or \
+               (not (table, rid) in written and table.lock_manager.is_write_locked(RID(rid))):
+                self.track_lock_conflict()
+                return False
+        return True
+
+    def __install(self)->bool:
+        for table, _, write, args in self.buffered_writes:
+            if write(*args) == False:
+                return False
+        return True
 
     def abort(self):
-        BUFFERPOOL.abort_writes_to_disk()
+        try:
+            BUFFERPOOL.rollback_writes(self.undo_entries)
+            for undo, args in reversed(self.index_undos):
+                undo(*args)
+        finally:
+            # a failing undo must not leave the frames pinned and the records locked
+            BUFFERPOOL.release_frames(self.dirty_frames.values())
+            self.__release_locks()
+            self.__reset_footprint()
         return False
 
     def commit(self):
-        BUFFERPOOL.commit_writes_to_disk()
+        # versions (base or tail records) written by the transaction get the commit timestamp,
+        # snapshots only include it once the commit is durable
+        versions = [(page_path, id) for page_path, physical_page_index, id, _ in self.undo_entries
+                    if physical_page_index == Config.TIMESTAMP_COLUMN]
+        if len(versions):
+            self.commit_timestamp = TIMESTAMP_ORACLE.begin_commit()
+            BUFFERPOOL.set_commit_timestamps(versions, self.commit_timestamp)
+        try:
+            # no log to make the changes to these pages durable, write the pages themselves
+            BUFFERPOOL.write_pages_to_disk({(page_path, physical_page_index) for page_path, physical_page_index in self.dirty_pages
+                                            if self.dirty_frames[page_path].log_manager is None})
+            # commit is a single append to the log of each database written, pages are written lazily by the bufferpool
+            commit_lsns = dict()
+            for log_manager, log_records in self.log_records.items():
+                commit_record = Log_Record(Log_Record_Type.COMMIT, transaction_id=self.id,
+                                           timestamp=self.commit_timestamp if len(versions) else None)
+                commit_lsns[log_manager] = log_manager.append(log_records + [commit_record])
+            BUFFERPOOL.release_frames(self.dirty_frames.values(), commit_lsns)
+            for log_manager, commit_lsn in commit_lsns.items():
+                log_manager.wait_flushed(commit_lsn)
+        finally:
+            if len(versions):
+                TIMESTAMP_ORACLE.end_commit(self.commit_timestamp)
+        # locks are held until the commit is durable
+        self.__release_locks()
+        self.__reset_footprint()
         return True
 
+    def __reset_footprint(self)->None:
+        self.dirty_frames = dict()
+        self.dirty_pages = set()
+        self.undo_entries = list()
+        self.index_undos = list()
+        self.lock_managers = set()
+        self.log_records = dict()
+        self.read_versions = dict()
+        self.buffered_writes = list()
+        self.buffered_columns = dict()
+
@@ -0,0 +1,28 @@
+from threading import local
+
+
+class Transaction_Context(local):
+    """
+    Keeps track of the transaction being run by the current thread so the
+    layers below the query API (table, bufferpool, ...) can attribute their
+    work to it. Each thread sees its own transaction.
+    """
+
+    def __init__(self)->None:
+        self.transaction = None
+
+    def set_transaction(self, transaction)->None:
+        self.transaction = transaction
+
+    def get_transaction(self):
+        """
+        Returns the transaction run by the current thread or None when
+        queries are run outside of a transaction.
+        """
+        return self.transaction
+
+    def clear_transaction(self)->None:
+        self.transaction = None
+
+
+TRANSACTION_CONTEXT = Transaction_Context()
@@ -1,25 +1,61 @@
+from random import uniform
 from threading import Thread
+from time import perf_counter, sleep
 
+import lstore.config as Config
 from lstore.transaction import Transaction
 
 threads = list()
 
 num_transaction_workers = 0
 
+
+class Retry_Policy:
+    """
+    Decides whether an aborted transaction is run again and how long the
+    worker backs off before (exponential backoff with full jitter).
+    """
+
+    def __init__(self, max_attempts:int=Config.TRANSACTION_MAX_ATTEMPTS,
+                 backoff_base:float=Config.TRANSACTION_BACKOFF_BASE,
+                 backoff_max:float=Config.TRANSACTION_BACKOFF_MAX,
+                 retry_only_on_lock_conflict:bool=Config.TRANSACTION_RETRY_ONLY_ON_LOCK_CONFLICT)->None:
+        assert max_attempts > 0
+        self.max_attempts:int                  = max_attempts
+        self.backoff_base:float                = backoff_base
+        self.backoff_max:float                 = backoff_max
+        self.retry_only_on_lock_conflict:bool  = retry_only_on_lock_conflict
+
+    def should_retry(self, transaction:Transaction, num_attempts:int)->bool:
+        if num_attempts >= self.max_attempts:
+            return False
+        return transaction.is_lock_conflict or not self.retry_only_on_lock_conflict
+
+    def get_backoff(self, num_attempts:int)->float:
+        return uniform(0, min(self.backoff_max, self.backoff_base * 2 ** (num_attempts - 1)))
+
+
 class TransactionWorker:
 
-    def __init__(self, transactions:list = [])->None:
+    def __init__(self, transactions:list|None = None, retry_policy:Retry_Policy|None = None)->None:
         """
         Creates a transaction worker object.
         """
         global num_transaction_workers
         self.id:int                         = num_transaction_workers
         num_transaction_workers += 1
-        self.transactions:list[Transaction] = transactions
+        # a list of its own, workers created without transactions must not share one
+        self.transactions:list[Transaction] = list(transactions) if transactions else []
+        self.retry_policy:Retry_Policy      = retry_policy if retry_policy is not None else Retry_Policy()
         self.stats:list[bool]               = list()
         self.result:int                     = 0
         self.thread:Thread                  = None
 
+        # statistics of the runs
+        self.num_attempts:int               = 0
+        self.num_aborts:int                 = 0
+        self.latencies:list[float]          = list() # seconds from first run to commit/give up, per transaction
+
 
     def add_transaction(self, t:Transaction):
         """
@@ -46,9 +82,47 @@ class TransactionWorker:
         self.thread.join()
 
 
+    def get_stats(self)->dict:
+        """
+        Returns attempts, aborts and latencies of the transactions run so far.
+        """
+        latencies = sorted(self.latencies)
+        percentile = lambda p: latencies[min(len(latencies) - 1, int(p * len(latencies)))] if len(latencies) else 0.0
+        return {
+            "transactions": len(self.stats),
+            "commits": self.result,
+            "attempts": self.num_attempts,
+            "aborts": self.num_aborts,
+            "mean_latency": sum(latencies) / len(latencies) if len(latencies) else 0.0,
+            "p50_latency": percentile(0.5),
+            "p99_latency": percentile(0.99),
+        }
+
+
+    def __run_transaction(self, transaction:Transaction)->bool:
+        """
+        Runs a transaction until it commits or the retry policy gives up.
+        """
+        num_attempts = 0
+        start_time = perf_counter()
+        while True:
+            num_attempts += 1
+            self.num_attempts += 1
+            # the transaction keeps its id, so it ages and stops being picked as deadlock victim
+            is_committed = transaction.run()
+            if is_committed:
+                break
+            self.num_aborts += 1
+            if not self.retry_policy.should_retry(transaction, num_attempts):
+                break
+            sleep(self.retry_policy.get_backoff(num_attempts))
+        self.latencies.append(perf_counter() - start_time)
+        return is_committed
+
+
     def __run(self):
         for transaction in self.transactions:
             # each transaction returns True if committed or False if aborted
-            self.stats.append(transaction.run())
+            self.stats.append(self.__run_transaction(transaction))
         # stores the number of transactions that committed
         self.result = len(list(filter(lambda x: x, self.stats)))
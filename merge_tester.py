@@ -0,0 +1,130 @@
+import shutil
+import sys
+import threading
+from random import Random
+
+import lstore.config as Config
+from lstore.db import Database
+from lstore.merge_info import MERGE_MANAGER
+from lstore.query import Query
+
+"""
+Background merge tester: updates records from several threads while page
+ranges are merged in the background, then checks the newest and older
+versions of every record against a model of its history, before and after
+reopening the database.
+
+Each page range that accumulated MERGE_THRESHOLD tail records must have
+been merged: its TPS advanced and it reads merged base pages. Updates made
+after a merge (past the TPS) are read from the tail pages on top of them.
+"""
+
+DB_PATH = "./MERGE"
+
+num_threads = 4
+number_of_records = 5000 # three page ranges
+updates_per_thread = 2500
+checked_versions = 4
+
+
+class Writer(threading.Thread):
+    """
+    Updates the keys congruent to its index modulo num_threads, keeping their history.
+    """
+
+    def __init__(self, index:int, query:Query, history:dict[int,list[list[int]]])->None:
+        super().__init__()
+        self.index:int                         = index
+        self.query:Query                       = query
+        self.history:dict[int,list[list[int]]] = history
+        self.random:Random                     = Random(index)
+
+    def run(self)->None:
+        for _ in range(updates_per_thread):
+            # a few keys per page range get long histories
+            key = self.random.randrange(self.index, number_of_records, num_threads if self.random.randint(0, 3) else 100 * num_threads)
+            updated_columns = [None] + [self.random.randint(0, 999) if self.random.randint(0, 1) else None for _ in range(4)]
+            if self.query.update(key, *updated_columns) == False: continue
+            columns = [new if new is not None else old for new, old in zip(updated_columns, self.history[key][-1])]
+            # an update that changes nothing adds no version
+            if columns != self.history[key][-1]: self.history[key].append(columns)
+
+
+def check(tag:str, query:Query, history:dict[int,list[list[int]]])->int:
+    num_errors = 0
+    for key, versions in history.items():
+        for relative_version in range(checked_versions):
+            expected_columns = versions[max(0, len(versions) - 1 - relative_version)]
+            records = query.select_version(key, 0, [1, 1, 1, 1, 1], -relative_version)
+            if records == False or len(records) != 1 or list(records[0].columns) != expected_columns:
+                print(f"{tag}: version -{relative_version} of key {key} is {records and list(records[0].columns)}, "
+                      f"expected {expected_columns}")
+                num_errors += 1
+    return num_errors
+
+
+def check_merged(tag:str, grades_table)->int:
+    num_errors = 0
+    for page_range_index, page_range in grades_table.page_ranges.items():
+        if page_range.latest_tid < Config.MERGE_THRESHOLD: continue
+        if not page_range.tps_index or not len(page_range.merged_pages) or page_range.tps_index > page_range.latest_tid:
+            print(f"{tag}: page range {page_range_index} with {page_range.latest_tid} tail records has TPS "
+                  f"{page_range.tps_index} and {len(page_range.merged_pages)} merged pages")
+            num_errors += 1
+    return num_errors
+
+
+def main()->None:
+    Config.MERGE_THRESHOLD = 300
+    shutil.rmtree(DB_PATH, ignore_errors=True)
+    db = Database()
+    db.open(DB_PATH)
+    grades_table = db.create_table('Grades', 5, 0)
+    query = Query(grades_table)
+    history:dict[int,list[list[int]]] = dict()
+    for key in range(number_of_records):
+        query.insert(key, 0, 0, 0, 0)
+        history[key] = [[key, 0, 0, 0, 0]]
+    num_errors = 0
+
+    # merges run while the writers keep updating
+    writers = [Writer(i, query, history) for i in range(num_threads)]
+    for writer in writers:
+        writer.start()
+    for writer in writers:
+        writer.join()
+    num_errors += check("while merging", query, history)
+    MERGE_MANAGER.wait()
+    stats = MERGE_MANAGER.get_stats()
+    print(f"{stats['merges']} merges in {stats['merge_time']:.2f} s, TPS of the page ranges "
+          f"{[_.tps_index for _ in grades_table.page_ranges.values()]}")
+    if not stats["merges"]:
+        print("no page range was merged")
+        num_errors += 1
+    num_errors += check_merged("merged", grades_table)
+    num_errors += check("merged", query, history)
+
+    # versions past the TPS are read on top of the merged pages
+    writers = [Writer(i + num_threads, query, history) for i in range(num_threads)]
+    for writer in writers:
+        writer.run()
+    num_errors += check("updated after the merge", query, history)
+
+    db.close()
+    db = Database()
+    db.open(DB_PATH)
+    grades_table = db.get_table('Grades')
+    query = Query(grades_table)
+    num_errors += check_merged("reopened", grades_table)
+    num_errors += check("reopened", query, history)
+    MERGE_MANAGER.wait()
+    num_errors += check("reopened and merged", query, history)
+
+    print(f"background merge: {num_errors} errors")
+    db.close()
+    shutil.rmtree(DB_PATH, ignore_errors=True)
+    sys.exit(1 if num_errors else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+import shutil
+import sys
+from random import randint, sample, seed
+
+import lstore.config as Config
+from lstore.bufferpool import BUFFERPOOL
+from lstore.db import Database
+from lstore.merge_info import MERGE_MANAGER
+from lstore.query import Query
+
+"""
+Projection tester: selects single columns of 5, 20 and 60 column tables
+after reopening them, and checks that the frames read only loaded the
+physical pages of the key column and the selected column (besides the
+metadata columns), never those of the other columns. Then checks the
+values of random projections against a model of the table.
+
+Every table is checked with its pages stored in both FRAME_STORAGE_MODEs,
+with part of its updates merged.
+"""
+
+DB_PATH = "./PROJECTION"
+
+# tables wider than 64 columns cannot be updated (the schema encoding is a single 64 bit field)
+numbers_of_columns = [5, 20, 60]
+number_of_records = 3000 # two page ranges
+number_of_updates = 4000
+number_of_selects = 500
+
+
+def get_loaded_columns()->set[int]:
+    """
+    Get the data columns whose physical pages some frame of the bufferpool loaded.
+    """
+    return {physical_page_index - Config.NUM_METADATA_COLUMNS
+            for frame in BUFFERPOOL.frames.values()
+            for physical_page_index, physical_page in enumerate(frame.physical_pages)
+            if physical_page is not None and physical_page_index >= Config.NUM_METADATA_COLUMNS}
+
+
+def check_projections(tag:str, query:Query, model:dict[int,list[int]], num_columns:int)->int:
+    num_errors = 0
+    for _ in range(number_of_selects):
+        key = randint(0, number_of_records - 1)
+        projected_columns_index = [randint(0, 1) for _ in range(num_columns)]
+        expected_columns = [value for value, is_projected in zip(model[key], projected_columns_index) if is_projected]
+        records = query.select(key, 0, projected_columns_index)
+        if records == False or len(records) != 1 or list(records[0].columns) != expected_columns:
+            print(f"{tag}: key {key} projected on {projected_columns_index} is {records and list(records[0].columns)}, "
+                  f"expected {expected_columns}")
+            num_errors += 1
+    return num_errors
+
+
+def check_table(num_columns:int, storage_mode:str)->int:
+    tag = f"{num_columns} columns, {storage_mode}"
+    Config.FRAME_STORAGE_MODE = storage_mode
+    shutil.rmtree(DB_PATH, ignore_errors=True)
+    db = Database()
+    db.open(DB_PATH)
+    query = Query(db.create_table('Grades', num_columns, 0))
+    model:dict[int,list[int]] = dict()
+    for key in range(number_of_records):
+        model[key] = [key] + [randint(0, 999) for _ in range(num_columns - 1)]
+        query.insert(*model[key])
+    for _ in range(number_of_updates):
+        key = randint(0, number_of_records - 1)
+        updated_columns = [None] + [randint(0, 999) if randint(0, 3) else None for _ in range(num_columns - 1)]
+        query.update(key, *updated_columns)
+        model[key] = [new if new is not None else old for new, old in zip(updated_columns, model[key])]
+    MERGE_MANAGER.wait()
+    db.close()
+    num_errors = 0
+
+    # every frame is read again from disk, with none of its physical pages loaded
+    for selected_column in sample(range(1, num_columns), 2):
+        db = Database()
+        db.open(DB_PATH)
+        query = Query(db.get_table('Grades'))
+        projected_columns_index = [int(i == selected_column) for i in range(num_columns)]
+        for key in range(0, number_of_records, number_of_records // number_of_selects):
+            records = query.select(key, 0, projected_columns_index)
+            if records == False or len(records) != 1 or list(records[0].columns) != [model[key][selected_column]]:
+                print(f"{tag}: column {selected_column} of key {key} is {records and list(records[0].columns)}, "
+                      f"expected {[model[key][selected_column]]}")
+                num_errors += 1
+        loaded_columns = get_loaded_columns()
+        stats = BUFFERPOOL.get_stats()
+        print(f"{tag}: selecting column {selected_column} loaded {stats['physical_pages']} physical pages of "
+              f"{len(BUFFERPOOL.frames) * (num_columns + Config.NUM_METADATA_COLUMNS)} in {len(BUFFERPOOL.frames)} frames")
+        if not loaded_columns <= {0, selected_column}:
+            print(f"{tag}: selecting column {selected_column} by the key loaded the physical pages of columns "
+                  f"{sorted(loaded_columns - {0, selected_column})}")
+            num_errors += 1
+        num_errors += check_projections(tag, query, model, num_columns)
+        db.close()
+    shutil.rmtree(DB_PATH, ignore_errors=True)
+    return num_errors
+
+
+def main()->None:
+    seed(3562901)
+    num_errors = 0
+    for num_columns in numbers_of_columns:
+        for storage_mode in ("MMAP", "FILES"):
+            num_errors += check_table(num_columns, storage_mode)
+    print(f"projection pushdown: {num_errors} errors")
+    sys.exit(1 if num_errors else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+import inspect
+import math
+import shutil
+import sys
+from random import randint, sample, seed, shuffle
+
+import lstore.config as Config
+from lstore.db import Database
+from lstore.query import Query
+
+"""
+Range tester: checks that index range lookups seek to their lower bound.
+
+locate_range must yield the RIDs of the values in range lazily and in value
+order, on the primary key and on a secondary index with duplicate values,
+and sum must add up the same records, all matching a model of the table
+after inserts in random order, updates and deletes, before and after
+reopening the database.
+
+A range lookup must read O(log n + result size) tree nodes, counted by the
+node caches of the index trees, instead of every node of the tree.
+"""
+
+DB_PATH = "./RANGE"
+
+number_of_records = 20000
+number_of_updates = 2000
+number_of_deletes = 500
+number_of_values = 300 # distinct values of the secondary index
+range_sizes = [1, 10, 100, 1000, 10000, number_of_records]
+
+
+def get_num_node_accesses(grades_table)->int:
+    stats = grades_table.index.get_cache_stats()
+    return stats["hits"] + stats["misses"]
+
+
+def get_max_node_accesses(size:int)->float:
+    # the path to the lower bound, then the leaves holding the range
+    return 4 * math.log2(number_of_records) + 4 * size / Config.INDEX_ORDER_NUMBER
+
+
+def check_range(tag:str, grades_table, query:Query, model:dict[int,list[int]], rid_keys:dict[int,int],
+                begin:int, end:int, column_index:int)->int:
+    num_errors = 0
+    num_node_accesses = get_num_node_accesses(grades_table)
+    keys = [rid_keys[int(_)] for _ in grades_table.index.locate_range(begin, end, column_index)]
+    num_node_accesses = get_num_node_accesses(grades_table) - num_node_accesses
+    expected_keys = sorted((key for key, columns in model.items() if begin <= columns[column_index] <= end),
+                           key=lambda key: model[key][column_index])
+    # records of a secondary index value come in any order
+    if [model[_][column_index] for _ in keys] != [model[_][column_index] for _ in expected_keys] or \
+            sorted(keys) != sorted(expected_keys):
+        print(f"{tag}: range [{begin}, {end}] of column {column_index} located {len(keys)} records "
+              f"{'out of order' if sorted(keys) == sorted(expected_keys) else 'not in the model'}, expected {len(expected_keys)}")
+        num_errors += 1
+    if column_index == 0 and num_node_accesses > get_max_node_accesses(end - begin + 1):
+        print(f"{tag}: range [{begin}, {end}] read {num_node_accesses} tree nodes, "
+              f"more than {get_max_node_accesses(end - begin + 1):.0f}")
+        num_errors += 1
+    if column_index == 0:
+        expected_sum = sum(model[_][2] for _ in expected_keys)
+        result = query.sum(begin, end, 2)
+        if result != expected_sum:
+            print(f"{tag}: sum over [{begin}, {end}] is {result}, expected {expected_sum}")
+            num_errors += 1
+    return num_errors
+
+
+def check(tag:str, grades_table, query:Query, model:dict[int,list[int]], rid_keys:dict[int,int])->int:
+    num_errors = 0
+    num_node_accesses = []
+    for size in range_sizes:
+        begin = randint(0, number_of_records - size)
+        node_accesses = get_num_node_accesses(grades_table)
+        num_errors += check_range(tag, grades_table, query, model, rid_keys, begin, begin + size - 1, 0)
+        num_node_accesses.append(get_num_node_accesses(grades_table) - node_accesses)
+    print(f"{tag}: tree nodes read by range lookups of {range_sizes} keys (and their sums): {num_node_accesses}")
+    # bounds outside of the keys, and empty ranges
+    for begin, end in [(-100, 5), (number_of_records - 5, number_of_records + 100), (-10, -1), (50, 49)]:
+        num_errors += check_range(tag, grades_table, query, model, rid_keys, begin, end, 0)
+    for _ in range(10):
+        begin = randint(-1, number_of_values)
+        num_errors += check_range(tag, grades_table, query, model, rid_keys, begin, begin + randint(0, 20), 1)
+
+    # the RIDs are yielded lazily, the first one without reading the whole range
+    num_node_accesses = get_num_node_accesses(grades_table)
+    rids = grades_table.index.locate_range(0, number_of_records - 1, 0)
+    next(rids)
+    num_node_accesses = get_num_node_accesses(grades_table) - num_node_accesses
+    if not inspect.isgenerator(rids) or num_node_accesses > get_max_node_accesses(Config.INDEX_RANGE_BATCH_SIZE):
+        print(f"{tag}: the first RID of every key took {num_node_accesses} tree nodes")
+        num_errors += 1
+    rids.close()
+    return num_errors
+
+
+def main()->None:
+    seed(3562901)
+    shutil.rmtree(DB_PATH, ignore_errors=True)
+    db = Database()
+    db.open(DB_PATH)
+    grades_table = db.create_table('Grades', 5, 0)
+    query = Query(grades_table)
+    model:dict[int,list[int]] = dict()
+    keys = list(range(number_of_records))
+    shuffle(keys)
+    for key in keys:
+        model[key] = [key, randint(0, number_of_values - 1), randint(0, 999), 0, 0]
+        query.insert(*model[key])
+    grades_table.index.create_index(1)
+    rid_keys = {int(grades_table.index.locate(key, 0)[0]): key for key in model}
+    for key in sample(keys, number_of_updates):
+        model[key][1:3] = [randint(0, number_of_values - 1), randint(0, 999)]
+        query.update(key, None, *model[key][1:])
+    for key in sample(keys, number_of_deletes):
+        query.delete(key)
+        del model[key]
+
+    num_errors = check("open", grades_table, query, model, rid_keys)
+    db.close()
+    db = Database()
+    db.open(DB_PATH)
+    grades_table = db.get_table('Grades')
+    query = Query(grades_table)
+    num_errors += check("reopened", grades_table, query, model, rid_keys)
+
+    print(f"range lookups: {num_errors} errors")
+    db.close()
+    shutil.rmtree(DB_PATH, ignore_errors=True)
+    sys.exit(1 if num_errors else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+import shutil
+import sys
+import threading
+from time import perf_counter
+
+from lstore.db import Database
+from lstore.lock_info import Lock_Mode, TABLE_RESOURCE
+from lstore.query import Query
+from lstore.transaction import Transaction
+
+"""
+Record lock tester: checks the hierarchical locks a transaction takes.
+
+Updating a record takes IX on the table and its page range and X on the
+record only, so another record of the same page (and page range) can be
+updated meanwhile. Once a transaction has locked escalation_threshold
+records of a page range, it locks the whole page range in X instead. Other
+records of that page range then wait, while the other page ranges do not.
+"""
+
+DB_PATH = "./RECORD_LOCK"
+
+number_of_records = 3000 # two page ranges
+escalation_threshold = 8
+lock_timeout = 0.2 # seconds
+
+
+class Lock_Holder(threading.Thread):
+    """
+    Runs a transaction updating keys, then holds its locks until released.
+    """
+
+    def __init__(self, grades_table, query:Query, keys:list[int])->None:
+        super().__init__()
+        self.transaction:Transaction     = Transaction()
+        self.is_holding                  = threading.Event()
+        self.can_release                 = threading.Event()
+        for key in keys:
+            self.transaction.add_query(query.update, grades_table, key, None, 1, None, None, None)
+        self.transaction.add_query(self.__hold, grades_table)
+
+    def __hold(self)->bool:
+        self.is_holding.set()
+        self.can_release.wait()
+        return True
+
+    def run(self)->None:
+        self.transaction.run()
+
+    def hold(self)->None:
+        self.start()
+        self.is_holding.wait()
+
+    def release(self)->None:
+        self.can_release.set()
+        self.join()
+
+
+def timed_update(query:Query, key:int)->tuple[bool,float]:
+    start_time = perf_counter()
+    result = query.update(key, None, None, 2, None, None)
+    return (result != False, perf_counter() - start_time)
+
+
+def main()->None:
+    shutil.rmtree(DB_PATH, ignore_errors=True)
+    db = Database()
+    db.open(DB_PATH)
+    grades_table = db.create_table('Grades', 5, 0)
+    query = Query(grades_table)
+    lock_manager = grades_table.lock_manager
+    lock_manager.escalation_threshold = escalation_threshold
+    lock_manager.timeout = lock_timeout
+    for key in range(number_of_records):
+        query.insert(key, 0, 0, 0, 0)
+    page_range_index = lambda key: grades_table.index.locate(key, 0)[0].get_page_range_index()
+    num_errors = 0
+
+    # a record update locks the record, with intention locks on the table and page range
+    holder = Lock_Holder(grades_table, query, [10])
+    holder.hold()
+    rid = grades_table.index.locate(10, 0)[0]
+    modes = {resource: lock_manager.granted[resource].get(holder.transaction)
+             for resource in (TABLE_RESOURCE, ("PAGE_RANGE", rid.get_page_range_index()), ("RECORD", int(rid)))}
+    if list(modes.values()) != [Lock_Mode.IX, Lock_Mode.IX, Lock_Mode.X]:
+        print(f"locks of a record update: {modes}, expected IX, IX and X")
+        num_errors += 1
+    # another record of the same page is not blocked
+    num_waits = lock_manager.get_stats()["waits"]
+    is_updated, update_time = timed_update(query, 11)
+    print(f"  same page range: updated {is_updated} in {update_time * 1000:.1f} ms while key 10 is locked")
+    if not is_updated or lock_manager.get_stats()["waits"] != num_waits:
+        print("an update of another record of the page range waited for the lock of key 10")
+        num_errors += 1
+    holder.release()
+
+    # locking escalation_threshold records of a page range escalates to the page range
+    num_escalations = lock_manager.get_stats()["escalations"]
+    keys = list(range(100, 100 + 2 * escalation_threshold))
+    holder = Lock_Holder(grades_table, query, keys)
+    holder.hold()
+    page_range_mode = lock_manager.granted[("PAGE_RANGE", page_range_index(100))].get(holder.transaction)
+    num_held_locks = len(lock_manager.owned[holder.transaction])
+    print(f"escalation: {len(keys)} records updated with {num_held_locks} locks, page range locked in {page_range_mode}")
+    if lock_manager.get_stats()["escalations"] <= num_escalations or page_range_mode != Lock_Mode.X or \
+            num_held_locks > escalation_threshold + 2:
+        print(f"the transaction did not escalate to an X lock on the page range after {escalation_threshold} records")
+        num_errors += 1
+    # the escalated lock covers every record of the page range, and no other page range
+    is_updated, update_time = timed_update(query, 1500)
+    print(f"  same page range: updated {is_updated} after {update_time * 1000:.1f} ms")
+    if is_updated or page_range_index(1500) != page_range_index(100):
+        print("an update of a record of the escalated page range did not wait for it")
+        num_errors += 1
+    is_updated, update_time = timed_update(query, 2500)
+    print(f"  other page range: updated {is_updated} in {update_time * 1000:.1f} ms")
+    if not is_updated or page_range_index(2500) == page_range_index(100):
+        print("an update of a record of another page range waited for the escalated page range")
+        num_errors += 1
+    holder.release()
+
+    # the escalated transaction committed its writes and released its locks
+    if any(query.select(key, 0, [1, 1, 1, 1, 1])[0].columns[1] != 1 for key in keys) or lock_manager.get_stats()["locks"]:
+        print("the escalated transaction lost writes or kept locks")
+        num_errors += 1
+
+    print(f"record locking: {num_errors} errors")
+    db.close()
+    shutil.rmtree(DB_PATH, ignore_errors=True)
+    sys.exit(1 if num_errors else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,199 @@
+import os
+import shutil
+import signal
+import subprocess
+import sys
+import threading
+from random import seed, uniform
+from time import perf_counter, sleep, time
+
+from lstore.db import Database
+from lstore.log_info import LOG_FILENAME
+from lstore.query import Query
+from lstore.transaction import Transaction
+
+"""
+Crash recovery tester: kills a process running concurrent update transactions
+at random points and checks that every acknowledged transaction survived and
+that no transaction survived partially.
+
+Each worker owns a disjoint set of keys; its n-th transaction sets column 1 of
+all of its keys to n and is appended to a progress file once committed.
+
+A second database records the history of one key, autocommitted and in a
+transaction, before crashing; time travel to the points in between must
+still find each version once it is recovered.
+"""
+
+DB_PATH = "./CRASH"
+PROGRESS_PATH = "./crash_progress.txt"
+HISTORY_DB_PATH = "./CRASH_HISTORY"
+
+number_of_records = 1000
+num_threads = 8
+keys_per_transaction = 5
+number_of_crashes = 5
+
+
+def get_worker_keys(worker_index:int)->list[int]:
+    return [92106429 + worker_index * keys_per_transaction + i for i in range(keys_per_transaction)]
+
+
+def setup()->None:
+    db = Database()
+    db.open(DB_PATH)
+    grades_table = db.create_table('Grades', 5, 0)
+    query = Query(grades_table)
+    for i in range(number_of_records):
+        query.insert(92106429 + i, 0, i, i, i)
+    db.close()
+
+
+def workload()->None:
+    db = Database()
+    db.open(DB_PATH)
+    grades_table = db.get_table('Grades')
+    query = Query(grades_table)
+    progress_file = open(PROGRESS_PATH, 'a')
+    progress_latch = threading.Lock()
+
+    def run_worker(worker_index:int, first_step:int)->None:
+        step = first_step
+        while True:
+            transaction = Transaction()
+            for key in get_worker_keys(worker_index):
+                transaction.add_query(query.update, grades_table, key, None, step, None, None, None)
+            if not transaction.run():
+                continue
+            with progress_latch:
+                progress_file.write(f"{worker_index} {step}\n")
+                progress_file.flush()
+            step += 1
+
+    last_steps = read_progress()
+    for worker_index in range(num_threads):
+        threading.Thread(target=run_worker, args=(worker_index, last_steps[worker_index] + 1), daemon=True).start()
+    print("ready", flush=True)
+    threading.Event().wait()
+
+
+def read_progress()->list[int]:
+    last_steps = [0] * num_threads
+    if os.path.isfile(PROGRESS_PATH):
+        with open(PROGRESS_PATH) as f:
+            for line in f:
+                fields = line.split()
+                if len(fields) != 2: continue
+                worker_index, step = int(fields[0]), int(fields[1])
+                last_steps[worker_index] = max(last_steps[worker_index], step)
+    return last_steps
+
+
+def verify()->None:
+    last_steps = read_progress()
+    log_size = os.path.getsize(os.path.join(DB_PATH, LOG_FILENAME)) / (1024 * 1024)
+    start_time = perf_counter()
+    db = Database()
+    db.open(DB_PATH)
+    open_time = perf_counter() - start_time
+    grades_table = db.get_table('Grades')
+    query = Query(grades_table)
+
+    num_errors = 0
+    for worker_index in range(num_threads):
+        values = [query.select(key, 0, [1, 1, 1, 1, 1])[0].columns[1] for key in get_worker_keys(worker_index)]
+        # the transaction in flight at the crash may have committed without being acknowledged
+        if len(set(values)) != 1 or not values[0] in (last_steps[worker_index], last_steps[worker_index] + 1):
+            print(f"worker {worker_index}: expected step {last_steps[worker_index]} got {values}")
+            num_errors += 1
+    for i in range(num_threads * keys_per_transaction, number_of_records):
+        if query.select(92106429 + i, 0, [1, 1, 1, 1, 1])[0].columns != [92106429 + i, 0, i, i, i]:
+            num_errors += 1
+    print(f"Verified {num_threads} workers at steps {last_steps}: {num_errors} errors, "
+          f"open {open_time:.3f}s for {log_size:.3f} MB of log")
+    db.close()
+    sys.exit(1 if num_errors else 0)
+
+
+def history()->None:
+    db = Database()
+    db.open(HISTORY_DB_PATH)
+    grades_table = db.get_table('Grades')
+    query = Query(grades_table)
+    # the time after each version, the first one before the record exists
+    print(f"time {time()}", flush=True)
+    sleep(0.01)
+    query.insert(1, 10, 100)
+    sleep(0.01)
+    print(f"time {time()}", flush=True)
+    sleep(0.01)
+    query.update(1, None, 20, None)
+    sleep(0.01)
+    print(f"time {time()}", flush=True)
+    sleep(0.01)
+    transaction = Transaction()
+    transaction.add_query(query.update, grades_table, 1, None, 30, None)
+    transaction.run()
+    sleep(0.01)
+    print(f"time {time()}", flush=True)
+    # crash once the transaction (and the autocommitted records before it) is durable
+    os.kill(os.getpid(), signal.SIGKILL)
+
+
+def verify_history()->int:
+    shutil.rmtree(HISTORY_DB_PATH, ignore_errors=True)
+    db = Database()
+    db.open(HISTORY_DB_PATH)
+    db.create_table('Grades', 3, 0)
+    db.close()
+    child = subprocess.run([sys.executable, __file__, "history"], stdout=subprocess.PIPE, text=True)
+    times = [float(line.split()[1]) for line in child.stdout.splitlines() if line.startswith("time ")]
+
+    db = Database()
+    db.open(HISTORY_DB_PATH)
+    query = Query(db.get_table('Grades'))
+    expected_versions = [None, [1, 10, 100], [1, 20, 100], [1, 30, 100]]
+    num_errors = 0
+    for timestamp, expected_columns in zip(times, expected_versions):
+        records = query.select_as_of(1, 0, [1, 1, 1], timestamp)
+        columns = records[0].columns if len(records) else None
+        if columns != expected_columns:
+            print(f"as of {timestamp}: expected {expected_columns} got {columns}")
+            num_errors += 1
+    if len(times) != len(expected_versions):
+        print(f"history crashed early: {child.stdout!r}")
+        num_errors += 1
+    print(f"Verified history of {len(expected_versions)} versions across a crash: {num_errors} errors")
+    db.close()
+    shutil.rmtree(HISTORY_DB_PATH, ignore_errors=True)
+    return num_errors
+
+
+def main()->None:
+    seed(3562901)
+    shutil.rmtree(DB_PATH, ignore_errors=True)
+    if os.path.isfile(PROGRESS_PATH): os.remove(PROGRESS_PATH)
+    subprocess.run([sys.executable, __file__, "setup"], check=True)
+
+    num_failures = 0
+    for crash_index in range(number_of_crashes):
+        child = subprocess.Popen([sys.executable, __file__, "workload"], stdout=subprocess.PIPE, text=True)
+        while child.stdout.readline().strip() != "ready": pass
+        sleep(uniform(0.5, 3))
+        child.send_signal(signal.SIGKILL)
+        child.wait()
+        print(f"crash {crash_index}:")
+        if subprocess.run([sys.executable, __file__, "verify"]).returncode:
+            num_failures += 1
+    print(f"{number_of_crashes - num_failures}/{number_of_crashes} crashes recovered correctly")
+    if verify_history():
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    match sys.argv[1] if len(sys.argv) > 1 else "":
+        case "setup": setup()
+        case "workload": workload()
+        case "verify": verify()
+        case "history": history()
+        case _: main()
@@ -0,0 +1,87 @@
+import sys
+
+from lstore.replacement_policy import Replacement_Policy, REPLACEMENT_POLICIES
+
+"""
+Replacement policy tester: replays short access sequences against each
+policy and checks the victim it chooses, with and without pinned pages.
+
+A page is pinned by making the is_evictable callback reject it, which is
+how the bufferpool hides frames that are in use.
+"""
+
+# (policy, accesses, pinned pages, expected victim)
+cases = [
+    # least recently used page first, pinned pages are skipped
+    ("LRU", ["a", "b", "c", "a"], [], "b"),
+    ("LRU", ["a", "b", "c", "a"], ["b"], "c"),
+    ("LRU", ["a", "b"], ["a", "b"], None),
+    # the hand clears every reference bit once and stops at the first page again
+    ("CLOCK", ["a", "b", "c"], [], "a"),
+    ("CLOCK", ["a", "b", "c"], ["a"], "b"),
+    ("CLOCK", ["a", "b", "c"], ["a", "b", "c"], None),
+    # pages referenced less than K times go first, even when used last
+    ("LRU_K", ["a", "a", "b", "b", "c"], [], "c"),
+    ("LRU_K", ["a", "a", "b", "b", "c"], ["c"], "a"),
+    ("LRU_K", ["a", "b", "a", "b", "b"], [], "a"),
+    ("LRU_K", ["a", "a", "b", "b"], ["a", "b"], None),
+]
+
+
+def choose_victim(policy_name:str, accesses:list[str], pinned:list[str])->str|None:
+    policy = REPLACEMENT_POLICIES[policy_name]()
+    for page_path in accesses:
+        policy.record_access(page_path)
+    return policy.choose_victim(lambda page_path: not page_path in pinned)
+
+
+def check_clock_second_chance()->bool:
+    # a page accessed after the hand cleared its bit survives the next sweep
+    policy = REPLACEMENT_POLICIES["CLOCK"]()
+    for page_path in ["a", "b", "c"]:
+        policy.record_access(page_path)
+    victim = policy.choose_victim(lambda _: True)
+    policy.remove(victim)
+    policy.record_access("b")
+    policy.record_access("d")
+    return victim == "a" and policy.choose_victim(lambda _: True) == "c"
+
+
+def check_removed_pages()->bool:
+    for policy_name in REPLACEMENT_POLICIES:
+        policy = REPLACEMENT_POLICIES[policy_name]()
+        for page_path in ["a", "b"]:
+            policy.record_access(page_path)
+        policy.remove("a")
+        if policy.choose_victim(lambda _: True) != "b":
+            return False
+    return True
+
+
+def check_incomplete_policy()->bool:
+    class Incomplete_Policy(Replacement_Policy):
+        def record_access(self, page_path:str)->None: pass
+    try:
+        Incomplete_Policy()
+    except TypeError:
+        return True
+    return False
+
+
+def main()->None:
+    num_errors = 0
+    for policy_name, accesses, pinned, expected_victim in cases:
+        victim = choose_victim(policy_name, accesses, pinned)
+        if victim != expected_victim:
+            print(f"{policy_name}: accesses {accesses} pinned {pinned}: expected {expected_victim} got {victim}")
+            num_errors += 1
+    for check in (check_clock_second_chance, check_removed_pages, check_incomplete_policy):
+        if not check():
+            print(f"{check.__name__} failed")
+            num_errors += 1
+    print(f"{len(cases) + 3 - num_errors}/{len(cases) + 3} replacement policy checks passed")
+    sys.exit(1 if num_errors else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,150 @@
+import sys
+
+# the array fallback is tested by hiding NumPy before lstore imports it
+if len(sys.argv) > 1 and sys.argv[1] == "array":
+    sys.modules["numpy"] = None
+
+import shutil
+import subprocess
+import threading
+from random import randint, seed
+from time import time
+
+import lstore.config as Config
+from lstore.db import Database
+from lstore.merge_info import MERGE_MANAGER
+from lstore.numpy_support import numpy
+from lstore.query import Query
+from lstore.transaction import Transaction
+
+"""
+Batch scan tester: checks sum, sum_as_of and snapshot sums against a model
+of the table while random updates and deletes are merged and compacted,
+once with NumPy and once with the array fallback.
+
+Sums read whole pages through Page_Range.scan_column. Merged pages, tail
+pages, compacted tail pages (which only keep VERSION_RETENTION_COUNT
+versions) and records skipped because their newest version is not in the
+snapshot (an uncommitted writer, a sum as of the past) are all read.
+"""
+
+DB_PATH = "./SCAN"
+
+number_of_records = 3000
+number_of_rounds = 6
+updates_per_round = 4000
+deletes_per_round = 30
+sums_per_column = 5
+
+
+class Scan_Checker:
+
+    def __init__(self, query:Query)->None:
+        self.query:Query                = query
+        self.model:dict[int,list[int]]  = dict()
+        self.num_errors:int             = 0
+
+    def check(self, tag:str, model:dict[int,list[int]]|None=None, sum_range=None)->None:
+        model = self.model if model is None else model
+        sum_range = self.query.sum if sum_range is None else sum_range
+        for column in range(5):
+            for _ in range(sums_per_column):
+                start = randint(0, number_of_records - 1)
+                end = randint(start, number_of_records - 1)
+                expected_sum = sum(model[key][column] for key in range(start, end + 1) if key in model)
+                result = sum_range(start, end, column)
+                if result != expected_sum:
+                    print(f"{tag}: sum of column {column} over [{start}, {end}] is {result}, expected {expected_sum}")
+                    self.num_errors += 1
+
+
+def run(mode:str)->None:
+    seed(3562901)
+    Config.MERGE_THRESHOLD = 300
+    Config.VERSION_RETENTION_COUNT = 2
+    Config.COMPACTION_THRESHOLD = 600
+    shutil.rmtree(DB_PATH, ignore_errors=True)
+    db = Database()
+    db.open(DB_PATH)
+    grades_table = db.create_table('Grades', 5, 0)
+    query = Query(grades_table)
+    checker = Scan_Checker(query)
+    model = checker.model
+    for key in range(number_of_records):
+        query.insert(key, key % 7, 0, key, 0)
+        model[key] = [key, key % 7, 0, key, 0]
+
+    for round_index in range(number_of_rounds):
+        for _ in range(updates_per_round):
+            # a few hot keys get long version chains
+            key = randint(0, number_of_records - 1) if randint(0, 3) else randint(0, 50)
+            if not key in model: continue
+            updated_columns = [None, randint(0, 99) if randint(0, 1) else None,
+                               randint(0, 99) if not randint(0, 2) else None, None, randint(0, 9)]
+            query.update(key, *updated_columns)
+            model[key] = [new if new is not None else old for new, old in zip(updated_columns, model[key])]
+        for _ in range(deletes_per_round):
+            key = randint(0, number_of_records - 1)
+            if key in model:
+                query.delete(key)
+                del model[key]
+        checker.check(f"round {round_index}")
+        MERGE_MANAGER.wait()
+        checker.check(f"round {round_index} merged")
+
+    # records written by an uncommitted transaction are read from their previous version
+    snapshot_model = {key: list(columns) for key, columns in model.items()}
+    is_writing = threading.Event()
+    can_commit = threading.Event()
+    def pause()->bool:
+        is_writing.set()
+        can_commit.wait()
+        return True
+    transaction = Transaction()
+    for key in range(100, 110):
+        if key in model: transaction.add_query(query.update, grades_table, key, None, 12345, None, None, None)
+    transaction.add_query(pause, grades_table)
+    writer = threading.Thread(target=transaction.run)
+    writer.start()
+    is_writing.wait()
+    checker.check("uncommitted writer")
+    snapshot_time = time()
+    can_commit.set()
+    writer.join()
+    for key in range(100, 110):
+        if key in model: model[key][1] = 12345
+    checker.check("committed writer")
+    checker.check("as of the uncommitted writer", snapshot_model,
+                  lambda start, end, column: query.sum_as_of(start, end, column, snapshot_time))
+
+    # sums of a transaction read the snapshot it started with
+    sums = list()
+    transaction = Transaction()
+    transaction.add_query(lambda: sums.append(query.sum(0, number_of_records - 1, 3)) or True, grades_table)
+    transaction.run()
+    if sums != [sum(columns[3] for columns in model.values())]:
+        print(f"transaction sum {sums}, expected {sum(columns[3] for columns in model.values())}")
+        checker.num_errors += 1
+
+    stats = MERGE_MANAGER.get_stats()
+    print(f"{mode:>5}: {stats['merges']} merges, {stats['compactions']} compactions, {checker.num_errors} errors")
+    db.close()
+    shutil.rmtree(DB_PATH, ignore_errors=True)
+    sys.exit(1 if checker.num_errors or not stats["compactions"] else 0)
+
+
+def main()->None:
+    num_failures = 0
+    for mode in ("numpy", "array"):
+        if mode == "numpy" and numpy is None:
+            print("numpy: not installed, skipped")
+            continue
+        if subprocess.run([sys.executable, __file__, mode]).returncode:
+            num_failures += 1
+    sys.exit(1 if num_failures else 0)
+
+
+if __name__ == "__main__":
+    match sys.argv[1] if len(sys.argv) > 1 else "":
+        case "numpy" | "array": run(sys.argv[1])
+        case _: main()
@@ -0,0 +1,184 @@
+import gc
+import os
+import shutil
+import sys
+from pickle import dumps
+from random import randint, seed
+
+from lstore.db import Database
+from lstore.index import Index_Column, Posting_List, POSTING_LIST_TAG
+from lstore.query import Query
+from lstore.record_info import RID
+import lstore.config as Config
+
+"""
+Multi-predicate select tester: checks select_where against a model of the
+table for AND and OR over indexed columns, predicates mixing indexed and
+unindexed columns, and the full scan an OR falls back to when one of its
+columns has no index.
+
+The index of a column is then rewritten as pickled RID sets, the format of
+index files written before posting lists, and the same selects are checked
+after reopening the database, before and after the entries are upgraded.
+"""
+
+DB_PATH = "./SELECT_WHERE"
+
+number_of_records = 3000
+number_of_updates = 2000
+number_of_deletes = 200
+selects_per_case = 20
+
+# columns 1 and 2 are indexed, 3 and 4 are not
+cardinalities = [None, 10, 13, 7, 3]
+
+# (search key columns, match_any)
+cases = [
+    ([1, 2], False),
+    ([1, 2], True),
+    ([0, 1], False),
+    ([1, 3], False),
+    ([1, 2, 3], False),
+    ([1, 3], True),
+    ([3, 4], False),
+    ([3, 4], True),
+]
+
+
+class Select_Checker:
+
+    def __init__(self)->None:
+        self.model:dict[int,list[int]]  = dict()
+        self.num_errors:int             = 0
+        self.num_checks:int             = 0
+
+    def random_columns(self, key:int)->list[int]:
+        return [key] + [randint(0, cardinality - 1) for cardinality in cardinalities[1:]]
+
+    def check(self, tag:str, query:Query)->None:
+        for columns, match_any in cases:
+            is_match = any if match_any else all
+            for _ in range(selects_per_case):
+                search_keys = {column: randint(0, cardinalities[column] - 1) if column else randint(0, number_of_records - 1)
+                               for column in columns}
+                expected_keys = sorted(key for key, values in self.model.items()
+                                       if is_match(values[i] == value for i, value in search_keys.items()))
+                records = query.select_where(search_keys, [1, 1, 1, 1, 1], match_any)
+                self.num_checks += 1
+                if records == False or sorted(record.columns[0] for record in records) != expected_keys or \
+                        any(list(record.columns) != self.model[record.columns[0]] for record in records):
+                    print(f"{tag}: select_where {search_keys} match_any={match_any} "
+                          f"returned {len(records) if records != False else records} records, expected {len(expected_keys)}")
+                    self.num_errors += 1
+
+    def check_fallback(self, query:Query)->None:
+        # an OR over an unindexed column cannot be answered by the indexes alone
+        self.num_checks += 1
+        try:
+            query.table.index.locate_all({1: 0, 3: 0}, True)
+        except KeyError:
+            return
+        print("locate_all did not fall back to the full scan for an OR over an unindexed column")
+        self.num_errors += 1
+
+
+def write_pickled_sets(index_path:str)->int:
+    """
+    Rewrites every entry value of an index file as a pickled set of RIDs.
+    """
+    index_column = Index_Column(index_path, Config.INDEX_ORDER_NUMBER)
+    entries = list()
+    tree_entries = index_column.tree.items()
+    try:
+        for entry_value, data in tree_entries:
+            entries.append((entry_value, {RID(_) for _ in Posting_List.from_bytes(data)}))
+    # the tree's iterator raises a RuntimeError past its last leaf
+    except RuntimeError:
+        pass
+    finally:
+        tree_entries.close()
+    for entry_value, rids in entries:
+        index_column.tree[entry_value] = dumps(rids)
+    del index_column
+    return len(entries)
+
+
+def count_posting_lists(index_path:str)->int:
+    index_column = Index_Column(index_path, Config.INDEX_ORDER_NUMBER)
+    num_posting_lists = 0
+    tree_entries = index_column.tree.items()
+    try:
+        for _, data in tree_entries:
+            num_posting_lists += data[:1] == POSTING_LIST_TAG
+    except RuntimeError:
+        pass
+    finally:
+        tree_entries.close()
+    del index_column
+    return num_posting_lists
+
+
+def main()->None:
+    seed(3562901)
+    shutil.rmtree(DB_PATH, ignore_errors=True)
+    checker = Select_Checker()
+    model = checker.model
+
+    db = Database()
+    db.open(DB_PATH)
+    grades_table = db.create_table('Grades', 5, 0)
+    # the index rewritten as pickled sets has the value size of the index files written before posting lists
+    grades_table.index.create_index(1, value_size=32)
+    grades_table.index.create_index(2)
+    query = Query(grades_table)
+    for key in range(number_of_records):
+        model[key] = checker.random_columns(key)
+        query.insert(*model[key])
+    for _ in range(number_of_updates):
+        key = randint(0, number_of_records - 1)
+        if not key in model: continue
+        model[key] = checker.random_columns(key)
+        query.update(key, None, *model[key][1:])
+    for _ in range(number_of_deletes):
+        key = randint(0, number_of_records - 1)
+        if key in model:
+            query.delete(key)
+            del model[key]
+    checker.check("posting lists", query)
+    checker.check_fallback(query)
+    db.close()
+    gc.collect()
+
+    index_path = os.path.join(DB_PATH, "Grades", "index", "1.db")
+    num_entries = write_pickled_sets(index_path)
+    gc.collect()
+    if not num_entries or count_posting_lists(index_path):
+        print("the index was not rewritten as pickled sets")
+        checker.num_errors += 1
+    gc.collect()
+
+    db = Database()
+    db.open(DB_PATH)
+    query = Query(db.get_table('Grades'))
+    checker.check("pickled sets", query)
+    # rewritten entry values are upgraded to posting lists
+    for _ in range(number_of_updates):
+        key = randint(0, number_of_records - 1)
+        if not key in model: continue
+        model[key] = checker.random_columns(key)
+        query.update(key, None, *model[key][1:])
+    checker.check("upgraded", query)
+    db.close()
+    gc.collect()
+
+    num_posting_lists = count_posting_lists(index_path)
+    if num_posting_lists != num_entries:
+        print(f"{num_entries - num_posting_lists}/{num_entries} entry values of the old index were not upgraded")
+        checker.num_errors += 1
+    print(f"{checker.num_checks - checker.num_errors}/{checker.num_checks} select checks passed")
+    shutil.rmtree(DB_PATH, ignore_errors=True)
+    sys.exit(1 if checker.num_errors else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+import math
+import shutil
+import sys
+from random import randint, seed
+from time import sleep, time
+
+from lstore.bufferpool import BUFFERPOOL
+from lstore.db import Database
+from lstore.merge_info import MERGE_MANAGER
+from lstore.query import Query
+
+"""
+Time travel tester: takes a snapshot of a model of the table after each
+round of updates, inserts and deletes, then checks select_as_of and
+sum_as_of at the time of every snapshot against it, before and after the
+tail records are merged and after reopening the database.
+
+A record inserted after a point in time is not found as of that time, and
+records deleted since are not found at all (they are no longer indexed).
+Finding the version of a record with a long history visible at a time
+takes O(log versions) frame accesses.
+"""
+
+DB_PATH = "./TIME_TRAVEL"
+
+number_of_records = 1000
+number_of_rounds = 8
+updates_per_round = 400
+inserts_per_round = 50
+deletes_per_round = 10
+hot_key = 7
+hot_updates_per_round = 150
+selects_per_snapshot = 100
+sums_per_snapshot = 10
+
+
+def get_num_frame_accesses()->int:
+    stats = BUFFERPOOL.get_stats()
+    return stats["hits"] + stats["misses"]
+
+
+def check(tag:str, query:Query, snapshots:list[tuple[float,dict]], model:dict[int,list[int]])->int:
+    num_errors = 0
+    for snapshot_index, (snapshot_time, snapshot_model) in enumerate(snapshots):
+        for _ in range(selects_per_snapshot):
+            key = randint(0, max(model))
+            if not key in model: continue
+            expected_columns = snapshot_model[key] if key in snapshot_model else None
+            records = query.select_as_of(key, 0, [1, 1, 1, 1, 1], snapshot_time)
+            columns = list(records[0].columns) if records != False and len(records) == 1 else records
+            if columns != expected_columns and not (expected_columns is None and records == []):
+                print(f"{tag}: key {key} as of snapshot {snapshot_index} is {columns}, expected {expected_columns}")
+                num_errors += 1
+        for _ in range(sums_per_snapshot):
+            start = randint(0, max(model))
+            end = randint(start, max(model))
+            column = randint(1, 4)
+            expected_sum = sum(snapshot_model[key][column] for key in range(start, end + 1) if key in snapshot_model and key in model)
+            result = query.sum_as_of(start, end, column, snapshot_time)
+            if result != expected_sum:
+                print(f"{tag}: sum of column {column} over [{start}, {end}] as of snapshot {snapshot_index} is {result}, "
+                      f"expected {expected_sum}")
+                num_errors += 1
+        if not hot_key in snapshot_model: continue
+        # the version of the hot key is searched, not walked to
+        num_frame_accesses = get_num_frame_accesses()
+        records = query.select_as_of(hot_key, 0, [1, 1, 1, 1, 1], snapshot_time)
+        num_frame_accesses = get_num_frame_accesses() - num_frame_accesses
+        max_frame_accesses = 8 * (math.log2(number_of_rounds * hot_updates_per_round + 1) + 1)
+        columns = list(records[0].columns) if records != False and len(records) == 1 else records
+        if columns != snapshot_model[hot_key] or num_frame_accesses > max_frame_accesses:
+            print(f"{tag}: hot key as of snapshot {snapshot_index} is {columns} after {num_frame_accesses} "
+                  f"frame accesses, expected {snapshot_model[hot_key]} after at most {max_frame_accesses:.0f}")
+            num_errors += 1
+    return num_errors
+
+
+def main()->None:
+    seed(3562901)
+    shutil.rmtree(DB_PATH, ignore_errors=True)
+    db = Database()
+    db.open(DB_PATH)
+    grades_table = db.create_table('Grades', 5, 0)
+    query = Query(grades_table)
+    model:dict[int,list[int]] = dict()
+    # nothing exists before the first insert
+    snapshots:list[tuple[float,dict]] = [(time(), dict())]
+    for key in range(number_of_records):
+        model[key] = [key, randint(0, 99), randint(0, 99), 0, 0]
+        query.insert(*model[key])
+
+    for round_index in range(number_of_rounds):
+        sleep(0.01)
+        snapshots.append((time(), {key: list(columns) for key, columns in model.items()}))
+        for _ in range(updates_per_round):
+            key = randint(0, max(model))
+            if not key in model or key == hot_key: continue
+            updated_columns = [None, randint(0, 99), None, randint(0, 99), round_index]
+            query.update(key, *updated_columns)
+            model[key] = [new if new is not None else old for new, old in zip(updated_columns, model[key])]
+        for i in range(hot_updates_per_round):
+            model[hot_key] = [hot_key, round_index, i, 0, 0]
+            query.update(hot_key, None, *model[hot_key][1:])
+        for _ in range(inserts_per_round):
+            key = max(model) + 1
+            model[key] = [key, randint(0, 99), randint(0, 99), 0, round_index]
+            query.insert(*model[key])
+        for _ in range(deletes_per_round):
+            key = randint(0, max(model))
+            if key in model and key != hot_key:
+                query.delete(key)
+                del model[key]
+    sleep(0.01)
+    snapshots.append((time(), {key: list(columns) for key, columns in model.items()}))
+
+    num_errors = check("tail records", query, snapshots, model)
+    MERGE_MANAGER.wait()
+    num_errors += check("merged", query, snapshots, model)
+    db.close()
+    db = Database()
+    db.open(DB_PATH)
+    query = Query(db.get_table('Grades'))
+    num_errors += check("reopened", query, snapshots, model)
+
+    print(f"time travel over {len(snapshots)} snapshots: {num_errors} errors")
+    db.close()
+    shutil.rmtree(DB_PATH, ignore_errors=True)
+    sys.exit(1 if num_errors else 0)
+
+
+if __name__ == "__main__":
+    main()
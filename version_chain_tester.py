@@ -0,0 +1,103 @@
+import math
+import shutil
+import sys
+from random import randint, seed
+
+from lstore.bufferpool import BUFFERPOOL
+from lstore.db import Database
+from lstore.merge_info import MERGE_MANAGER
+from lstore.query import Query
+
+"""
+Version chain tester: checks select_version and sum_version on records
+with long histories against a model, and that reaching version -k takes
+O(log k) frame accesses through the skip pointers of the tail records
+instead of a walk of k tail records.
+
+Versions are checked before and after the tail records are merged, and
+after reopening the database.
+"""
+
+DB_PATH = "./VERSION_CHAIN"
+
+number_of_records = 1000
+number_of_hot_updates = 1500 # updates of each hot key
+hot_keys = [3, 500, 997]
+relative_versions = [0, 1, 2, 3, 7, 64, 100, 500, 1000, 1499, 1500, 2000]
+
+
+def get_num_frame_accesses()->int:
+    stats = BUFFERPOOL.get_stats()
+    return stats["hits"] + stats["misses"]
+
+
+def check(tag:str, query:Query, history:dict[int,list[list[int]]])->int:
+    num_errors = 0
+    for key in hot_keys:
+        versions = history[key]
+        for relative_version in relative_versions:
+            expected_columns = versions[max(0, len(versions) - 1 - relative_version)]
+            num_frame_accesses = get_num_frame_accesses()
+            records = query.select_version(key, 0, [1, 1, 1, 1, 1], -relative_version)
+            num_frame_accesses = get_num_frame_accesses() - num_frame_accesses
+            if records == False or len(records) != 1 or list(records[0].columns) != expected_columns:
+                print(f"{tag}: version -{relative_version} of key {key} is {records and list(records[0].columns)}, "
+                      f"expected {expected_columns}")
+                num_errors += 1
+            # a walk of the chain would access a frame per tail record
+            max_frame_accesses = 8 * (math.log2(relative_version + 1) + 1)
+            if num_frame_accesses > max_frame_accesses:
+                print(f"{tag}: version -{relative_version} of key {key} took {num_frame_accesses} frame accesses, "
+                      f"more than {max_frame_accesses:.0f}")
+                num_errors += 1
+    for relative_version in relative_versions:
+        expected_sum = sum(versions[max(0, len(versions) - 1 - relative_version)][2] for versions in history.values())
+        result = query.sum_version(0, number_of_records - 1, 2, -relative_version)
+        if result != expected_sum:
+            print(f"{tag}: sum of version -{relative_version} is {result}, expected {expected_sum}")
+            num_errors += 1
+    return num_errors
+
+
+def main()->None:
+    seed(3562901)
+    shutil.rmtree(DB_PATH, ignore_errors=True)
+    db = Database()
+    db.open(DB_PATH)
+    grades_table = db.create_table('Grades', 5, 0)
+    query = Query(grades_table)
+    history:dict[int,list[list[int]]] = dict()
+    for key in range(number_of_records):
+        query.insert(key, 0, 0, 0, 0)
+        history[key] = [[key, 0, 0, 0, 0]]
+
+    # the hot keys get long histories, interleaved with updates of the other keys
+    for i in range(number_of_hot_updates):
+        for key in hot_keys + [randint(0, number_of_records - 1)]:
+            # every update changes column 2, so each one is a version
+            columns = [key, randint(0, 99), history[key][-1][2] + 1, history[key][-1][3], randint(0, 99)]
+            query.update(key, None, *columns[1:])
+            history[key].append(columns)
+
+    num_errors = check("tail records", query, history)
+    MERGE_MANAGER.wait()
+    num_errors += check("merged", query, history)
+    db.close()
+
+    db = Database()
+    db.open(DB_PATH)
+    query = Query(db.get_table('Grades'))
+    num_frame_accesses = get_num_frame_accesses()
+    query.select_version(hot_keys[0], 0, [1, 1, 1, 1, 1], -1000)
+    print(f"version -1000 of a record with {len(history[hot_keys[0]]) - 1} updates: "
+          f"{get_num_frame_accesses() - num_frame_accesses} frame accesses")
+    num_errors += check("reopened", query, history)
+
+    print(f"version chains: {num_errors} errors")
+    db.close()
+    shutil.rmtree(DB_PATH, ignore_errors=True)
+    sys.exit(1 if num_errors else 0)
+
+
+if __name__ == "__main__":
+    main()